@@ -1,9 +1,13 @@
 from equipment import Equipment
+from record import Field, Schema
 
 # This represents an item that can be equipped onto a character to boost their
 # defensive stats. 
 class Armor(Equipment):
 
+ __slots__ = ("defense", "evade", "magic_defense", "magic_evade", "mystery_flag",
+  "shield", "slot", "saved")
+
  def __init__(self):
   super().__init__()
   
@@ -31,35 +35,33 @@ class Armor(Equipment):
   # index in the item list and that this value is ignored. Thus, I suspect that
   # simply changing this value will not have the effect you might expect.
   self.slot = 0
+  
+  # The armor data as it was when it was last read or written (see record.py).
+  self.saved = None
  
+ # The layout of the armor data in the rom (see record.py).
+ schema = Schema([
+  Field("magic_evade", 0, bits = (0, 7)),
+  Field("magnetic", 0, bits = (7, 8), kind = "flag"),
+  Field("defense", 1),
+  Field("evade", 2),
+  Field("magic_defense", 3),
+  Field("attributes", 4, bits = (0, 6)),
+  Field("mystery_flag", 4, bits = (6, 7), kind = "flag"),
+  Field("shield", 4, bits = (7, 8), kind = "flag"),
+  Field("races", 5, kind = "object"),
+  Field("equips", 6, bits = (0, 5)),
+  Field("slot", 6, bits = (6, 8)),
+  Field("statbuff", 7, kind = "object")
+ ])
+
  # Read the armor data from the rom.
  def read(self, rom, address):
-  self.magic_evade = rom.data[address] % 0x80
-  self.magnetic = rom.flag(address, 7)
-  self.defense = rom.data[address + 1]
-  self.evade = rom.data[address + 2]
-  self.magic_defense = rom.data[address + 3]
-  self.attributes = rom.data[address + 4] % 0x40
-  self.mystery_flag = rom.flag(address + 4, 6)
-  self.shield = rom.flag(address + 4, 7)
-  self.races.read(rom, address + 5)
-  self.equips = rom.data[address + 6] % 0x20
-  self.slot = rom.data[address + 6] >> 6
-  self.statbuff.read(rom, address + 7)
+  self.schema.read(self, rom, address)
  
  # Write the armor data back to the rom.
  def write(self, rom, address):
-  rom.data[address] = self.magic_evade
-  rom.setbit(address, 7, self.magnetic)
-  rom.data[address + 1] = self.defense
-  rom.data[address + 2] = self.evade
-  rom.data[address + 3] = self.magic_defense
-  rom.data[address + 4] = self.attributes
-  rom.setbit(address + 4, 6, self.mystery_flag)
-  rom.setbit(address + 4, 7, self.shield)
-  self.races.write(rom, address + 5)
-  rom.data[address + 6] = (self.slot << 6) + self.equips
-  self.statbuff.write(rom, address + 7)
+  self.schema.write(self, rom, address)
  
  # Return a string containing all the armor's information.
  def display(self, main):
@@ -0,0 +1,556 @@
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import tracemalloc
+import rom
+import text
+import tables
+from gamingway import FF4Rom
+
+# This file contains some rough benchmarks for measuring how long various parts of
+# the library take and how much memory they use. It isn't needed for using the
+# library at all; it's just here so that changes meant to make things faster or
+# smaller can be checked against actual numbers.
+#
+# To run it, use something like:
+#  python benchmark.py
+# or, to use a real rom instead of a synthetic one:
+#  python benchmark.py example/path/to/rom/ff4.smc
+
+# This builds a fake rom that is random garbage except for the handful of places
+# where the reading routines expect the data to have a particular structure (such as
+# terminated lists or pointer tables). The result isn't playable in any sense, but
+# every data type can be read from it and written back to it, which is all a
+# benchmark needs. It returns the raw bytes as they would appear in a file.
+def synthetic_rom(size = 0x200000, seed = 0, headered = True):
+ generator = random.Random(seed)
+ data = bytearray(generator.randbytes(size + 0x200))
+ data[0:0x200] = bytes(0x200)
+
+ # We borrow the addresses from a RomData object so they stay in sync with the
+ # rest of the library.
+ layout = rom.RomData(bytearray())
+
+ # Writes a 16-bit pointer into the fake rom.
+ def pointer(address, value):
+  data[address] = value % 0x100
+  data[address + 1] = value >> 8
+
+ # Starting spells are FF-terminated lists, and progressions are level/spell pairs
+ # with levels that actually exist.
+ address = layout.STARTING_SPELLS_START
+ for index in range(layout.TOTAL_SPELLBOOKS):
+  for count in range(generator.randrange(4)):
+   data[address] = generator.randrange(layout.TOTAL_SPELLS)
+   address += 1
+  data[address] = 0xFF
+  address += 1
+ address = layout.SPELL_PROGRESSIONS_START
+ for index in range(layout.TOTAL_SPELLBOOKS):
+  for count in range(generator.randrange(6)):
+   data[address] = generator.randrange(1, 100)
+   data[address + 1] = generator.randrange(layout.TOTAL_SPELLS)
+   address += 2
+  data[address] = 0xFF
+  address += 1
+
+ # Characters need sensible IDs and starting levels, and their levelup pointers
+ # need to point into the levelup table.
+ for index in range(layout.TOTAL_CHARACTERS):
+  address = layout.CHARACTER_DATA_START + index * 32
+  data[address] = (data[address] & 0xC0) + index + 1
+  data[address + 2] = generator.randrange(1, 60)
+  offset = layout.LEVELUP_TABLE_START - layout.LEVELUP_TABLE_BONUS + index * 0x100
+  pointer(layout.LEVELUP_POINTERS_START + index * 2, offset)
+
+ # Monster records are variable length, so the pointers have to follow the flags.
+ address = layout.MONSTER_DATA_START
+ for index in range(layout.TOTAL_MONSTERS):
+  pointer(layout.MONSTER_POINTERS_START + index * 2, address - layout.MONSTER_DATA_BONUS)
+  data[address + 9] &= 0xFC
+  length = 10
+  for bit, size in zip(range(7, 1, -1), [3, 3, 1, 1, 1, 1]):
+   if (data[address + 9] >> bit) & 1:
+    length += size
+  address += length
+
+ # Every map gets two triggers.
+ for index in range(layout.TOTAL_MAPS + 1):
+  pointer(layout.TRIGGER_POINTERS_START + index * 2, index * 10)
+ for index in range(layout.TOTAL_MAPS):
+  data[layout.MAP_DATA_START + index * 13 + 11] = index % layout.TOTAL_MAP_NAMES
+
+ # Map names are 00-terminated strings of letters.
+ address = layout.MAP_NAMES_START
+ for index in range(layout.TOTAL_MAP_NAMES):
+  for count in range(generator.randrange(1, 8)):
+   data[address] = generator.randrange(0x42, 0x76)
+   address += 1
+  data[address] = 0
+  address += 1
+
+ # The overworld is 256 rows of 256 RLE encoded tiles, each terminated by FF.
+ address = layout.OVERWORLD_DATA_START
+ for row in range(0x100):
+  pointer(layout.OVERWORLD_POINTERS_START + row * 2, address - layout.OVERWORLD_DATA_START)
+  count = 0
+  while count < 0x100:
+   tile = generator.randrange(0x40, 0x70)
+   runlength = min(generator.randrange(1, 20), 0x100 - count)
+   if runlength > 1:
+    data[address] = tile + 0x80
+    data[address + 1] = runlength - 1
+    address += 2
+   else:
+    data[address] = tile
+    address += 1
+   count += runlength
+  data[address] = 0xFF
+  address += 1
+
+ # Each tilemap is 0x400 RLE encoded tiles.
+ address = layout.TILEMAP_DATA_START
+ for index in range(layout.TOTAL_OVERWORLD_TILEMAPS):
+  pointer(layout.TILEMAP_POINTERS_START + index * 2, address - layout.TILEMAP_OVERWORLD_BONUS)
+  count = 0
+  while count < 0x400:
+   tile = generator.randrange(0x7F)
+   runlength = min(generator.randrange(1, 40), 0x400 - count)
+   if runlength > 1:
+    data[address] = tile + 0x80
+    data[address + 1] = runlength - 1
+    address += 2
+   else:
+    data[address] = tile
+    address += 1
+   count += runlength
+
+ # Launchers are lists of conditions followed by an FF and an event index.
+ address = layout.LAUNCHER_DATA_START
+ for index in range(layout.TOTAL_LAUNCHERS + 1):
+  pointer(layout.LAUNCHER_POINTERS_START + index * 2, address - layout.LAUNCHER_DATA_START)
+  if index < layout.TOTAL_LAUNCHERS:
+   for count in range(generator.randrange(1, 3)):
+    if generator.random() < 0.5:
+     data[address] = 0xFE
+     data[address + 1] = generator.randrange(0xFE)
+     address += 2
+    data[address] = generator.randrange(0xFE)
+    data[address + 1] = 0xFF
+    data[address + 2] = generator.randrange(0x100)
+    address += 3
+
+ # Finally, strip the header if an unheadered rom was requested, and make sure the
+ # first two bytes are what the loader expects from an unheadered rom.
+ if not headered:
+  data = data[0x200:]
+  data[0:2] = b"\x78\x18"
+ return bytes(data)
+
+# Runs the given function and returns its result along with how long it took in
+# seconds.
+def timed(function):
+ start = time.perf_counter()
+ result = function()
+ return result, time.perf_counter() - start
+
+# Runs the given function and returns its result, how long it took in seconds, and
+# the amount of memory it left allocated and the peak amount allocated while it ran,
+# in bytes. Tracking the memory slows things down quite a bit, so the times from
+# this are only useful for comparing against each other.
+def measure(function):
+ tracemalloc.start()
+ start = time.perf_counter()
+ result = function()
+ elapsed = time.perf_counter() - start
+ current, peak = tracemalloc.get_traced_memory()
+ tracemalloc.stop()
+ return result, elapsed, current, peak
+
+# The raw bytes stored as a list of ints, the way RomData used to store them, with
+# just enough of the RomBuffer interface (see rom.py) for the current code to read
+# the game data from it.
+class ListData(list):
+
+ def view(self, address, length):
+  return memoryview(bytes(self[address:address + length]))
+
+# Compares loading, reading, and saving a rom with the raw bytes stored as a list of
+# ints (the way RomData used to store them) against the bytearray it uses now.
+def benchmark_romdata(filename):
+ results = []
+ for storage in ["list", "bytearray"]:
+
+  # Load the rom, converting the data back to a list for the "before" numbers.
+  def load():
+   ff4 = FF4Rom(filename)
+   if storage == "list":
+    ff4.rom.data = ListData(ff4.rom.data)
+   return ff4
+  ff4, load_time, load_memory, load_peak = measure(load)
+
+  # Read every byte of the rom through the usual indexing.
+  def read_bytes():
+   data = ff4.rom.data
+   total = 0
+   for address in range(len(data)):
+    total += data[address]
+   return total
+  ignored, scan_time = timed(read_bytes)
+
+  # Parse all the game data.
+  ignored, read_time = timed(ff4.read)
+
+  # And save it back out to a temporary file. The list version has to be converted
+  # to bytes first, which is what saving used to do.
+  output = os.path.join(tempfile.gettempdir(), "gamingway-benchmark.smc")
+  def save():
+   if storage == "list":
+    with open(output, "wb") as romfile:
+     romfile.write(bytearray(ff4.rom.data)[0 if ff4.headered else 0x200:])
+   else:
+    ff4.save(output)
+  ignored, save_time, ignored, save_peak = measure(save)
+  os.remove(output)
+
+  results.append("{:>9}: load {:6.3f}s {:8.1f} KB held | ".format(storage, load_time, load_memory / 1024))
+  results[-1] += "scan {:6.3f}s | read {:6.3f}s | ".format(scan_time, read_time)
+  results[-1] += "save {:6.3f}s {:8.1f} KB peak".format(save_time, save_peak / 1024)
+ return "\n".join(results)
+
+# Compares opening a rom and reading one type of data from it when the file is
+# copied into memory against when it is memory mapped.
+def benchmark_loading(filename, datatype = "spells"):
+ results = []
+ for mode in ["copy", "mmap"]:
+  def load():
+   ff4 = FF4Rom(filename, mode)
+   ff4.read(datatype)
+   return ff4
+  ff4, load_time, load_memory, load_peak = measure(load)
+  results.append("{:>9}: load + read {} {:6.3f}s ".format(mode, datatype, load_time))
+  results[-1] += "{:8.1f} KB held {:8.1f} KB peak".format(load_memory / 1024, load_peak / 1024)
+ return "\n".join(results)
+
+# This builds a fake IPS patch with lots of records of random data (and a few RLE
+# runs mixed in) spread over the given number of bytes of the rom.
+def synthetic_patch(size = 0x180000, seed = 0):
+ generator = random.Random(seed)
+ patch = bytearray(b"PATCH")
+ address = 0x200
+ while address < size:
+  length = generator.randrange(1, 0x1000)
+  patch += address.to_bytes(3, "big")
+  if generator.random() < 0.1:
+   patch += bytes(2) + length.to_bytes(2, "big") + bytes([generator.randrange(0x100)])
+  else:
+   patch += length.to_bytes(2, "big") + generator.randbytes(length)
+  address += length + generator.randrange(0x100)
+ patch += b"EOF"
+ return bytes(patch)
+
+# Times applying a large IPS patch to the rom.
+def benchmark_patching(filename):
+ patchname = os.path.join(tempfile.gettempdir(), "gamingway-synthetic.ips")
+ with open(patchname, "wb") as patchfile:
+  patchfile.write(synthetic_patch())
+ ff4 = FF4Rom(filename)
+ touched, patch_time = timed(lambda: ff4.rom.apply_patch(patchname))
+ os.remove(patchname)
+ patched = sum(end - start for start, end in touched)
+ return "    apply: {:6.3f}s for {:8.1f} KB patched".format(patch_time, patched / 1024)
+
+# Times making a patch in each format after applying a large IPS patch to the rom,
+# and then applying the patch that was made to a fresh copy of the rom.
+def benchmark_patch_formats(filename):
+ patchname = os.path.join(tempfile.gettempdir(), "gamingway-synthetic.ips")
+ with open(patchname, "wb") as patchfile:
+  patchfile.write(synthetic_patch())
+ ff4 = FF4Rom(filename)
+ ff4.rom.apply_patch(patchname)
+ results = []
+ for format in ["ips", "bps", "ups"]:
+  result, make_time = timed(lambda: ff4.make_patch(filename, format, patchname))
+  fresh = FF4Rom(filename)
+  ignored, apply_time = timed(lambda: fresh.rom.apply_patch(patchname))
+  results.append("{:>9}: make {:6.3f}s for {:8.1f} KB patch | ".format(format, make_time, len(result) / 1024))
+  results[-1] += "apply {:6.3f}s".format(apply_time)
+ os.remove(patchname)
+ return "\n".join(results)
+
+# Compares saving the whole rom against saving only the changed bytes after making a
+# single small change.
+def benchmark_saving(filename):
+ output = os.path.join(tempfile.gettempdir(), "gamingway-benchmark.smc")
+ ff4 = FF4Rom(filename)
+ ff4.save(output)
+ ff4.read("monsters")
+ ff4.monsters[0].hp = 1234
+ ff4.write("monsters")
+ results = []
+ for incremental in [False, True]:
+  ignored, save_time = timed(lambda: ff4.save(output, incremental))
+  results.append("{:>11}: save {:6.3f}s".format("incremental" if incremental else "full", save_time))
+ results[-1] += " for {} changed ranges".format(len(ff4.rom.dirty_ranges()))
+ os.remove(output)
+ return "\n".join(results)
+
+# Compares two ways of throwing away a failed attempt at changing the rom: loading
+# the rom again, and restoring a snapshot taken before the attempt. Only the time
+# spent throwing the attempt away is counted.
+def benchmark_snapshots(filename, attempts = 10):
+ ff4 = FF4Rom(filename)
+ ff4.read("monsters")
+ generator = random.Random(0)
+ def attempt():
+  for monster in ff4.monsters:
+   monster.hp = generator.randrange(1, 60000)
+  ff4.write("monsters")
+ def reload():
+  ff4.rom = FF4Rom(filename).rom
+ reload_time = 0
+ for count in range(attempts):
+  attempt()
+  reload_time += timed(reload)[1]
+ snapshot = ff4.snapshot()
+ restore_time = 0
+ for count in range(attempts):
+  attempt()
+  restore_time += timed(lambda: ff4.restore(snapshot))[1]
+ ff4.release(snapshot)
+ results = ["{:>9}: {} attempts {:6.3f}s".format("reload", attempts, reload_time)]
+ results.append("{:>9}: {} attempts {:6.3f}s".format("restore", attempts, restore_time))
+ return "\n".join(results)
+
+# Compares the memory used by making many variants of a rom by cloning one that's
+# already been read against loading and reading the rom separately for each one.
+# Each variant changes one monster and writes the monsters back.
+def benchmark_cloning(filename, variants = 10):
+ base = FF4Rom(filename)
+ base.read()
+ base.write()
+ results = []
+ for method in ["load", "clone"]:
+  def make():
+   made = []
+   for index in range(variants):
+    if method == "clone":
+     variant = base.clone()
+    else:
+     variant = FF4Rom(filename)
+     variant.read()
+    variant.monsters[0].hp = index + 1
+    variant.write("monsters")
+    made.append(variant)
+   return made
+  made, elapsed, memory, peak = measure(make)
+  results.append("{:>9}: {} variants {:6.3f}s {:8.1f} KB each".format(method, variants, elapsed, memory / 1024 / variants))
+ return "\n".join(results)
+
+# Compares decoding and encoding every item, spell, and monster name one symbol at a
+# time (the way the text interface used to do it) against the compiled tables it
+# uses now. Each is repeated a number of times to get measurable numbers.
+def benchmark_text(filename, repeats = 100):
+ ff4 = FF4Rom(filename)
+ codec = text.TextInterface()
+ names = []
+ tables = [(ff4.rom.ITEM_NAMES_START, ff4.rom.ITEM_NAME_WIDTH, ff4.rom.TOTAL_ITEMS),
+           (ff4.rom.SPELL_NAMES_START, ff4.rom.SPELL_NAME_WIDTH, ff4.rom.TOTAL_SPELLS),
+           (ff4.rom.MONSTER_NAMES_START, ff4.rom.MONSTER_NAME_WIDTH, ff4.rom.TOTAL_MONSTERS)]
+ for start, width, count in tables:
+  for index in range(count):
+   address = start + index * width
+   names.append(bytes(ff4.rom.data[address:address + width]))
+ decoded = [codec.decode(name) for name in names]
+
+ # The old way of decoding built a string of FF4 symbols one character at a time,
+ # and then converted it to ASCII one character at a time.
+ def decode_old():
+  for name in names:
+   ff4string = ""
+   for byte in name:
+    ff4string += chr(byte)
+   result = ""
+   for letter in ff4string:
+    result += codec.ff4totext[letter]
+
+ # The old way of encoding read the text one character at a time, keeping track of
+ # whether it was inside a code in square brackets.
+ def encode_old():
+  for name in decoded:
+   result = ""
+   codemode = False
+   code = ""
+   for letter in name:
+    if codemode:
+     code += letter
+     if letter == "]":
+      codemode = False
+      result += codec.texttoff4[code]
+    elif letter == "[":
+     code = "["
+     codemode = True
+    else:
+     result += codec.texttoff4[letter]
+   [ord(letter) for letter in result]
+
+ def decode_new():
+  for name in names:
+   codec.decode(name)
+ def encode_new():
+  for name in decoded:
+   codec.encode(name)
+
+ results = []
+ for label, old, new in [("decode", decode_old, decode_new), ("encode", encode_old, encode_new)]:
+  ignored, old_time = timed(lambda: [old() for count in range(repeats)])
+  ignored, new_time = timed(lambda: [new() for count in range(repeats)])
+  results.append("{:>9}: {} names x{} | old {:6.3f}s | new {:6.3f}s".format(label, len(names), repeats, old_time, new_time))
+
+ # Reading whole name tables at once, compared to reading and decoding each name
+ # from the rom separately the way the categories used to.
+ def read_separately():
+  for start, width, count in tables:
+   for index in range(count):
+    address = start + index * width
+    codec.decode(ff4.rom.data[address:address + width]).rstrip()
+ def read_tables():
+  for start, width, count in tables:
+   codec.read_name_table(ff4.rom, start, width, count)
+ ignored, old_time = timed(lambda: [read_separately() for count in range(repeats)])
+ ignored, new_time = timed(lambda: [read_tables() for count in range(repeats)])
+ results.append("{:>9}: {} names x{} | old {:6.3f}s | new {:6.3f}s".format("tables", len(names), repeats, old_time, new_time))
+ return "\n".join(results)
+
+# Times reading and writing the types of data made of fixed-size records.
+def benchmark_records(filename, repeats = 20):
+ ff4 = FF4Rom(filename)
+ results = []
+ for datatype in ["spells", "items", "characters", "maps"]:
+  ignored, read_time = timed(lambda: [ff4.read(datatype) for count in range(repeats)])
+  ignored, write_time = timed(lambda: [ff4.write(datatype) for count in range(repeats)])
+  results.append("{:>10}: x{} | read {:6.3f}s | write {:6.3f}s".format(datatype, repeats, read_time, write_time))
+ return "\n".join(results)
+
+# Measures how much memory the game objects take up once they've been read, for the
+# types of data made of lots of small objects. The rom is loaded first, so only what
+# reading adds is counted.
+def benchmark_footprint(filename):
+ ff4 = FF4Rom(filename)
+ results = []
+ total = 0
+ for datatype in ["attributes", "spells", "items", "characters", "monsters", "maps"]:
+  ignored, read_time, held, peak = measure(lambda: ff4.read(datatype))
+  total += held
+  results.append("{:>10}: read {:6.3f}s | {:8.1f} KB held".format(datatype, read_time, held / 1024))
+ results.append("{:>10}: {:8.1f} KB held".format("total", total / 1024))
+ return "\n".join(results)
+
+# Times reading and writing whole NumPy tables, compared to reading and writing the
+# same data as objects (see tables.py). This needs NumPy, so it's skipped without it.
+def benchmark_tables(filename, repeats = 20):
+ if tables.numpy is None:
+  return "(skipped; NumPy isn't installed)"
+ ff4 = FF4Rom(filename)
+ results = []
+ for name in ["weapons", "armors", "spells", "monsters", "maps"]:
+  table, read_time = timed(lambda: [ff4.table(name) for count in range(repeats)])
+  ignored, write_time = timed(lambda: [ff4.write_table(name, table[-1]) for count in range(repeats)])
+  results.append("{:>10}: x{} | read {:6.3f}s | write {:6.3f}s".format(name, repeats, read_time, write_time))
+ return "\n".join(results)
+
+# Compares reading everything from the rom without a cache, with an empty cache
+# (which also fills it), and with the cache already filled (see cache.py).
+def benchmark_cache(filename):
+ directory = tempfile.mkdtemp()
+ results = []
+ for label in ["no cache", "cold", "warm"]:
+  ff4 = FF4Rom(filename, cache = None if label == "no cache" else directory)
+  ignored, read_time = timed(lambda: ff4.read())
+  results.append("{:>10}: read {:6.3f}s".format(label, read_time))
+ shutil.rmtree(directory)
+ return "\n".join(results)
+
+# Compares reading everything serially against reading it in a pool of worker
+# processes (see workers.py), on a synthetic rom the size of an expanded hack. How
+# much the workers help depends on how many cores the machine has; with only one,
+# they can only add the cost of starting them and sending the data back.
+def benchmark_parallel(size = 0x400000):
+ filename = os.path.join(tempfile.gettempdir(), "gamingway-synthetic-large.smc")
+ with open(filename, "wb") as romfile:
+  romfile.write(synthetic_rom(size))
+ results = ["{} cores".format(os.cpu_count())]
+ for label, parallel in [("serial", False), ("parallel", True)]:
+  ff4 = FF4Rom(filename)
+  ignored, read_time = timed(lambda: ff4.read(parallel = parallel))
+  results.append("{:>10}: read {:6.3f}s".format(label, read_time))
+ os.remove(filename)
+ return "\n".join(results)
+
+# Compares writing everything back with nothing changed, with one monster, one
+# tilemap tile and one trigger changed, and with everything written regardless (as
+# it is when the rom has changed underneath the objects; see "write" in
+# gamingway.py).
+def benchmark_writing(filename, repeats = 20):
+ ff4 = FF4Rom(filename)
+ ff4.read()
+ ff4.write()
+ def change():
+  ff4.monsters[0].hp = ff4.monsters[0].hp ^ 1
+  ff4.tilemaps[0].tiles[0][0] = ff4.tilemaps[0].tiles[0][0] ^ 1
+  for map in ff4.maps:
+   if len(map.triggers) > 0:
+    map.triggers[0].x = map.triggers[0].x ^ 1
+    break
+  ff4.write()
+ def force():
+  ff4.synced = {}
+  ff4.write()
+ results = []
+ for label, function in [("unchanged", ff4.write), ("one change", change), ("forced", force)]:
+  ignored, write_time = timed(lambda: [function() for count in range(repeats)])
+  results.append("{:>10}: x{} | write {:6.3f}s".format(label, repeats, write_time))
+ return "\n".join(results)
+
+if __name__ == "__main__":
+
+ # Use the rom given on the command line, or make a synthetic one if there isn't
+ # one.
+ if len(sys.argv) > 1:
+  filename = sys.argv[1]
+ else:
+  filename = os.path.join(tempfile.gettempdir(), "gamingway-synthetic.smc")
+  with open(filename, "wb") as romfile:
+   romfile.write(synthetic_rom())
+
+ print("RomData storage")
+ print(benchmark_romdata(filename))
+ print("Loading")
+ print(benchmark_loading(filename))
+ print("IPS patching")
+ print(benchmark_patching(filename))
+ print("Patch formats")
+ print(benchmark_patch_formats(filename))
+ print("Saving")
+ print(benchmark_saving(filename))
+ print("Snapshots")
+ print(benchmark_snapshots(filename))
+ print("Cloning")
+ print(benchmark_cloning(filename))
+ print("Text")
+ print(benchmark_text(filename))
+ print("Records")
+ print(benchmark_records(filename))
+ print("Tables")
+ print(benchmark_tables(filename))
+ print("Footprint")
+ print(benchmark_footprint(filename))
+ print("Cache")
+ print(benchmark_cache(filename))
+ print("Writing")
+ print(benchmark_writing(filename))
+ print("Parallel reading")
+ print(benchmark_parallel())
@@ -0,0 +1,111 @@
+import os
+import pickle
+import hashlib
+import registry
+
+# The format of the cache files. This goes up whenever the way they're stored
+# changes, so that old files are ignored instead of being misread.
+CACHE_VERSION = 1
+
+# The source code of the library, as a hash. This is the closest thing it has to a
+# version number: any change to the code (such as adding an attribute to a class)
+# could change what the objects look like, so the cache is only used by the exact
+# same code that filled it.
+source_hash = None
+
+def library_version():
+ global source_hash
+ if source_hash is None:
+  digest = hashlib.blake2b(digest_size = 16)
+  digest.update(str(CACHE_VERSION).encode())
+  top = os.path.dirname(os.path.abspath(__file__))
+  for folder in ["", "categories", "constants"]:
+   path = os.path.join(top, folder)
+   for filename in sorted(os.listdir(path)):
+    if filename.endswith(".py"):
+     digest.update(filename.encode())
+     with open(os.path.join(path, filename), "rb") as sourcefile:
+      digest.update(sourcefile.read())
+  source_hash = digest.hexdigest()
+ return source_hash
+
+# The objects that pickled game data can refer to without storing them: the FF4Rom's
+# configuration and text interface, and the lists (and objects in them) of the types
+# of data it depends on (see "dependencies" in registry.py), such as the spells that
+# the spellbooks refer to. These are stored as references and looked up again when
+# the data is loaded, so that it still refers to the very same objects. This maps
+# each object's id to its reference and each reference to its object.
+def shared(ff4, name):
+ objects = {("config",): ff4.config, ("text",): ff4.text}
+ for dependency in registry.references(name):
+  objects[(dependency,)] = getattr(ff4, dependency)
+  for index, value in enumerate(getattr(ff4, dependency)):
+   objects[(dependency, index)] = value
+ return {id(value): reference for reference, value in objects.items()}, objects
+
+# These pickle the game data of the given type into the given file, and load it back
+# from one, with the shared objects above stored as references. Besides the cache
+# below, this is also how data read in another process is sent back (see
+# workers.py).
+def dump(ff4, name, value, datafile):
+ references, objects = shared(ff4, name)
+ pickler = pickle.Pickler(datafile, pickle.HIGHEST_PROTOCOL)
+ pickler.persistent_id = lambda value: references.get(id(value))
+ pickler.dump(value)
+
+def load(ff4, name, datafile):
+ references, objects = shared(ff4, name)
+ unpickler = pickle.Unpickler(datafile)
+ unpickler.persistent_load = lambda reference: objects[tuple(reference)]
+ return unpickler.load()
+
+# A cache of game data that has already been read, saved in a folder on disk, so
+# that reading the same data from the same rom again (such as every time a script
+# that works on a particular base rom starts) is just a matter of loading it. Each
+# type of data is cached separately, and is found by a hash of the bytes of the rom
+# it's read from (see data_regions in rom.py) along with the library version. So
+# changing the monsters in the rom only means the monsters have to be read again,
+# and an older or newer version of the library never loads objects it didn't make.
+# The files are pickles, so only use a folder that nobody else can write to.
+class ModelCache:
+
+ def __init__(self, directory):
+  self.directory = directory
+  os.makedirs(directory, exist_ok = True)
+
+ # Returns the hash that identifies the given type of data as it is in the given
+ # rom right now.
+ def key(self, ff4, name):
+  digest = hashlib.blake2b(digest_size = 16)
+  digest.update(library_version().encode())
+  digest.update(name.encode())
+  digest.update(ff4.rom.region_hashes([name])[name])
+  return digest.hexdigest()
+
+ def filename(self, ff4, name):
+  return os.path.join(self.directory, "{}-{}.pickle".format(name, self.key(ff4, name)))
+
+ # Returns the cached data of the given type for the given rom, or None if there
+ # isn't any (or it can't be loaded).
+ def load(self, ff4, name):
+  filename = self.filename(ff4, name)
+  if not os.path.exists(filename):
+   return None
+  try:
+   with open(filename, "rb") as cachefile:
+    return load(ff4, name, cachefile)
+
+  # A file that was only partly written or is otherwise broken can fail in all
+  # sorts of ways; whatever the reason, it just means the data has to be read.
+  except Exception:
+   return None
+
+ # Saves data of the given type that was just read from the given rom. The file is
+ # written under a temporary name first, so that a script that's stopped partway
+ # through never leaves half a file behind.
+ def save(self, ff4, name, value):
+  filename = self.filename(ff4, name)
+  temporary = "{}.{}.tmp".format(filename, os.getpid())
+  with open(temporary, "wb") as cachefile:
+   dump(ff4, name, value, cachefile)
+  os.replace(temporary, filename)
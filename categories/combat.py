@@ -3,20 +3,37 @@ from monster import Monster
 # Read the list of monsters from the rom.
 def read_monsters(rom, text, config):
  monsters = []
- for index in range(rom.TOTAL_MONSTERS):
+
+ # The whole pointer table is read in one go, and so are the names.
+ pointers = rom.read_u16_array(rom.MONSTER_POINTERS_START, rom.TOTAL_MONSTERS)
+ names = text.read_name_table(rom, rom.MONSTER_NAMES_START, rom.MONSTER_NAME_WIDTH, rom.TOTAL_MONSTERS)
+ for index, offset in enumerate(pointers):
   monster = Monster(config)
   monsters.append(monster)
-  pointer = rom.MONSTER_POINTERS_START + index * 2
-  offset = rom.data[pointer] + rom.data[pointer + 1] * 0x100
   monster.read(rom, rom.MONSTER_DATA_BONUS + offset)
-  offset = rom.MONSTER_NAME_WIDTH * index
-  monster.read_name(rom, rom.MONSTER_NAMES_START + offset, text)
+  monster.name = names[index]
   monster.read_gp(rom, rom.MONSTER_GP_START + index * 2)
   monster.read_xp(rom, rom.MONSTER_XP_START + index * 2)
  return monsters
 
 # Write the list of monsters back to the rom.
-def write_monsters(rom, text, monsters):
+# If none of the monsters have changed since they were read or last written, nothing
+# is written at all (so the packing described below doesn't happen either), unless
+# "force" is True, which means the rom may have been changed underneath them.
+def write_monsters(rom, text, monsters, force = True):
+
+ # Only the monsters that have changed since they were last read or written are
+ # encoded; the rest already have their data saved.
+ states = [monster.state() for monster in monsters]
+ unchanged = [monster.saved is not None and state == monster.saved[0] for state, monster in zip(states, monsters)]
+ if not force and all(unchanged):
+  return
+ encodings = []
+ for monster, same in zip(monsters, unchanged):
+  if same:
+   encodings.append(monster.saved[1])
+  else:
+   encodings.append(monster.encode())
  
  # It appears the monster data in the vanilla rom is not "perfectly
  # packed" as it were. The occasional monster pointer starts a byte or
@@ -31,10 +48,15 @@ def write_monsters(rom, text, monsters):
  if room_needed > rom.MONSTER_DATA_ROOM:
   print("ERROR: Not enough room for monster data.")
  else:
+  # The pointers are collected as we go and the table is written all at once at
+  # the end.
   address = rom.MONSTER_DATA_START
+  pointers = []
   for index, monster in enumerate(monsters):
-   pointer = address - rom.MONSTER_DATA_BONUS
-   rom.write_wide(rom.MONSTER_POINTERS_START + index * 2, pointer)
-   address += monster.write(rom, address)
+   pointers.append(address - rom.MONSTER_DATA_BONUS)
+   rom.inject(address, encodings[index])
+   monster.saved = (states[index], encodings[index])
+   address += len(encodings[index])
+  rom.write_u16_array(rom.MONSTER_POINTERS_START, pointers)
   
   
\ No newline at end of file
@@ -55,11 +55,13 @@ def read_items(rom, text):
   else:
    item = Item()
   
-  # Finally, we add it to the list and read its generic item information.
+  # Finally, we add it to the list.
   items.append(item)
-  name_offset = index * rom.ITEM_NAME_WIDTH
-  name_address = rom.ITEM_NAMES_START + name_offset
-  item.read_name(rom, name_address, text)
+ 
+ # The names are all read at once, since they're stored together in one table.
+ names = text.read_name_table(rom, rom.ITEM_NAMES_START, rom.ITEM_NAME_WIDTH, len(items))
+ for item, name in zip(items, names):
+  item.name = name
  
  # And return the fully constructed list.
  return items
@@ -88,8 +90,9 @@ def write_items(rom, text, items):
     subindex = index - rom.SUPPLIES_START_INDEX
     item.write(rom, rom.SUPPLY_DATA_START + subindex * 6)
   
-  # Tools have nothing special to write beyond what gets written for all items, so
-  # it doesn't get an else clause of its own. We arrive here regardless of which
-  # item subtype it was.
-  name_offset = index * rom.ITEM_NAME_WIDTH
-  item.write_name(rom, rom.ITEM_NAMES_START + name_offset, text)
+  # Tools have nothing special to write beyond the name, which is written along
+  # with all the others below, so they don't get an else clause of their own.
+ 
+ # The names are all written at once, since they're stored together in one table.
+ names = [item.name for item in items]
+ text.write_name_table(rom, rom.ITEM_NAMES_START, rom.ITEM_NAME_WIDTH, names)
@@ -8,11 +8,11 @@ def read_spells(rom, text):
  # Spell object's read function. However, there are several different types of data
  # that have to be read separately.
  spells = []
+ names = text.read_name_table(rom, rom.SPELL_NAMES_START, rom.SPELL_NAME_WIDTH, rom.TOTAL_SPELLS)
  for index in range(rom.TOTAL_SPELLS):
   spell = Spell()
   spells.append(spell)
-  nameoffset = index * rom.SPELL_NAME_WIDTH
-  spell.read_name(rom, rom.SPELL_NAMES_START + nameoffset, text)
+  spell.name = names[index]
   spell.read(rom, rom.SPELL_DATA_START + index * 6)
   spell.read_visuals(rom, rom.SPELL_VISUALS_START + index * 4)
   spell.read_sound(rom, rom.SPELL_SOUNDS_START + index)
@@ -20,9 +20,9 @@ def read_spells(rom, text):
 
 # Write all the spells back to the rom.
 def write_spells(rom, text, spells):
+ names = [spell.name for spell in spells]
+ text.write_name_table(rom, rom.SPELL_NAMES_START, rom.SPELL_NAME_WIDTH, names)
  for index, spell in enumerate(spells):
-  nameoffset = index * rom.SPELL_NAME_WIDTH
-  spell.write_name(rom, rom.SPELL_NAMES_START + nameoffset, text)
   spell.write(rom, rom.SPELL_DATA_START + index * 6)
   spell.write_visuals(rom, rom.SPELL_VISUALS_START + index * 4)
   spell.write_sound(rom, rom.SPELL_SOUNDS_START + index)
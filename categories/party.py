@@ -6,18 +6,20 @@ from command import Command
 # Read all the jobs from the rom.
 def read_jobs(rom, text):
  jobs = []
+ names = text.read_name_table(rom, rom.JOB_NAMES_START, rom.JOB_NAME_WIDTH, rom.TOTAL_JOBS)
  for index in range(rom.TOTAL_JOBS):
   job = Job()
   jobs.append(job)
-  job.read_name(rom, rom.JOB_NAMES_START + index * rom.JOB_NAME_WIDTH, text)
+  job.name = names[index]
   job.read(rom, rom.JOB_DATA_START + index * 3)
   job.read_menu(rom, rom.JOB_MENU_DATA_START + index * 3)
  return jobs
 
 # Write all the jobs back to the rom.
 def write_jobs(rom, text, jobs):
+ names = [job.name for job in jobs]
+ text.write_name_table(rom, rom.JOB_NAMES_START, rom.JOB_NAME_WIDTH, names)
  for index, job in enumerate(jobs):
-  job.write_name(rom, rom.JOB_NAMES_START + index * rom.JOB_NAME_WIDTH, text)
   job.write(rom, rom.JOB_DATA_START + index * 3)
   job.write_menu(rom, rom.JOB_MENU_DATA_START + index * 3)
 
@@ -64,20 +66,20 @@ def write_actors(rom, actors):
 
 def read_commands(rom, text):
  commands = []
+ names = text.read_name_table(rom, rom.COMMAND_NAMES_START, rom.COMMAND_NAME_WIDTH, rom.TOTAL_COMMANDS)
  for index in range(rom.TOTAL_COMMANDS):
   command = Command()
   commands.append(command)
-  offset = index * rom.COMMAND_NAME_WIDTH
-  command.read_name(rom, rom.COMMAND_NAMES_START + offset, text)
+  command.name = names[index]
   command.read_target(rom, rom.COMMAND_TARGETS_START + index)
   command.read_statuses(rom, rom.COMMAND_STATUSES_START + index * 2)
   command.read_charging(rom, rom.COMMAND_CHARGINGS_START + index)
  return commands
 
 def write_commands(rom, text, commands):
+ names = [command.name for command in commands]
+ text.write_name_table(rom, rom.COMMAND_NAMES_START, rom.COMMAND_NAME_WIDTH, names)
  for index, command in enumerate(commands):
-  offset = index * rom.COMMAND_NAME_WIDTH
-  command.write_name(rom, rom.COMMAND_NAMES_START + offset, text)
   command.write_target(rom, rom.COMMAND_TARGETS_START + index)
   command.write_statuses(rom, rom.COMMAND_STATUSES_START + index * 2)
   command.write_charging(rom, rom.COMMAND_CHARGINGS_START + index)
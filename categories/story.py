@@ -1,14 +1,100 @@
 from event import Event
+import message
+from message import MessageBank
 
 def read_events(rom, config):
  oldaddress = None
  events = []
- for index in range(rom.TOTAL_EVENTS):
+ pointers = rom.read_u16_array(rom.EVENT_POINTERS_START, rom.TOTAL_EVENTS)
+ for pointer in pointers:
   event = Event()
   events.append(event)
-  pointer = rom.EVENT_POINTERS_START + index * 2
-  address = rom.read_wide(pointer) + rom.EVENT_POINTER_BONUS
+  address = pointer + rom.EVENT_POINTER_BONUS
   if address != oldaddress:
    event.read(rom, config, address)
    oldaddress = address
- return events
\ No newline at end of file
+ return events
+
+# Reads one of the banks of messages. Bank 1 holds most of the dialogue (the "lo"
+# and "hi" instructions refer to its first and second half), bank 2 holds the
+# messages local to each map, and bank 3 holds the rest. The messages themselves
+# aren't converted until they're looked up (see message.py).
+def read_messages(rom, text, bank):
+ messages = MessageBank()
+ if bank == 1:
+  messages.read(rom, text, rom.BANK1_POINTERS_START, rom.TOTAL_BANK1_MESSAGES, rom.BANK1_POINTER_BONUS, rom.BANK1_DATA_END)
+ elif bank == 2:
+  messages.read(rom, text, rom.BANK2_POINTERS_START, rom.TOTAL_BANK2_MESSAGES, rom.BANK2_POINTER_BONUS, rom.BANK2_DATA_END)
+ elif bank == 3:
+  messages.read(rom, text, rom.BANK3_POINTERS_START, rom.TOTAL_BANK3_MESSAGES, rom.BANK3_POINTER_BONUS, rom.BANK3_DATA_END)
+ else:
+  print("ERROR: There is no message bank {}.".format(bank))
+ return messages
+
+# Writes the given message banks back to the rom. Since all the banks share the same
+# DTE codes (see message.py), they have to be written together. Rather than keeping
+# the DTE pairs the rom already had, new ones are chosen that make all the messages
+# as short as possible, which matters when there's a lot of new text (such as for a
+# translation). Each bank is written back to the space it originally took up, and
+# if any of them no longer fits, nothing is written.
+# Returns a list with the number of bytes saved in each bank compared to before (or
+# None if nothing was written).
+# Nothing is written at all until where the messages are in the rom has been
+# verified (see MESSAGE_LOCATIONS_VERIFIED in rom.py), since otherwise this could
+# overwrite other data.
+def write_messages(rom, text, banks):
+ if not rom.MESSAGE_LOCATIONS_VERIFIED:
+  print("ERROR: Messages can't be written until where they are in the rom has been verified.")
+  return None
+ first = rom.DTE_FIRST_CODE
+ count = rom.TOTAL_DTE_CODES
+
+ # Messages that appear more than once in a bank are only stored once, with the
+ # pointers all pointing to the same place.
+ uniques = []
+ packing = []
+ for bank in banks:
+  unique = list(dict.fromkeys(bank))
+  uniques.append(unique)
+  for entry in unique:
+   packing.append(bank.symbols(text, entry, first, count))
+ pairs = message.pack(packing, first, count)
+
+ # Then each bank is put together and checked to make sure it fits.
+ contents = []
+ pointers = []
+ position = 0
+ for bank, unique in zip(banks, uniques):
+  data = bytearray()
+  offsets = {}
+  for entry in unique:
+   offsets[entry] = bank.start + len(data)
+   data += bytes(packing[position])
+   data.append(0)
+   position += 1
+  if len(data) > bank.room:
+   print("ERROR: Not enough room for messages ({} bytes needed, {} available).".format(len(data), bank.room))
+   return None
+  contents.append(data)
+  pointers.append([offsets[entry] for entry in bank])
+
+ # The DTE table always has room for all the codes, so any that weren't needed are
+ # just filled in with something harmless.
+ table = bytearray()
+ for pair in pairs:
+  table.extend(pair)
+ table.extend(text.encode(" ") * 2 * (count - len(pairs)))
+ rom.inject(rom.DTE_TABLE_START, table)
+
+ savings = []
+ for bank, data, offsets in zip(banks, contents, pointers):
+  rom.inject(bank.bonus + bank.start, data)
+  rom.write_u16_array(bank.address, offsets)
+  savings.append(bank.room - len(data))
+
+  # The bank is read again so that it matches what's now in the rom. It keeps all
+  # of its original space though, even if the messages now take up less.
+  room = bank.room
+  bank.read(rom, text, bank.address, bank.count, bank.bonus, bank.limit)
+  bank.room = max(room, bank.room)
+ return savings
\ No newline at end of file
@@ -13,16 +13,14 @@ def read_map_names(rom, text):
  # There's no pointer table; the names are just separated by 00 bytes.
  for index in range(rom.TOTAL_MAP_NAMES):
  
-  # Start with a blank name, then read bytes one by one, adding the corresponding
-  # symbols to the name until we read a 00 byte.
-  name = ""
-  while rom.data[address] > 0:
-   name += chr(rom.data[address])
-   address += 1
+  # Find the 00 byte that marks the end of the name.
+  end = address
+  while rom.data[end] > 0:
+   end += 1
   
-  # Finally, we convert the name to ascii to make it easier to work with.
-  address += 1
-  map_names[index] = text.asciitext(name)
+  # Then we convert the name to ascii to make it easier to work with.
+  map_names[index] = text.decode(rom.data[address:end])
+  address = end + 1
   
  # And return the completed list.
  return map_names
@@ -34,7 +32,7 @@ def write_map_names(rom, text, map_names):
  # before we write it in order to prevent data bleed.
  room_needed = 0
  for name in map_names:
-  converted = text.ff4text(name)
+  converted = text.encode(name)
   room_needed += len(converted) + 1
  
  # If there isn't enough room for all the map names, we don't write any of them.
@@ -49,8 +47,8 @@ def write_map_names(rom, text, map_names):
   # Loop through each map name, converting it back from ASCII to FF4 text
   # encoding, and then injecting it into the rom.
   for name in map_names:
-   converted = text.ff4text(name)
-   rom.inject(address, text.to_bytes(converted))
+   converted = text.encode(name)
+   rom.inject(address, converted)
    
    # Make sure we update the address as we go.
    address += len(converted)
@@ -91,10 +89,19 @@ def read_maps(rom):
  return maps
 
 # This writes the Map data back to the rom.
-def write_maps(rom, maps, include_triggers = True):
+# The triggers of a map that haven't changed since they were read or last written
+# are already in the rom as they are, so they're skipped, as long as they start
+# right where the previous map's triggers end (unless "force" is True, which means
+# the rom may have been changed underneath them). So changing one map's triggers
+# only writes that map, unless the number of them changed, in which case the maps
+# after it are moved along.
+def write_maps(rom, maps, include_triggers = True, force = True):
 
  # This is for tracking where we left off in writing trigger data.
  trigger_address = rom.TRIGGER_DATA_START
+
+ # Where each map's triggers were before anything was written (see above).
+ starts = rom.read_u16_array(rom.TRIGGER_POINTERS_START, len(maps))
  
  # We simply loop through the list of Maps and write each one using the Map object's
  # "write" method.
@@ -109,19 +116,22 @@ def write_maps(rom, maps, include_triggers = True):
   
   # Like the encounter rates, the triggers are categorically part of the Map object,
   # but are stored elsewhere. The trigger list is a variable length record so we
-  # need to make sure there's enough room before we write anything.
+  # need to make sure there's enough room before we write anything. Maps whose
+  # triggers are already in place are skipped (see above).
   if include_triggers:
-   if trigger_address + len(map.triggers) * 5 > rom.TRIGGER_DATA_END:
+   if not force and starts[index] + rom.TRIGGER_POINTER_BONUS == trigger_address and not map.triggers_changed():
+    trigger_address += len(map.triggers) * 5
+   elif trigger_address + len(map.triggers) * 5 > rom.TRIGGER_DATA_END:
     print("ERROR: Not enough room for triggers.")
     print("** Map {} / {}".format(index, len(maps)))
    else:
-    trigger_address = map.write_triggers(rom, trigger_address)
     
-    # The next map's trigger pointer should point to where this map's trigger data
-    # left off.
-    if index < len(maps) - 1:
-     next_pointer = rom.TRIGGER_POINTERS_START + (index + 1) * 2
-     rom.write_wide(next_pointer, trigger_address - rom.TRIGGER_DATA_START)
+    # This map's trigger pointer should point to where the previous map's trigger
+    # data left off. (The first map's triggers always start at the beginning.)
+    if index > 0:
+     pointer = rom.TRIGGER_POINTERS_START + index * 2
+     rom.write_wide(pointer, trigger_address - rom.TRIGGER_DATA_START)
+    trigger_address = map.write_triggers(rom, trigger_address)
 
 # This reads the list of TileMaps from the rom.
 def read_tilemaps(rom):
@@ -131,19 +141,21 @@ def read_tilemaps(rom):
  # pointer, not a pointer to where the previous TileMap's data left off.
  oldaddress = None
  tilemaps = []
+
+ # The whole pointer table is read in one go.
+ pointers = rom.read_u16_array(rom.TILEMAP_POINTERS_START, rom.TOTAL_OVERWORLD_TILEMAPS)
  
  # We simply loop through the TileMap pointer table, computing the pointers and
  # adding the TileMaps to the list. The TileMap object's built-in "read" method is
  # used to read the actual TileMap data from the address pointed to by the pointer.
- for index in range(rom.TOTAL_OVERWORLD_TILEMAPS):
+ for pointer in pointers:
  
   # Create a new TileMap and add it to the list.
   tilemap = TileMap()
   tilemaps.append(tilemap)
   
-  # Read the next pointer and compute the address from it.
-  pointer = rom.TILEMAP_POINTERS_START + index * 2
-  address = rom.read_wide(pointer) + rom.TILEMAP_OVERWORLD_BONUS
+  # Compute the address from the pointer.
+  address = pointer + rom.TILEMAP_OVERWORLD_BONUS
   
   # When the tilemap has no data it uses the same pointer as the previous tilemap.
   # Therefore, we only read data for the map if its pointer is different from the
@@ -151,12 +163,22 @@ def read_tilemaps(rom):
   if address != oldaddress:
    tilemap.read(rom, address)
    oldaddress = address
+  else:
+   tilemap.saved = []
+   tilemap.encoding = b""
 
  # And finally we return the list.
  return tilemaps
 
 # This writes the list of tilemaps back to the rom.
-def write_tilemaps(rom, tilemaps):
+# TileMaps that haven't changed since they were read or last written keep the bytes
+# they were read from or written as (see "write" in tilemap.py), so only the ones
+# that have changed are encoded again. If none of them have, there's nothing to
+# write at all, unless "force" is True (which means the rom may have been changed
+# underneath them, so everything has to be written again regardless).
+def write_tilemaps(rom, tilemaps, force = True):
+ if not force and not any(tilemap.changed() for tilemap in tilemaps):
+  return
 
  # The "oldaddress" variable is there to track the previous TileMap's pointer
  # because when a TileMap has no data, it seems to use the previous TileMap's pointer,
@@ -166,7 +188,9 @@ def write_tilemaps(rom, tilemaps):
  oldaddress = address
  
  # Mostly we just loop through the list and use the TileMap object's "write"
- # method to write it back, but we also need to update the pointer table.
+ # method to write it back, but we also need to update the pointer table. The
+ # pointers are collected as we go and the table is written all at once at the end.
+ pointers = []
  for index, tilemap in enumerate(tilemaps):
  
   # If the TileMap has no data, we write the PREVIOUS TileMap's pointer (not the
@@ -180,13 +204,16 @@ def write_tilemaps(rom, tilemaps):
    pointer = address - rom.TILEMAP_OVERWORLD_BONUS
    oldaddress = address
   
-  # Now we actually write the pointer we decided on above.
-  rom.write_wide(rom.TILEMAP_POINTERS_START + index * 2, pointer)
+  # Now we actually add the pointer we decided on above.
+  pointers.append(pointer)
   
   # And write the actual TileMap data itself, updating the address where we leave
   # off in the process.
   address = tilemap.write(rom, address)
 
+ # Finally, write the pointer table.
+ rom.write_u16_array(rom.TILEMAP_POINTERS_START, pointers)
+
 # This reads the RLE-encoded overworld tile data and returns it as an array.
 def read_overworld(rom):
 
@@ -194,6 +221,7 @@ def read_overworld(rom):
  tilemap = TileMap()
  address = rom.OVERWORLD_DATA_START
  tiles = []
+ encodings = []
 
  # The overworld is stored as 256 "rows" of 256 tiles, all RLE encoded, with a
  # pointer table indicating where each row starts. Each RLE encoded row is also
@@ -202,6 +230,7 @@ def read_overworld(rom):
 
   # Create the row in the tilemap.
   tilemap.tiles.append([])
+  start = address
 
   # Read the current byte.
   tile = rom.data[address]
@@ -246,86 +275,115 @@ def read_overworld(rom):
    # Now we can read the next tile and check if it's FF and so on.
    tile = rom.data[address]
    address += 1
+
+  # The bytes the row was read from are kept, so that writing can use them again
+  # if the row hasn't changed (see write_overworld below).
+  encodings.append(bytes(rom.data[start:address]))
  
  # And finally return the fully parsed tilemap.
+ tilemap.saved = tilemap.snapshot()
+ tilemap.encoding = encodings
  return tilemap
  
 # This writes the 2D array of overworld tiles back to the rom data as a list
 # of 256-tile-wide RLE-encoded rows, along with the appropriate pointers.
-def write_overworld(rom, tilemap):
+# Like the TileMaps above, rows that haven't changed since they were read or last
+# written use the bytes they were read from or written as again, and if none of
+# them have changed, nothing is written at all unless "force" is True.
+def write_overworld(rom, tilemap, force = True):
+ saved = tilemap.saved
+ if saved is None or tilemap.encoding is None:
+  saved = []
+ if not force and tilemap.tiles == saved:
+  return
  address = rom.OVERWORLD_DATA_START
  
- # We go row by row and write each line along with its pointer.
+ # We go row by row and write each line, collecting the pointers as we go. The
+ # pointer table is written all at once at the end.
+ pointers = []
+ encodings = []
  for row in range(0x100):
   
   # First we compute the pointer.
   # The "address" variable is not reset on each loop so it tracks where we left
   # off writing tiles, which is exactly where the next pointer should point.
-  pointer = address - rom.OVERWORLD_DATA_START
-  rom.write_wide(rom.OVERWORLD_POINTERS_START + row * 2, pointer)
+  pointers.append(address - rom.OVERWORLD_DATA_START)
+
+  # Then we write the row, encoding it again only if it's changed.
+  if row < len(saved) and tilemap.tiles[row] == saved[row]:
+   encoding = tilemap.encoding[row]
+  else:
+   encoding = encode_overworld_row(tilemap.tiles[row])
+  rom.inject(address, encoding)
+  address += len(encoding)
+  encodings.append(encoding)
+
+ # Finally, write the pointer table.
+ rom.write_u16_array(rom.OVERWORLD_POINTERS_START, pointers)
+ tilemap.saved = tilemap.snapshot()
+ tilemap.encoding = encodings
+
+# This RLE-encodes one row of overworld tiles and returns the resulting bytes.
+def encode_overworld_row(tiles):
+ result = bytearray()
   
-  # When tracking a run of tiles, oldtile is the tile index and runlength is
-  # how many we've seen so far. The chunk variable is used for writing the four
-  # tile wide "chunks" that are encoded in a single byte in the RLE.
-  oldtile = None
-  runlength = 1
-  chunk = 0
+ # When tracking a run of tiles, oldtile is the tile index and runlength is
+ # how many we've seen so far. The chunk variable is used for writing the four
+ # tile wide "chunks" that are encoded in a single byte in the RLE.
+ oldtile = None
+ runlength = 1
+ chunk = 0
   
-  # Now we are ready to RLE-encode the row.
-  for tile in tilemap.tiles[row]:
+ # Now we are ready to RLE-encode the row.
+ for tile in tiles:
    
-   # If we see a copy of the tile we're already tracking a run of, we simply
-   # increment the length of the run.
-   if tile == oldtile:
-    runlength += 1
+  # If we see a copy of the tile we're already tracking a run of, we simply
+  # increment the length of the run.
+  if tile == oldtile:
+   runlength += 1
     
-   # Otherwise, we have a few more checks to make.
-   else:
+  # Otherwise, we have a few more checks to make.
+  else:
    
-    # First check if there was an existing run that needs to be written.
-    if oldtile != None:
-     if runlength > 1:
-      rom.data[address] = oldtile + 0x80
-      rom.data[address + 1] = runlength - 1
-      address += 2
-     else:
-      rom.data[address] = oldtile
-      address += 1
+   # First check if there was an existing run that needs to be written.
+   if oldtile != None:
+    if runlength > 1:
+     result.append(oldtile + 0x80)
+     result.append(runlength - 1)
+    else:
+     result.append(oldtile)
     
-    # Then, regardless of whether there was a run or not, we check if the
-    # current tile is part of a chunk of four. If we've written such a tile
-    # three or fewer tiles ago, we don't process the current tile just yet.
-    if chunk > 0:
-     chunk -= 1
+   # Then, regardless of whether there was a run or not, we check if the
+   # current tile is part of a chunk of four. If we've written such a tile
+   # three or fewer tiles ago, we don't process the current tile just yet.
+   if chunk > 0:
+    chunk -= 1
     
-    # If we're not already processing a special tile chunk, we see if the
-    # current tile is the start of one. If so, we write the tile but don't
-    # start a run. Instead we signal that the next three tiles are to be
-    # ignored as part of the chunk.
-    elif tile == 0x00 or tile == 0x10 or tile == 0x20 or tile == 0x30:
-     oldtile = None
-     rom.data[address] = tile
-     address += 1
-     chunk = 3
-
-    # It's not a special tile or a continuation of a run, so we start a new run.
-    else:
-     oldtile = tile
-     runlength = 1
-
-  # We're done the row so we just make sure we write the existing run, if any.
-  if oldtile != None:
-   if runlength > 1:
-    rom.data[address] = oldtile + 0x80
-    rom.data[address + 1] = runlength - 1
-    address += 2
+   # If we're not already processing a special tile chunk, we see if the
+   # current tile is the start of one. If so, we write the tile but don't
+   # start a run. Instead we signal that the next three tiles are to be
+   # ignored as part of the chunk.
+   elif tile == 0x00 or tile == 0x10 or tile == 0x20 or tile == 0x30:
+    oldtile = None
+    result.append(tile)
+    chunk = 3
+
+   # It's not a special tile or a continuation of a run, so we start a new run.
    else:
-    rom.data[address] = oldtile
-    address += 1
+    oldtile = tile
+    runlength = 1
+
+ # We're done the row so we just make sure we write the existing run, if any.
+ if oldtile != None:
+  if runlength > 1:
+   result.append(oldtile + 0x80)
+   result.append(runlength - 1)
+  else:
+   result.append(oldtile)
     
-  # Then terminate the row with an FF byte.
-  rom.data[address] = 0xFF
-  address += 1
+ # Then terminate the row with an FF byte.
+ result.append(0xFF)
+ return bytes(result)
 
 # This reads the list of event launchers from the rom.
 def read_launchers(rom):
@@ -336,12 +394,12 @@ def read_launchers(rom):
  # so I'm not exactly sure how the game itself knows "where to stop" when it's
  # reading launchers. For now I'm just using the FF4kster strategy of reading the
  # next launcher's pointer and assuming that where the next launcher begins is
- # where this launcher ends.
+ # where this launcher ends. That's why the pointer table is read with one more
+ # pointer than there are launchers.
+ pointers = rom.read_u16_array(rom.LAUNCHER_POINTERS_START, rom.TOTAL_LAUNCHERS + 1)
  for index in range(rom.TOTAL_LAUNCHERS):
-  start = rom.read_wide(rom.LAUNCHER_POINTERS_START + index * 2)
-  start += rom.LAUNCHER_DATA_START
-  finish = rom.read_wide(rom.LAUNCHER_POINTERS_START + (index + 1) * 2)
-  finish += rom.LAUNCHER_DATA_START
+  start = pointers[index] + rom.LAUNCHER_DATA_START
+  finish = pointers[index + 1] + rom.LAUNCHER_DATA_START
   launcher = Launcher()
   launchers.append(launcher)
   launcher.read(rom, start, finish)
@@ -363,13 +421,13 @@ def write_launchers(rom, launchers):
  # Otherwise, we proceed.
  else:
   
-  # Loop through the list, writing each one and updating the pointers as we go.
+  # Loop through the list, writing each one and collecting the pointers as we go.
   address = rom.LAUNCHER_DATA_START
+  pointers = []
   for index, launcher in enumerate(launchers):
 
    # First create the pointer.
-   pointer = address - rom.LAUNCHER_DATA_START
-   rom.write_wide(rom.LAUNCHER_POINTERS_START + index * 2, pointer)
+   pointers.append(address - rom.LAUNCHER_DATA_START)
 
    # Then write the launcher data.
    # Since launchers are a variable length record, the writing routine returns the
@@ -381,5 +439,6 @@ def write_launchers(rom, launchers):
   # launcher to determine the ending of the current one. Thus we only read 0xFF
   # launchers despite there being 0x100 pointers, since we need an "ending" pointer
   # for the last launcher in order for this to work.
-  pointer = address - rom.LAUNCHER_DATA_START
-  rom.write_wide(rom.LAUNCHER_POINTERS_START + len(launchers) * 2, pointer)
+  # The whole pointer table is then written in one go.
+  pointers.append(address - rom.LAUNCHER_DATA_START)
+  rom.write_u16_array(rom.LAUNCHER_POINTERS_START, pointers)
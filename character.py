@@ -1,9 +1,14 @@
 from levelup import LevelUp
+from record import Field, Schema
 
 # A Character is essentially a set of stats and levelups. The other information that
 # one might normally associate with a character in the colloquial sense are tracked
 # by different objects such as Jobs and Actors.
 class Character:
+
+ __slots__ = ("name", "id", "left_handed", "right_handed", "job", "level",
+  "mystery_bytes", "current_hp", "max_hp", "current_mp", "max_mp", "stats",
+  "mystery_bytes2", "xp", "mystery_bytes3", "tnl", "levelups", "after70", "saved")
  
  def __init__(self):
   self.name = ""
@@ -66,66 +71,36 @@ class Character:
   self.levelups = []
   self.after70 = []
 
+  # The character record as it was last read or written (see record.py). None if
+  # it never has been.
+  self.saved = None
+
+ # The layout of the character record in the rom (see record.py).
+ schema = Schema([
+  Field("id", 0, bits = (0, 6)),
+  Field("left_handed", 0, bits = (6, 7), kind = "flag"),
+  Field("right_handed", 0, bits = (7, 8), kind = "flag"),
+  Field("job", 1),
+  Field("level", 2),
+  Field("mystery_bytes", 3, count = 4),
+  Field("current_hp", 7, width = 2),
+  Field("max_hp", 9, width = 2),
+  Field("current_mp", 11, width = 2),
+  Field("max_mp", 13, width = 2),
+  Field("stats", 15, count = 5),
+  Field("mystery_bytes2", 20, count = 3),
+  Field("xp", 23, width = 3),
+  Field("mystery_bytes3", 26, count = 3),
+  Field("tnl", 29, width = 3)
+ ])
+
  # Read the character record from the given address.
  def read(self, rom, address):
-  self.id = rom.data[address] % 0x40
-  self.left_handed = rom.flag(address, 6)
-  self.right_handed = rom.flag(address, 7)
-  self.job = rom.data[address + 1]
-  self.level = rom.data[address + 2]
-  for index in range(4):
-   self.mystery_bytes[index] = rom.data[address + 3 + index]
-  self.current_hp = rom.data[address + 7] + rom.data[address + 8] * 0x100
-  self.max_hp = rom.data[address + 9] + rom.data[address + 10] * 0x100
-  self.current_mp = rom.data[address + 11] + rom.data[address + 12] * 0x100
-  self.max_mp = rom.data[address + 13] + rom.data[address + 14] * 0x100
-  for index in range(5):
-   self.stats[index] = rom.data[address + 15 + index]
-  for index in range(3):
-   self.mystery_bytes2[index] = rom.data[address + 20 + index]
-  self.xp = rom.data[address + 23] + rom.data[address + 24] * 0x100
-  self.xp += rom.data[address + 25] * 0x10000
-  for index in range(3):
-   self.mystery_bytes3[index] = rom.data[address + 26 + index]
-  self.tnl = rom.data[address + 29] + rom.data[address + 30] * 0x100
-  self.tnl += rom.data[address + 31] * 0x10000
+  self.schema.read(self, rom, address)
 
  # Write the character record back to the rom at the given address.
  def write(self, rom, address):
-  rom.data[address] = self.id
-  rom.setbit(address, 6, self.left_handed)
-  rom.setbit(address, 7, self.right_handed)
-  rom.data[address + 1] = self.job
-  rom.data[address + 2] = self.level
-  rom.data[address + 3] = self.mystery_bytes[0]
-  rom.data[address + 4] = self.mystery_bytes[1]
-  rom.data[address + 5] = self.mystery_bytes[2]
-  rom.data[address + 6] = self.mystery_bytes[3]
-  rom.data[address + 7] = self.current_hp % 0x100
-  rom.data[address + 8] = self.current_hp >> 8
-  rom.data[address + 9] = self.max_hp % 0x100
-  rom.data[address + 10] = self.max_hp >> 8
-  rom.data[address + 11] = self.current_mp % 0x100
-  rom.data[address + 12] = self.current_mp >> 8
-  rom.data[address + 13] = self.max_mp % 0x100
-  rom.data[address + 14] = self.max_mp >> 8
-  rom.data[address + 15] = self.stats[0]
-  rom.data[address + 16] = self.stats[1]
-  rom.data[address + 17] = self.stats[2]
-  rom.data[address + 18] = self.stats[3]
-  rom.data[address + 19] = self.stats[4]
-  rom.data[address + 20] = self.mystery_bytes2[0]
-  rom.data[address + 21] = self.mystery_bytes2[1]
-  rom.data[address + 22] = self.mystery_bytes2[2]
-  rom.data[address + 23] = self.xp % 0x100
-  rom.data[address + 24] = (self.xp >> 8) % 0x100
-  rom.data[address + 25] = self.xp >> 16
-  rom.data[address + 26] = self.mystery_bytes3[0]
-  rom.data[address + 27] = self.mystery_bytes3[1]
-  rom.data[address + 28] = self.mystery_bytes3[2]
-  rom.data[address + 29] = self.tnl % 0x100
-  rom.data[address + 30] = (self.tnl >> 8) % 0x100
-  rom.data[address + 31] = self.tnl >> 16
+  self.schema.write(self, rom, address)
  
  # Read the levelups for this character from the given address.
  def read_levelups(self, rom, address):
@@ -13,12 +13,12 @@ class Command:
 
  def read_name(self, rom, address, text):
   bytelist = rom.data[address:address + rom.COMMAND_NAME_WIDTH]
-  self.name = text.asciitext(text.from_bytes(bytelist)).rstrip()
+  self.name = text.decode(bytelist).rstrip()
  
  def write_name(self, rom, address, text):
-  newname = text.ff4text(self.name)
-  newname = newname.ljust(rom.COMMAND_NAME_WIDTH, text.ff4text(" "))
-  rom.inject(address, text.to_bytes(newname))
+  newname = text.encode(self.name)
+  newname = newname.ljust(rom.COMMAND_NAME_WIDTH, text.encode(" "))
+  rom.inject(address, newname)
  
  def read_target(self, rom, address):
   self.mystery_amount = rom.data[address] % 0x10
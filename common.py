@@ -2,7 +2,12 @@
 # variety of things, but most commonly would be for things like race flags, equip
 # permission flags, elemental or status flags, and the like. A number of objects
 # either extend this class or use it as a member.
+# There are a lot of these (several for every monster and piece of equipment), so
+# like the other game objects they use __slots__ rather than a dictionary for their
+# attributes, which takes a fraction of the memory.
 class FlagSet:
+
+ __slots__ = ("width", "mask")
  
  def __init__(self, width = 1):
 
@@ -12,23 +17,59 @@ class FlagSet:
   # have a width of 2 and so on.
   self.width = width
 
-  # The flags are just stored as an array of booleans.
-  self.flags = [False] * 8 * width
+  # The flags are stored as the bits of one number, the same way they're stored in
+  # the rom: flag 0 is the lowest bit of the first byte, flag 8 the lowest bit of the
+  # second byte and so on. Individual flags can be looked at and changed as if the
+  # FlagSet were a list of booleans (e.g. races[3] = True).
+  self.mask = 0
+
+ def __len__(self):
+  return self.width * 8
+
+ def __getitem__(self, index):
+  if index < 0:
+   index += self.width * 8
+  if not 0 <= index < self.width * 8:
+   raise IndexError("flag index out of range")
+  return True if (self.mask >> index) & 1 else False
+
+ def __setitem__(self, index, value):
+  if index < 0:
+   index += self.width * 8
+  if not 0 <= index < self.width * 8:
+   raise IndexError("flag index out of range")
+  if value:
+   self.mask |= 1 << index
+  else:
+   self.mask &= ~(1 << index)
+
+ def __iter__(self):
+  for index in range(self.width * 8):
+   yield True if (self.mask >> index) & 1 else False
+
+ # The flags used to be stored as a list of booleans called "flags", so this lets
+ # code written for that keep working: reading it gives the FlagSet itself (which
+ # behaves like that list), and setting it to a list of booleans sets the flags.
+ @property
+ def flags(self):
+  return self
+
+ @flags.setter
+ def flags(self, values):
+  self.mask = 0
+  for index, value in enumerate(values):
+   self[index] = value
  
  # Read eight flags from the given byte. The offset indicates which chunk of eight
  # flags the byte should be read into. The byte is treated as eight individual bits
  # which each encode a flag setting, with 0 as False and 1 as True.
  def from_byte(self, byte, offset = 0):
-  for bit in range(8):
-   self.flags[offset * 8 + bit] = True if (byte >> bit) & 1 else False
+  self.mask = (self.mask & ~(0xFF << (offset * 8))) | ((byte & 0xFF) << (offset * 8))
  
  # This constructs a byte from eight of the flags. The offset indicates which chunk
  # of eight flags to encode.
  def to_byte(self, offset = 0):
-  byte = 0
-  for bit in range(8):
-   byte |= (1 << bit) if self.flags[offset * 8 + bit] else 0
-  return byte
+  return (self.mask >> (offset * 8)) & 0xFF
  
  # Read a list of bytes and encode them as flags.
  def from_bytes(self, bytes):
@@ -37,16 +78,13 @@ class FlagSet:
 
  # Construct a list of bytes from the flags. 
  def to_bytes(self):
-  result = []
-  for index in range(self.width):
-   result.append(self.to_byte(index))
-  return result
+  return list(self.mask.to_bytes(self.width, "little"))
  
  # Read the flags from the rom at the given address. The width determines how many
  # bytes to read and interpret as flag settings.
  def read(self, rom, address):
   if self.width > 1:
-   self.from_bytes(rom.data[address:address + width])
+   self.from_bytes(rom.data[address:address + self.width])
   else:
    self.from_byte(rom.data[address])
  
@@ -63,13 +101,13 @@ class FlagSet:
  def display(self, main, flagnames = []):
   result = ""
   if len(flagnames) > 0:
-   for flag, name in zip(self.flags, flagnames):
+   for flag, name in zip(self, flagnames):
     if flag:
      if len(result) > 0:
       result += ", "
      result += name
   else:
-   for flag in self.flags:
+   for flag in self:
     result += "X" if flag else "-"
   return result
 
@@ -79,6 +117,8 @@ class FlagSet:
 # is common for things to have an index into a global list of these AttributeTables.
 class AttributeTable(FlagSet):
 
+ __slots__ = ()
+
  def __init__(self):
   super().__init__(3)
   
@@ -90,7 +130,7 @@ class AttributeTable(FlagSet):
  
  def display(self, main, alt_statuses = False, flags = None):
   if flags == None:
-   flags = self.flags
+   flags = self
   result = ""
   for index in range(8):
    if flags[index]:
@@ -120,7 +160,7 @@ class AttributeTable(FlagSet):
  
  def display_inverted(self, main, alt_statuses = False):
   newflags = []
-  for index, flag in enumerate(self.flags):
+  for index, flag in enumerate(self):
    if index < 8:
     newflags.append(flag)
    else:
@@ -128,16 +168,26 @@ class AttributeTable(FlagSet):
   return self.display(alt_statuses, newflags)
 
 class StatBuff:
+
+ __slots__ = ("stats", "amount", "bonuses", "penalties")
+
+ # How much each amount adds to (or takes away from) the stats. These are the same
+ # for every StatBuff of the same kind, so each one just refers to the shared tables
+ # rather than having its own copy; there are thousands of levelups.
+ equipment_bonuses = (3, 5, 10, 15, 5, 10, 15, 5)
+ equipment_penalties = (0, 0, 0, 0, -5, -10, -15, -10)
+ levelup_bonuses = (0, 1, 2, 3, 4, 5, 6, -1)
+ levelup_penalties = (0, 0, 0, 0, 0, 0, 0, 0)
  
  def __init__(self, levelup = False):
   self.stats = [False] * 5
   self.amount = 0
   if levelup:
-   self.bonuses = [0, 1, 2, 3, 4, 5, 6, -1]
-   self.penalties = [0] * 8
+   self.bonuses = StatBuff.levelup_bonuses
+   self.penalties = StatBuff.levelup_penalties
   else:
-   self.bonuses = [3, 5, 10, 15, 5, 10, 15, 5]
-   self.penalties = [0, 0, 0, 0, -5, -10, -15, -10]
+   self.bonuses = StatBuff.equipment_bonuses
+   self.penalties = StatBuff.equipment_penalties
  
  def read(self, rom, address):
   self.amount = rom.data[address] % 8
@@ -149,6 +199,19 @@ class StatBuff:
   for index, stat in enumerate(self.stats):
    rom.setbit(address, 7 - index, stat)
  
+ # These do the same as read and write, but with the byte itself rather than its
+ # place in the rom, for use in record schemas (see record.py).
+ def from_byte(self, byte):
+  self.amount = byte % 8
+  for index in range(5):
+   self.stats[index] = True if (byte >> (7 - index)) & 1 else False
+ 
+ def to_byte(self):
+  byte = self.amount % 8
+  for index, stat in enumerate(self.stats):
+   byte |= (1 << (7 - index)) if stat else 0
+  return byte
+ 
  def display(self, main):
   result = ""
   for index, stat in enumerate(self.stats):
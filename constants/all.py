@@ -57,3 +57,41 @@ def set_monster_constants(main):
 
 def set_map_constants(main):
  maps.set_constants(main)
+
+# A stand-in for the FF4Rom that the functions above can be run on without a rom, to
+# find out which constants they set. Every list of game data it's asked for is as
+# long as any of them could need, and the name of every constant set on it is
+# noted down.
+class ConstantRecorder:
+
+ def __init__(self):
+  self.__dict__["names"] = set()
+  self.__dict__["entries"] = [None] * 0x1000
+
+ def __getattr__(self, name):
+  return self.entries
+
+ def __setattr__(self, name, value):
+  self.names.add(name)
+
+# Returns the names of the constants the given function above sets.
+def constant_names(setter):
+ recorder = ConstantRecorder()
+ setter(recorder)
+ return recorder.names
+
+# The names of the constants each of the functions above sets. This is how FF4Rom
+# knows which data to read to get a constant (and that a name isn't a constant at
+# all, without reading anything).
+NAMES = {setter: constant_names(setter) for setter in [
+ set_spell_constants,
+ set_spellbook_constants,
+ set_item_constants,
+ set_job_constants,
+ set_character_constants,
+ set_actor_constants,
+ set_command_constants,
+ set_monster_constants,
+ set_map_constants
+]}
+ALL_NAMES = set().union(*NAMES.values())
@@ -6,6 +6,8 @@ from common import FlagSet, StatBuff
 # common to both.
 class Equipment(Item):
 
+ __slots__ = ("magnetic", "attributes", "races", "statbuff", "equips")
+
  def __init__(self):
   super().__init__()
 
@@ -6,6 +6,8 @@ from common import FlagSet
 # own individual full set of flags.
 class EquipTable(FlagSet):
 
+ __slots__ = ()
+
  def __init__(self):
 
   # An EquipTable is essentially a FlagSet with two bytes.
@@ -28,7 +30,7 @@ class EquipTable(FlagSet):
  # commas.
  def display(self, main):
   result = ""
-  for index, flag in enumerate(self.flags):
+  for index, flag in enumerate(self):
    if flag:
     if len(result) > 0:
      result += ", "
@@ -1,11 +1,19 @@
 class Instruction:
 
+ __slots__ = ("code", "parameters")
+
  def __init__(self, code = 0, parameters = None):
   self.code = code
   if parameters == None:
    self.parameters = []
   else:
    self.parameters = parameters
+
+ # Scripts are made of a great many instructions, so when they're pickled (such as
+ # by the parsed data cache in cache.py) they're stored as just the arguments to
+ # make them again, which is a lot smaller and quicker to load.
+ def __reduce__(self):
+  return (Instruction, (self.code, self.parameters))
  
  def display(self, main):
   result = main.config.instruction_names[self.code]
@@ -21,22 +29,74 @@ class Event:
   self.script = []
   self.branch = []
  
+ # The script is read through a view of the rom (see "view" in rom.py), which is
+ # much quicker to go through a byte at a time than the rom data itself. Scripts
+ # are usually short, so the view starts small and is only made bigger if the
+ # script turns out not to fit in it.
  def read(self, rom, config, address):
-  offset = address
-  instruction = rom.data[offset]
-  while instruction != 0xFF:
-   parameters = []
-   count = config.parameter_count[instruction]
-   offset += 1
-   if count > 0:
-    for index in range(count):
-     parameters.append(rom.data[offset + index])
-    offset += count
-   self.script.append(Instruction(instruction, parameters))
-   instruction = rom.data[offset]
+  counts = config.parameter_count
+  remaining = len(rom.data) - address
+  length = min(0x400, remaining)
+  while True:
+   view = rom.view(address, length)
+   try:
+    script = []
+    offset = 0
+    instruction = view[offset]
+    while instruction != 0xFF:
+     count = counts[instruction]
+     offset += 1
+     if offset + count > length:
+      raise IndexError("script runs past the view")
+     script.append(Instruction(instruction, list(view[offset:offset + count])))
+     offset += count
+     instruction = view[offset]
+    self.script.extend(script)
+    return
+   except IndexError:
+    if length == remaining:
+     raise
+    length = min(length * 8, remaining)
+   finally:
+    view.release()
  
+ # When events are pickled (by the cache in cache.py, or to be sent back from a
+ # worker process; see workers.py), each script is packed into a string of bytes,
+ # which is much quicker than pickling every instruction separately. Each
+ # instruction is stored as its code, then the number of parameters, then the
+ # parameters. If any of them aren't bytes, the event is pickled as usual instead.
+ def __reduce__(self):
+  try:
+   return (unpack_event, (self.has_branch, pack_script(self.script), pack_script(self.branch)))
+  except (ValueError, TypeError):
+   return (Event, (), self.__dict__)
+
  def display(self, main):
   result = ""
   for instruction in self.script:
    result += instruction.display(main) + "\n"
-  return result
\ No newline at end of file
+  return result
+
+def pack_script(script):
+ data = bytearray()
+ for instruction in script:
+  data.append(instruction.code)
+  data.append(len(instruction.parameters))
+  data.extend(instruction.parameters)
+ return bytes(data)
+
+def unpack_script(data):
+ script = []
+ offset = 0
+ while offset < len(data):
+  end = offset + 2 + data[offset + 1]
+  script.append(Instruction(data[offset], list(data[offset + 2:end])))
+  offset = end
+ return script
+
+def unpack_event(has_branch, script, branch):
+ event = Event()
+ event.has_branch = has_branch
+ event.script = unpack_script(script)
+ event.branch = unpack_script(branch)
+ return event
@@ -1,46 +1,75 @@
+import os
+import copy
+import mmap
 import rom
+import patch
+import search
+import tables
+import registry
+import workers
+import cache
 import config
-import common
 import text
 import constants.all as constants
-import categories.magic as magic
-import categories.gear as gear
-import categories.party as party
-import categories.combat as combat
-import categories.world as world
 import categories.story as story
 
 class FF4Rom:
 
- def __init__(self, filename):
+ def __init__(self, filename, mode = "copy", cache = None):
   # A rom file is required in order to have a functioning FF4Rom.
   # The raw bytes are read from the rom into the "romdata" varaible, which is then
   # passed to the "rom" subcomponent. So if you create an FF4Rom called "ff4" you 
   # can access the raw bytes directly via something like "ff4.rom.data[index]".
   # Abstract game objects are not created at this stage.
-  # To generate the game objects, call the "read" function.
+  # To generate the game objects, call the "read" function, or simply use them: each
+  # type of data is read the first time it's used if it hasn't been read yet (see
+  # "__getattr__" below).
   # The reason for doing it this way is because modified roms might store certain
   # data in different ways that are incompatible with the assumptions made by this 
   # program. Thus, if we read all the data into abstract objects from the start, it 
   # could crash the program trying to read data that may not even be relevant to the
   # changes the user wishes to make. Therefore the data reading is done only when 
-  # explicitly called by the user, and only the type(s) of data requested.
+  # explicitly called by the user, or when that data is actually used, and only the
+  # type(s) of data needed.
+
+  # The "mode" parameter determines how the raw data is loaded:
+  #  * "copy" reads the whole file into memory. This is the default.
+  #  * "mmap" maps the file into memory instead of reading it. Nothing is actually
+  #    copied until something is written to the rom, at which point it switches to
+  #    an ordinary in-memory copy. This is useful when you only need to read from a
+  #    lot of roms, since most of each file never has to be loaded at all.
+  if mode not in ["copy", "mmap"]:
+   print("ERROR: Unrecognized mode '{}'; using 'copy' instead.".format(mode))
+   mode = "copy"
+
+  # If "cache" is the name of a folder, the game data is saved there after it's
+  # read, and loaded from there instead of being read again the next time the same
+  # data is read from the same rom (see "use_cache" below).
+  self.cache = None
+  if cache is not None:
+   self.use_cache(cache)
 
   # Get the raw data from the file.
   with open(filename, "rb") as ff4file:
-   romdata = list(ff4file.read())
+   if mode == "mmap":
+    romdata = mmap.mmap(ff4file.fileno(), 0, access = mmap.ACCESS_READ)
+   else:
+    romdata = bytearray(os.path.getsize(filename))
+    ff4file.readinto(romdata)
 
   # Determine if the rom has a header. We default to it having a header.
   self.headered = True
 
   # If the first two bytes match what we expect from an unheadered rom, we assume 
   # that's what it is.
-  if romdata[0:2] == [0x78, 0x18]:
+  if romdata[0:2] == b"\x78\x18":
    self.headered = False
 
-   # Pad the beginning with enough 0s to make the data line up with that of a 
-   # headered rom. (This will be removed when saving.)
-   romdata = [0] * 0x200 + romdata
+   # All the addresses in this library assume a headered rom, so we give the data
+   # a pretend header to make them line up. Nothing is actually added to the
+   # data; the addresses are simply shifted when they're looked up. (See the
+   # RomBuffer class in rom.py for the details.)
+   romdata = rom.RomBuffer(romdata, rom.HEADER_SIZE)
   
   # Initialize the subcomponents that handle various aspects of reading or modifying
   # the rom.
@@ -48,90 +77,392 @@ class FF4Rom:
   self.text = text.TextInterface()
   self.config = config.Configuration()
 
-  # Initialize the game data objects to be empty. This way you can refer to them and 
-  # pass them around without causing errors even if you haven't read that particular 
-  # type of data yet.
-  self.attributes = []
-  self.equips = []
-  self.spells = []
-  self.spellbooks = []
-  self.items = []
-  self.characters = []
-  self.actors = []
-  self.maps = []
-  self.launchers = []
+  # A clone (see "clone" below) keeps a reference to the FF4Rom it was made from.
+  # An ordinary FF4Rom has none.
+  self.original = None
+
+  # The names of the game data attributes that were thrown away because the rom
+  # changed underneath them (see "apply_patch" below), so they have to be read from
+  # the rom again rather than copied from the original.
+  self.stale = set()
+
+  # A hash of the part of the rom each game data attribute was read from (see
+  # region_hashes in rom.py), as it was when the attribute was read or last written.
+  # If the rom still matches, the objects know what's already in it, so writing them
+  # only has to write what's changed (see "write" below).
+  self.synced = {}
+
+  # The game data objects are deliberately not set here. That way, the first time
+  # one of them is used, it's read from the rom (see "__getattr__" below).
+
+ # Keeps the game data in the given folder from now on (see cache.py).
+ def use_cache(self, directory):
+  self.cache = cache.ModelCache(directory)
   
  # Export the raw bytes to a file.
  # This won't automatically convert the abstract game objects into bytecode; that 
  # has to be done manually using the "write" function first if you want any changes 
  # you made to be committed. So if you find yourself wondering why your rom doesn't
  # seem to have changed despite saving it, make sure you're calling "write" first.
- def save(self, filename):
+ # If "incremental" is True and the file already exists, only the bytes that have
+ # changed since the rom was loaded are written to it rather than the whole rom.
+ # This is much faster for small changes, but it assumes the file already holds the
+ # rom as it was when it was loaded (or as it was last saved), such as when saving
+ # back over the original file or over an earlier save.
+ def save(self, filename, incremental = False):
+  if incremental and os.path.exists(filename):
+   self.save_changes(filename)
+   return
   
-  # The rom data variable is stored as a list, so first we need to convert it into 
-  # bytes that can be written to the file.
-  output = bytearray(self.rom.data)
-  
-  # If we had to add a placeholder header, we remove it before saving.
-  if not self.headered:
-   output = output[0x200:]
+  # A memory mapped rom is copied into memory first, since writing to the file it
+  # was mapped from would pull the data out from under it.
+  if not self.rom.data.writable:
+   self.rom.data.promote()
+
+  # The rom data is already stored as raw bytes exactly as they appear in the file
+  # (the pretend header of an unheadered rom isn't part of them), so we can write
+  # them out through a memoryview without making a copy first.
+  output = memoryview(self.rom.data.raw())
 
   # Finally, save the file.
   with open(filename, "wb") as ff4file:
    ff4file.write(output)
 
+ # Writes only the changed bytes of the rom into an existing file. (See "save"
+ # above.)
+ def save_changes(self, filename):
+  data = self.rom.data
+  with open(filename, "r+b") as ff4file:
+   descriptor = ff4file.fileno()
+
+   # The file is grown or shrunk to match the rom first, in case the rom changed
+   # size (growing it fills the new part with 0s, but anything added to the rom
+   # counts as changed anyway).
+   size = len(data.buffer)
+   if os.fstat(descriptor).st_size != size:
+    os.ftruncate(descriptor, size)
+
+   # Changed ranges that are close together are written as one, since writing a
+   # few unchanged bytes in between is much cheaper than a separate write.
+   ranges = []
+   for start, end in data.dirty_ranges():
+    if len(ranges) > 0 and start - ranges[-1][1] < 0x1000:
+     ranges[-1] = (ranges[-1][0], end)
+    else:
+     ranges.append((start, end))
+
+   # Then each range is written in place. The addresses include the header, so
+   # they're shifted for unheadered roms, which don't really have one.
+   for start, end in ranges:
+    chunk = data.view(start, end - start)
+    position = start - data.header
+    if hasattr(os, "pwrite"):
+     os.pwrite(descriptor, chunk, position)
+    else:
+     # Windows doesn't have pwrite, so we move to the position and write there.
+     ff4file.seek(position)
+     ff4file.write(chunk)
+    chunk.release()
+
+ # Creates a patch that turns the original rom into this one, so that you can share
+ # your changes without sharing the rom itself. The original can be given as the
+ # filename of the original rom, another FF4Rom, or the raw bytes of the original
+ # file. The "format" can be "ips" (the most widely supported), "bps", or "ups"
+ # (both of which have no size limit and check that they're being applied to the
+ # right rom). As with saving, make sure you call "write" first so your changes are
+ # actually in the raw bytes. The patch is returned as bytes, and is also saved to
+ # "filename" if one is given. Note that the patch is made from the files as they
+ # are, so the original should be headered if this rom is headered and unheadered
+ # if it isn't.
+ def make_patch(self, original, format = "ips", filename = None):
+  
+  # Get the raw bytes of the original.
+  if type(original) == str:
+   with open(original, "rb") as originalfile:
+    original = originalfile.read()
+  elif isinstance(original, FF4Rom):
+   original = original.rom.data.raw()
+  
+  # Make the patch in the requested format.
+  format = format.lower()
+  if format == "ips":
+   result = patch.make_ips(original, self.rom.data.raw())
+  elif format == "bps":
+   result = patch.make_bps(original, self.rom.data.raw())
+  elif format == "ups":
+   result = patch.make_ups(original, self.rom.data.raw())
+  else:
+   print("ERROR: Unrecognized patch format '{}'.".format(format))
+   return None
+  
+  # And save it if a filename was given.
+  if result is not None and filename is not None:
+   with open(filename, "wb") as patchfile:
+    patchfile.write(result)
+  return result
+
+ # Makes a copy of this FF4Rom without reading the file again or copying anything
+ # up front. The raw bytes are shared, and each copy only copies the parts of the
+ # rom it actually writes to (in pages of a few kilobytes). The game objects that
+ # have been read are shared the same way: each type of data (such as the spells or
+ # the monsters) is only copied the first time the clone uses it, and everything
+ # copied for the same clone is copied together, so objects that refer to each other
+ # still do in the clone. This makes it cheap to read a rom once and then make lots
+ # of variations of it, for example:
+ #  base = FF4Rom("~/Games/Snes/ff2us.smc")
+ #  base.read()
+ #  for seed in range(1000):
+ #   variant = base.clone()
+ #   (make random changes to the variant, write and save it)
+ # Since nothing is copied until it's used, the original shouldn't be changed while
+ # its clones are still in use (changes to its raw bytes are fine, but changes to its
+ # game objects would show up in any clone that hasn't copied them yet).
+ def clone(self):
+  result = FF4Rom.__new__(FF4Rom)
+  result.rom = self.rom.clone()
+  result.original = self
+  result.copies = {}
+  result.cache = self.cache
+  result.stale = set()
+  result.synced = {}
+  return result
+
+ # This is only called when an attribute isn't found normally, which means the data
+ # hasn't been read yet (or, for a clone, hasn't been copied from the original yet;
+ # see "clone" above).
+ def __getattr__(self, name):
+  if name.startswith("__") or "rom" not in self.__dict__:
+   raise AttributeError(name)
+
+  # If the original has already read it, the clone copies it. If the original is
+  # itself a clone, this makes it copy the attribute from its own original first,
+  # which keeps everything it has copied consistent.
+  original = self.__dict__.get("original")
+  if original is not None and name not in self.stale and original.has_read(name) and not self.is_stale_constant(name):
+   value = copy.deepcopy(getattr(original, name), self.copies)
+   setattr(self, name, value)
+   if name in original.synced:
+    self.synced[name] = original.synced[name]
+   return value
+
+  # Otherwise, it's read from the rom now (see registry.py for what each attribute
+  # is read by).
+  if name in registry.ATTRIBUTES:
+   self.read_lazily([registry.ATTRIBUTES[name]])
+   return self.__dict__[name]
+
+  # Constants are set when the data they refer to is read, so we read the type of
+  # data that sets the one we want (see constants/all.py). Any other name isn't a
+  # constant, so nothing is read for it.
+  if name in constants.ALL_NAMES:
+   for category in registry.CATEGORIES:
+    if category.constants is not None and name in constants.NAMES[category.constants] and not self.has_read(category.name):
+     self.read_lazily([category])
+     if name in self.__dict__:
+      return self.__dict__[name]
+  raise AttributeError(name)
+
+ # Reads the given categories of data (see registry.py) because something tried to
+ # use them. Anything in them (or that they depend on) that has already been read is
+ # kept as it was rather than being read again, so that any changes made to it
+ # aren't lost. For example, using bank2_messages reads all three banks of messages
+ # unless some of them have already been read.
+ def read_lazily(self, categories, executor = None):
+  jobs = []
+  for category in registry.order(categories):
+   for attribute in category.readers:
+    if not self.has_read(attribute):
+     jobs.append((category, attribute))
+  registry.read(self, jobs, executor)
+
+ # Returns whether the given data has been read (or, for a clone, whether it can be
+ # copied from the original), without reading it.
+ def has_read(self, name):
+  if name in self.__dict__:
+   return True
+  if name in self.stale:
+   return False
+  original = self.__dict__.get("original")
+  return original is not None and original.has_read(name)
+
+ # Takes a snapshot of the rom that can later be rolled back to with "restore".
+ # This is meant for things like randomizers that make an attempt, check it, and
+ # try again if it didn't work out:
+ #  snapshot = rom.snapshot()
+ #  while True:
+ #   (make random changes and write them)
+ #   if (the result is good):
+ #    break
+ #   rom.restore(snapshot)
+ #  rom.release(snapshot)
+ # Restoring only has to undo what was written since the snapshot, so it's much
+ # cheaper than loading the rom again. Note that this only covers the raw bytes;
+ # the game objects aren't changed by restoring, so if you need them to match the
+ # restored bytes, read them again afterwards.
+ def snapshot(self):
+  return self.rom.snapshot()
+
+ def restore(self, snapshot):
+  self.rom.restore(snapshot)
+
+ # Once you're done with a snapshot, release it so the rom can stop keeping track
+ # of what's written. A snapshot can be restored as many times as you like until
+ # then.
+ def release(self, snapshot):
+  self.rom.release(snapshot)
+
+ # Puts back whatever the last "restore" undid, as long as nothing has been
+ # written since. Returns whether there was anything to redo.
+ def redo(self):
+  return self.rom.redo()
+
+ # Use this in a "with" statement to undo everything written inside the block if
+ # an exception is raised in it. (See "transaction" in rom.py for the details.)
+ def transaction(self):
+  return self.rom.transaction()
+
+ # Applies an IPS, BPS or UPS patch to the rom (see "apply_patch" in rom.py). The
+ # game data that has been read is checked before and after (see "region_hashes" in
+ # rom.py), and only the types of data whose part of the rom the patch actually
+ # changed are thrown away, along with their constants (such as CURE1_SPELL) and
+ # anything that refers to them (such as the spellbooks referring to the spells).
+ # Those are read again from the patched rom the next time they're used; everything
+ # else is kept as it is, including any changes made to it that haven't been written
+ # yet. Returns the names of the attributes that were thrown away.
+ def apply_patch(self, filename, headered_rom_expected = True):
+  names = [name for name in registry.ATTRIBUTES if self.has_read(name)]
+  before = self.rom.region_hashes(names)
+  self.rom.apply_patch(filename, headered_rom_expected)
+  after = self.rom.region_hashes(names)
+  changed = [name for name in names if before[name] != after[name]]
+
+  # Anything that depends on changed data has to go too.
+  for name in names:
+   if name not in changed and any(reference in changed for reference in registry.references(name)):
+    changed.append(name)
+  for name in changed:
+   self.forget(name)
+  return changed
+
+ # Throws away the given game data attribute (and the constants that refer to its
+ # objects), so that it's read from the rom again the next time it's used.
+ def forget(self, name):
+  objects = self.__dict__.pop(name, None)
+  self.stale.add(name)
+  self.synced.pop(name, None)
+  if isinstance(objects, list):
+   ids = set(id(value) for value in objects)
+   for constant in [key for key, value in self.__dict__.items() if key.isupper() and id(value) in ids]:
+    del self.__dict__[constant]
+
+ # A clone copies constants from its original (see "__getattr__" above), except for
+ # the ones that refer to data the clone has thrown away, which have to be set again
+ # when the clone reads that data itself.
+ def is_stale_constant(self, name):
+  if not name.isupper() or len(self.stale) == 0:
+   return False
+  value = getattr(self.original, name)
+  for stale in self.stale:
+   if self.original.has_read(stale) and isinstance(getattr(self.original, stale), list) and any(value is entry for entry in getattr(self.original, stale)):
+    return True
+  return False
+
+ # Finds everywhere in the game text that mentions all the words in the query,
+ # including the names of items, spells, monsters, jobs, commands and maps, and the
+ # messages. The result is a list of (table, index) pairs, where the table is the
+ # name of the list it's in, so for example:
+ #  for table, index in rom.search("crystal"):
+ #   print(getattr(rom, table)[index])
+ # (as long as that data has been read). The index of all the text is built the
+ # first time you search, and again whenever the text in the rom has changed since.
+ # Building it takes a while, so if you give a filename it's also saved there and
+ # loaded from there next time, as long as it was built from exactly the same rom.
+ def search(self, query, filename = None):
+  index = self.__dict__.get("text_index")
+  if index is None or not index.current(self.rom):
+   index = search.TextIndex()
+   if filename is None or not index.load(filename, self.rom):
+    index.build(self.rom, self.text)
+    if filename is not None:
+     index.save(filename, self.rom)
+   self.text_index = index
+  return index.search(query)
+
+ # Returns the given type of data ("weapons", "armors", "spells", "monsters" or
+ # "maps") as a NumPy table with a column for each value, read straight from the
+ # rom. See tables.py for the details. Changes to the table only go into the rom when
+ # it's given to write_table.
+ def table(self, name):
+  return tables.read_table(self.rom, self.text, name.lower())
+
+ # Writes a table returned by "table" back to the rom, all in one go. If the same
+ # data has already been read as objects (e.g. the weapons in ff4.items), those are
+ # updated to match, so that a later call to write doesn't undo the changes.
+ def write_table(self, name, table):
+  name = name.lower()
+  tables.write_table(self.rom, self.text, name, table)
+  objects = None
+  if name == "weapons" and self.has_read("items"):
+   objects = self.items[0:self.rom.TOTAL_WEAPONS]
+  elif name == "armors" and self.has_read("items"):
+   objects = self.items[self.rom.ARMORS_START_INDEX:self.rom.ARMORS_START_INDEX + self.rom.TOTAL_ARMORS]
+  elif name in ["spells", "monsters", "maps"] and self.has_read(name):
+   objects = getattr(self, name)
+  if objects is not None:
+   tables.update_objects(name, table, objects)
+
+ # Changes a whole table at once, straight in the rom, without going through the
+ # objects at all. This takes the same arguments as the "update" method of
+ # ff4.monsters and the like (see Collection in tables.py), and returns how many rows
+ # were changed:
+ #  ff4.update("monsters", where = lambda table: table["level"] > 50, gp = lambda gp: gp * 2)
+ # Any of those objects that have already been read are updated to match.
+ def update(self, name, where = None, **changes):
+  table = self.table(name)
+  if table is None:
+   return 0
+  rows = tables.apply_changes(table, where, changes, tables.bounds(name.lower()))
+  self.write_table(name, table)
+  return int(rows.sum())
+
  # Reads all the data of the specified type from the bytes in the rom and converts 
  # it into abstract game objects. If no type is specified, it defaults to reading 
  # ALL game data. If you wish to read multiple types of data without reading all of
  # them, call this method multiple times with different arguments.
- def read(self, datatype = "all"):
-  
-  # Convert the given datatype to all lowercase for consistency.
-  datatype = datatype.lower()
-  
-  # Then check for each category and subtype.
-  # A full breakdown of the data category structure is in the readme.
-  if datatype in ["all", "magic", "gear", "spells", "items"]:
-   self.attributes = common.read_attributes(self.rom)
-  if datatype in ["all", "magic", "spells"]:
-   self.spells = magic.read_spells(self.rom, self.text)
-   constants.set_spell_constants(self)
-  if datatype in ["all", "magic", "spellbooks"]:
-   self.spellbooks = magic.read_spellbooks(self.rom, self.spells)
-   constants.set_spellbook_constants(self)
-  if datatype in ["all", "gear", "equips"]:
-   self.equips = gear.read_equips(self.rom)
-  if datatype in ["all", "gear", "items"]:
-   self.items = gear.read_items(self.rom, self.text)
-   constants.set_item_constants(self)
-  if datatype in ["all", "party", "jobs"]:
-   self.jobs = party.read_jobs(self.rom, self.text)
-   constants.set_job_constants(self)
-  if datatype in ["all", "party", "characters"]:
-   self.characters = party.read_characters(self.rom)
-   constants.set_character_constants(self)
-  if datatype in ["all", "party", "actors"]:
-   self.actors = party.read_actors(self.rom)
-   constants.set_actor_constants(self)
-  if datatype in ["all", "party", "commands"]:
-   self.commands = party.read_commands(self.rom, self.text)
-   constants.set_command_constants(self)
-  if datatype in ["all", "combat", "monsters"]:
-   self.monsters = combat.read_monsters(self.rom, self.text, self.config)
-   constants.set_monster_constants(self)
-  if datatype in ["all", "world", "mapnames"]:
-   self.map_names = world.read_map_names(self.rom, self.text)
-  if datatype in ["all", "world", "maps"]:
-   self.maps = world.read_maps(self.rom)
-   constants.set_map_constants(self)
-  if datatype in ["all", "world", "tilemaps"]:
-   self.tilemaps = world.read_tilemaps(self.rom)
-  if datatype in ["all", "world", "overworld"]:
-   self.overworld = world.read_overworld(self.rom)
-  if datatype in ["all", "world", "launchers"]:
-   self.launchers = world.read_launchers(self.rom)
-  if datatype in ["all", "story", "events"]:
-   self.events = story.read_events(self.rom, self.config)
+ # The data of the given type is always read, even if it already has been (so this
+ # also throws away any changes made to it since), along with anything it depends on
+ # that hasn't been read yet (see registry.py). If an executor (such as a
+ # ThreadPoolExecutor from concurrent.futures) is given, types of data that don't
+ # depend on each other are read in it at the same time.
+ # If "parallel" is True (or a number of processes), the types of data that don't
+ # depend on any others are read in a pool of worker processes instead, which is
+ # quicker for big roms on a machine with several cores (see workers.py). On some
+ # systems, this has to be done from inside an "if __name__ == '__main__':" block.
+ def read(self, datatype = "all", executor = None, parallel = False):
+  categories = registry.select(datatype.lower())
+  jobs = []
+  for category in registry.order(categories):
+   for attribute in category.readers:
+    if category in categories or not self.has_read(attribute):
+     jobs.append((category, attribute))
+  if parallel:
+   processes = None if parallel is True else parallel
+   with workers.WorkerPool(self, processes) as pool:
+    registry.read(self, jobs, executor, pool)
+  else:
+   registry.read(self, jobs, executor)
+
+ # Reads one type of data with the given function, unless it's in the cache (if
+ # there is one), in which case it's loaded from there instead. Either way, the
+ # data is returned. "name" is the attribute the data goes into.
+ def read_data(self, name, reader):
+  if self.cache is None:
+   return reader()
+  value = self.cache.load(self, name)
+  if value is None:
+   value = reader()
+   self.cache.save(self, name, value)
+  return value
  
  # Writes all the data of the specified type from the abstract game objects and 
  # converts it into the raw bytes. If no type is specified, it defaults to writing 
@@ -139,45 +470,38 @@ class FF4Rom:
  # them, call this method multiple times with different arguments.
  def write(self, datatype = "all", include_triggers = True):
 
-  # Writing certain types of data can cause a slight misalignment in the data, the 
-  # pointers, or both, even if you change nothing. I'm not completely sure why this 
-  # happens, but as far as I can tell it doesn't affect actual gameplay. In any 
-  # case, each type of data known to do this is tagged below with a comment to that 
-  # effect.
-  
-  # Convert the given datatype to all lowercase for consistency.
+  # Only the data that has actually been read is written; anything that hasn't been
+  # read can't have been changed, so there's nothing to write. Each type of data is
+  # written after anything it depends on (see registry.py).
   datatype = datatype.lower()
-  if datatype in ["all", "magic", "spells"]:
-   magic.write_spells(self.rom, self.text, self.spells)
-  if datatype in ["all", "magic", "spellbooks"]:
-   magic.write_spellbooks(self.rom, self.spellbooks)
-  if datatype in ["all", "gear", "equips"]:
-   gear.write_equips(self.rom, self.equips)
-  if datatype in ["all", "gear", "items"]:
-   gear.write_items(self.rom, self.text, self.items)
-  if datatype in ["all", "party", "jobs"]:
-   party.write_jobs(self.rom, self.text, self.jobs)
-  if datatype in ["all", "party", "characters"]:
-   # Something is causing the TNL values to be messed up
-   party.write_characters(self.rom, self.characters)
-  if datatype in ["all", "party", "actors"]:
-   party.write_actors(self.rom, self.actors)
-  if datatype in ["all", "party", "commands"]:
-   party.write_commands(self.rom, self.text, self.commands)
-  if datatype in ["all", "combat", "monsters"]:
-   # Causes a slight data misalignment, even with no changes.
-   combat.write_monsters(self.rom, self.text, self.monsters)
-  if datatype in ["all", "world", "mapnames"]:
-   world.write_map_names(self.rom, self.text, self.map_names)
-  if datatype in ["all", "world", "maps"]:
-   world.write_maps(self.rom, self.maps, include_triggers)
-  if datatype in ["all", "world", "tilemaps"]:
-   world.write_tilemaps(self.rom, self.tilemaps)
-  if datatype in ["all", "world", "overworld"]:
-   world.write_overworld(self.rom, self.overworld)
-  # if datatype in ["all", "world", "launchers"]:
-   # Causes a slight data misalignment, even with no changes.
-   # world.write_launchers(self.rom, self.launchers)
+  categories = registry.select(datatype)
+  for category in registry.order(categories):
+   if category not in categories or category.writer is None:
+    continue
+   if all(self.has_read(attribute) for attribute in category.readers):
+    self.write_category(category, include_triggers)
+
+ # Writes one type of data (see registry.py). The types of data whose objects keep
+ # track of what they were read from (such as the monsters and tilemaps) only write
+ # the objects that have changed, which is only safe if the rom still has what they
+ # were read from or last written as. So if that part of the rom has changed since
+ # (from applying a patch, restoring the rom, writing to it directly, or writing
+ # other data that overlaps it), everything is written regardless.
+ def write_category(self, category, include_triggers):
+  hashes = self.rom.region_hashes(list(category.readers))
+  force = any(self.synced.get(attribute) != hashes[attribute] for attribute in category.readers)
+  category.writer(self, {"include_triggers": include_triggers, "force": force})
+  self.synced.update(self.rom.region_hashes(list(category.readers)))
+
+ # Writes all three banks of messages back to the rom, and returns how many bytes
+ # were saved in each one compared to how much space it took up before. (See
+ # write_messages in categories/story.py for how this works.)
+ # NOTE: Where the message banks and the DTE table are in the rom hasn't been
+ # verified yet (see rom.py), so for now this just reports an error. That's also why
+ # write("messages") doesn't do anything yet.
+ def write_messages(self):
+  banks = [self.bank1_messages, self.bank2_messages, self.bank3_messages]
+  return story.write_messages(self.rom, self.text, banks)
  
  def display(self, entity):
   result = ""
@@ -11,6 +11,8 @@
 #                as well as your defense attributes (elemental/status resistances)
 class Item:
 
+ __slots__ = ("name", "price", "description")
+
  def __init__(self):
 
   # The item's name in ASCII. 
@@ -43,25 +45,25 @@ class Item:
  # addresses.
  def read_name(self, rom, address, text):
 
-  # We use the text module's byte conversion function to parse the item name.
+  # We use the text module's decoding function to parse the item name.
   bytelist = rom.data[address:address + rom.ITEM_NAME_WIDTH]
 
   # The name is cropped on the right to facilitate displaying and renaming but it
   # will be padded back out when we go to write it back to the rom.
-  self.name = text.asciitext(text.from_bytes(bytelist)).rstrip()
+  self.name = text.decode(bytelist).rstrip()
  
  # Write the name back to the rom.
  def write_name(self, rom, address, text):
 
   # First we convert it back from ASCII to FF4 text encoding.
-  newname = text.ff4text(self.name)
+  newname = text.encode(self.name)
 
   # Then we make sure it's exactly 9 letters long. If the given name was longer, we
   # crop it off at 9; if it's shorter, we pad it out to 9 with space characters.
-  newname = newname.ljust(rom.ITEM_NAME_WIDTH, text.ff4text(" "))
+  newname = newname.ljust(rom.ITEM_NAME_WIDTH, text.encode(" "))
 
-  # And finally we inject the converted name into the appropriate place in the rom.
-  rom.inject(address, text.to_bytes(newname))
+  # And finally we inject the name into the appropriate place in the rom.
+  rom.inject(address, newname)
  
  # Return a string that contains the item's information.
  # For now, it just displays the name, as that's all that's being read currently,
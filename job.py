@@ -58,17 +58,17 @@ class Job:
 
   # The name is cropped on the right to facilitate printing and constructing
   # strings, but it will be padded back out when it gets written back to the rom.
-  self.name = text.asciitext(text.from_bytes(bytelist)).rstrip()
+  self.name = text.decode(bytelist).rstrip()
 
  # Write the job name back to the rom.
  def write_name(self, rom, address, text):
 
   # Pad the name back out to the appropriate width first.
-  newname = text.ff4text(self.name)
-  newname = newname.ljust(rom.JOB_NAME_WIDTH, text.ff4text(" "))
+  newname = text.encode(self.name)
+  newname = newname.ljust(rom.JOB_NAME_WIDTH, text.encode(" "))
 
-  # Then convert it and put it back into the rom.
-  rom.inject(address, text.to_bytes(newname))
+  # Then put it back into the rom.
+  rom.inject(address, newname)
 
  # Returns a string containing the main information about the Job.
  def display(self, main):
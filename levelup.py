@@ -1,8 +1,11 @@
 from common import StatBuff
+from record import Field, Schema
 
 # This represents a single levelup for a single character.
 class LevelUp:
 
+ __slots__ = ("statbonus", "hp", "mp", "tnl", "saved")
+
  def __init__(self):
  
   # The "StatBuff" is a common object used not only here but in equipment as well.
@@ -17,22 +20,27 @@ class LevelUp:
   # TNL stands for "To Next Level" and indicates how much more Exp the character
   # will need for their next level.
   self.tnl = 0
+
+  # What the levelup was when it was last read or written (see record.py).
+  self.saved = None
  
+ # The layout of a LevelUp in the rom (see record.py). The TNL is 19 bits long; the
+ # lowest 16 are in bytes 3 and 4, and the highest 3 share a byte with the MP.
+ schema = Schema([
+  Field("statbonus", 0, kind = "object"),
+  Field("hp", 1),
+  Field("mp", 2, bits = (0, 5)),
+  Field("tnl", 2, bits = (5, 8), shift = 16),
+  Field("tnl", 3, width = 2)
+ ])
+
  # Read the information for this LevelUp from the given address.
  def read(self, rom, address):
-  self.statbonus.read(rom, address)
-  self.hp = rom.data[address + 1]
-  self.mp = rom.data[address + 2] % 0x20
-  self.tnl = rom.data[address + 3] + rom.data[address + 4] * 0x100
-  self.tnl += (rom.data[address + 2] >> 5) * 0x10000
+  self.schema.read(self, rom, address)
  
  # Write this LevelUp's information back to the rom at the specified address.
  def write(self, rom, address):
-  self.statbonus.write(rom, address)
-  rom.data[address + 1] = self.hp
-  rom.data[address + 2] = self.mp % 0x20 + ((self.tnl >> 16) << 5)
-  rom.data[address + 3] = self.tnl % 0x100
-  rom.data[address + 4] = (self.tnl >> 8) % 0x100
+  self.schema.write(self, rom, address)
  
  # Return a string containing this LevelUp's information.
  def display(self, main):
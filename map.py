@@ -1,3 +1,4 @@
+from record import Field, Schema
 from trigger import LauncherTrigger
 from trigger import TeleportTrigger
 from trigger import TreasureTrigger
@@ -8,6 +9,13 @@ from trigger import TreasureTrigger
 # not directly; it instead contains an index referencing one of the TileMaps).
 class Map:
 
+ __slots__ = ("triggers", "messages", "backdrop", "warpable", "exitable",
+  "alternate_backdrop", "magnetic", "tilemap", "tileset", "layout", "border_tile",
+  "solid_border", "palette", "npc_palettes", "music", "background", "translucent",
+  "scroll_vertical", "scroll_horizontal", "mystery_bit", "move_direction",
+  "move_speed", "ending", "name_index", "treasure_index", "encounter_rate",
+  "encounter_set", "unknown", "saved_triggers", "saved")
+
  def __init__(self):
 
   # Triggers are essentially tiles which activate some kind of effect when the
@@ -15,7 +23,14 @@ class Map:
   # can all be caused by interacting with a trigger tile on a map. Each map has a
   # list of Trigger objects that encode this information.
   self.triggers = []
-  
+
+  # The values of the triggers as they were when they were last read or written
+  # (see "triggers_changed" below), or None if they never have been.
+  self.saved_triggers = None
+
+  # The same for the map's own data (see record.py).
+  self.saved = None
+
   # Each map also has associated with it a set of messages or dialogues that can be
   # referenced by NPCs or events in that map. The point of doing it this way is so
   # that you can have one NPC event that simply says "Display map message 3" or
@@ -141,59 +156,40 @@ class Map:
   # tables is used for random encounters generated by this map.
   self.encounter_set = 0
 
+ # The layout of the map data in the rom (see record.py).
+ schema = Schema([
+  Field("backdrop", 0, bits = (0, 4)),
+  Field("warpable", 0, bits = (4, 5), kind = "flag"),
+  Field("exitable", 0, bits = (5, 6), kind = "flag"),
+  Field("alternate_backdrop", 0, bits = (6, 7), kind = "flag"),
+  Field("magnetic", 0, bits = (7, 8), kind = "flag"),
+  Field("tilemap", 1),
+  Field("tileset", 2),
+  Field("layout", 3),
+  Field("border_tile", 4, bits = (0, 7)),
+  Field("solid_border", 4, bits = (7, 8), kind = "flag"),
+  Field("palette", 5),
+  Field("npc_palettes", 6, bits = (0, 4), index = 0),
+  Field("npc_palettes", 6, bits = (4, 8), index = 1),
+  Field("music", 7),
+  Field("background", 8),
+  Field("translucent", 9, bits = (0, 1), kind = "flag"),
+  Field("scroll_vertical", 9, bits = (1, 2), kind = "flag"),
+  Field("scroll_horizontal", 9, bits = (2, 3), kind = "flag"),
+  Field("mystery_bit", 9, bits = (3, 4), kind = "flag"),
+  Field("move_direction", 9, bits = (4, 6)),
+  Field("move_speed", 9, bits = (6, 8)),
+  Field("unknown", 10, bits = (0, 7)),
+  Field("ending", 10, bits = (7, 8), kind = "flag"),
+  Field("name_index", 11),
+  Field("treasure_index", 12)
+ ])
+
  def read(self, rom, address):
-  self.backdrop = rom.data[address] % 0x10
-  self.warpable = rom.flag(address, 4)
-  self.exitable = rom.flag(address, 5)
-  self.alternate_backdrop = rom.flag(address, 6)
-  self.magnetic = rom.flag(address, 7)
-  self.tilemap = rom.data[address + 1]
-  self.tileset = rom.data[address + 2]
-  self.layout = rom.data[address + 3]
-  self.border_tile = rom.data[address + 4] % 0x80
-  self.solid_border = rom.flag(address + 4, 7)
-  self.palette = rom.data[address + 5]
-  self.npc_palettes[0] = rom.data[address + 6] % 0x10
-  self.npc_palettes[1] = rom.data[address + 6] >> 4
-  self.music = rom.data[address + 7]
-  self.background = rom.data[address + 8]
-  self.translucent = rom.flag(address + 9, 0)
-  self.scroll_vertical = rom.flag(address + 9, 1)
-  self.scroll_horizontal = rom.flag(address + 9, 2)
-  self.mystery_bit = rom.flag(address + 9, 3)
-  self.move_direction = (rom.data[address + 9] >> 4) % 4
-  self.move_speed = (rom.data[address + 9] >> 6)
-  self.unknown = rom.data[address + 10] % 0x80
-  self.ending = rom.flag(address + 10, 7)
-  self.name_index = rom.data[address + 11] 
-  self.treasure_index = rom.data[address + 12]
+  self.schema.read(self, rom, address)
  
  def write(self, rom, address):
-  rom.data[address] = self.backdrop % 0x10
-  rom.setbit(address, 4, self.warpable)
-  rom.setbit(address, 5, self.exitable)
-  rom.setbit(address, 6, self.alternate_backdrop)
-  rom.setbit(address, 7, self.magnetic)
-  rom.data[address + 1] = self.tilemap
-  rom.data[address + 2] = self.tileset
-  rom.data[address + 3] = self.layout
-  rom.data[address + 4] = self.border_tile % 0x80
-  rom.setbit(address + 4, 7, self.solid_border)
-  rom.data[address + 5] = self.palette
-  rom.data[address + 6] = self.npc_palettes[0] + self.npc_palettes[1] * 0x10
-  rom.data[address + 7] = self.music
-  rom.data[address + 8] = self.background
-  rom.data[address + 9] = 0
-  rom.setbit(address + 9, 0, self.translucent)
-  rom.setbit(address + 9, 1, self.scroll_vertical)
-  rom.setbit(address + 9, 2, self.scroll_horizontal)
-  rom.setbit(address + 9, 3, self.mystery_bit)
-  rom.data[address + 9] += (self.move_direction % 4) << 4
-  rom.data[address + 9] += (self.move_speed % 4) << 6
-  rom.data[address + 10] = self.unknown % 0x80
-  rom.setbit(address + 10, 7, self.ending)
-  rom.data[address + 11] = self.name_index 
-  rom.data[address + 12] = self.treasure_index
+  self.schema.write(self, rom, address)
  
  def read_encounter_rate(self, rom, address):
   self.encounter_rate = rom.data[address]
@@ -219,6 +215,7 @@ class Map:
    trigger.read(rom, start)
    self.triggers.append(trigger)
    start += 5
+  self.saved_triggers = [trigger.state() for trigger in self.triggers]
  
  def write_triggers(self, rom, address):
   
@@ -230,7 +227,15 @@ class Map:
   for trigger in self.triggers:
    trigger.write(rom, address)
    address += 5
+  self.saved_triggers = [trigger.state() for trigger in self.triggers]
   return address
+
+ # Returns whether the triggers have changed since they were read or last written,
+ # either by changing one of them or by adding, removing or replacing any.
+ def triggers_changed(self):
+  if self.saved_triggers is None:
+   return True
+  return [trigger.state() for trigger in self.triggers] != self.saved_triggers
  
  # Returns a string representing the map information.
  def display(self, main):
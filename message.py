@@ -0,0 +1,262 @@
+import heapq
+
+# A bank of messages, meaning the dialogue and other text that gets shown in text
+# boxes. Events refer to messages by their index in one of these banks (see the
+# "Bank 1 message", "Bank 3 message" and "Local message" instructions).
+# There are thousands of messages, and most tools only ever look at a few of them,
+# so the messages aren't converted to ASCII when the bank is read. Instead, each one
+# is converted the first time it's looked up, and remembered after that. A bank can
+# be used like a list:
+#  print(ff4.bank1_messages[0x12])
+#  for index, message in enumerate(ff4.bank3_messages):
+#   if "Crystal" in message:
+#    print(index)
+class MessageBank:
+
+ def __init__(self):
+
+  # The raw bytes of the bank, which the offsets below point into. A copy of these
+  # is kept rather than a reference to the rom, so the bank still shows the
+  # messages as they were when it was read even if the rom changes afterwards.
+  self.data = b""
+
+  # Where each message starts within the data above.
+  self.offsets = []
+
+  # The ASCII text for each symbol used in messages. This is the same as for
+  # everything else, except that messages also use "dual tile encoding" (DTE),
+  # where a single symbol stands for a pair of letters that show up together a
+  # lot (such as "th" or "e "). That saves a lot of space in a game with this much
+  # text, and those symbols are simply converted to the pair of letters.
+  self.decoding = []
+
+  # Some control codes in messages (such as the one that shows a character's name)
+  # are followed by a parameter. The parameter isn't text, so it's shown as a hex
+  # code, and it also can't be mistaken for the 00 that ends the message.
+  self.parameters = b""
+
+  # The messages that have been converted so far. A message that hasn't been
+  # converted yet is None.
+  self.messages = []
+
+  # Where the bank's pointer table is, how many messages it has, what the pointers
+  # are relative to, and where the next data in the rom starts, so the bank can be
+  # written back to the same place.
+  self.address = 0
+  self.count = 0
+  self.bonus = 0
+  self.limit = 0
+
+  # The offset of the first message, and the number of bytes from there to the end
+  # of the last one. When the bank is written back, the messages go in this space.
+  self.start = 0
+  self.room = 0
+
+ # Reads the pointer table for a bank of "count" messages at the given address. The
+ # pointers are relative to "bonus", and the messages they point to are somewhere
+ # between there and "end" (where the next data in the rom starts), so that much of
+ # the rom is copied (or less, if the rom ends sooner).
+ def read(self, rom, text, address, count, bonus, end):
+  self.offsets = rom.read_u16_array(address, count)
+
+  # Where the banks are in the rom hasn't been checked against a real rom yet (see
+  # rom.py), so if any of the pointers point outside the bank, it's most likely not
+  # where we think it is. In that case the bank is left empty rather than being read
+  # as nonsense.
+  lowest = max(bonus, address + count * 2) - bonus
+  if any(offset < lowest or offset >= end - bonus for offset in self.offsets):
+   print("ERROR: The message bank at {} doesn't look right; its pointers point outside it.".format(hex(address)))
+   self.offsets = []
+   count = 0
+  self.address = address
+  self.count = count
+  self.bonus = bonus
+  self.limit = end
+  length = max(0, min(end, len(rom.data)) - bonus)
+  view = rom.view(bonus, length)
+  self.data = bytes(view)
+  view.release()
+  self.messages = [None] * count
+
+  # The DTE symbols are stored as a table of pairs of regular symbols. Like the
+  # banks, where the table is hasn't been checked yet, so if it has anything in it
+  # that isn't a regular symbol (a 00, a DTE code, or a control code that takes a
+  # parameter), the DTE symbols are just shown as hex codes. (There's no need to
+  # say so if the bank is empty anyway.)
+  if text.decoding is None:
+   text.compile()
+  self.decoding = list(text.decoding)
+  pairs = bytes(rom.data[rom.DTE_TABLE_START:rom.DTE_TABLE_START + rom.TOTAL_DTE_CODES * 2])
+  dte = range(rom.DTE_FIRST_CODE, rom.DTE_FIRST_CODE + rom.TOTAL_DTE_CODES)
+  if any(code == 0 or code in dte or code in rom.MESSAGE_PARAMETER_CODES for code in pairs):
+   if count > 0:
+    print("ERROR: The DTE table at {} doesn't look right.".format(hex(rom.DTE_TABLE_START)))
+  else:
+   for index in range(rom.TOTAL_DTE_CODES):
+    first = text.decoding[pairs[index * 2]]
+    second = text.decoding[pairs[index * 2 + 1]]
+    self.decoding[rom.DTE_FIRST_CODE + index] = first + second
+  self.parameters = bytes(rom.MESSAGE_PARAMETER_CODES)
+
+  if count > 0:
+   self.start = min(self.offsets)
+   self.room = max(self.end(offset) for offset in set(self.offsets)) - self.start
+
+ # Converts the message with the given index to ASCII, or just returns it if that's
+ # already been done.
+ def __getitem__(self, index):
+  message = self.messages[index]
+  if message is None:
+   message = self.convert(self.offsets[index])
+   self.messages[index] = message
+  return message
+
+ # Changes the message with the given index. This only changes it here; it isn't
+ # written to the rom until the messages are written (see write_messages in
+ # categories/story.py).
+ def __setitem__(self, index, message):
+  self.messages[index] = message
+
+ def __len__(self):
+  return len(self.offsets)
+
+ def __iter__(self):
+  for index in range(len(self.offsets)):
+   yield self[index]
+
+ # Returns the offset just past the 00 that ends the message starting at the given
+ # offset, skipping over parameters (which could be 00 themselves).
+ def end(self, offset):
+  position = offset
+  while position < len(self.data) and self.data[position] != 0:
+   if self.data[position] in self.parameters:
+    position += 1
+   position += 1
+  return min(position + 1, len(self.data))
+
+ # Converts the message starting at the given offset in the data to ASCII.
+ def convert(self, offset):
+
+  # We find the 00 that ends the message and convert everything up to it in one
+  # go. That only works if there are no parameters before it though, since a
+  # parameter could itself be 00; if there are, we go through it one symbol at a
+  # time instead.
+  finish = self.data.find(0, offset)
+  if finish == -1:
+   finish = len(self.data)
+  ff4bytes = self.data[offset:finish]
+  if not any(code in ff4bytes for code in self.parameters):
+   return ff4bytes.decode("latin-1").translate(self.decoding)
+  result = ""
+  position = offset
+  while position < len(self.data) and self.data[position] != 0:
+   code = self.data[position]
+   if code in self.parameters:
+    result += "[{:02X}]".format(code)
+    if position + 1 < len(self.data):
+     result += "[{:02X}]".format(self.data[position + 1])
+    position += 2
+   else:
+    result += self.decoding[code]
+    position += 1
+  return result
+
+ # Returns the message with the given index, with a header showing which one it is.
+ def display(self, index):
+  return "{:03X}: {}".format(index, self[index])
+
+ # Converts a message from ASCII into a list of symbols ready for packing (see
+ # "pack" below). Symbols that can be part of a DTE pair are just their value in
+ # FF4 encoding; everything else (control codes that take a parameter, their
+ # parameters, and any DTE codes written directly as hex) gets 0x100 added so it's
+ # never paired with anything.
+ def symbols(self, text, message, first, count):
+  result = []
+  parameter = False
+  for code in text.encode(message):
+   if parameter or code in self.parameters or first <= code < first + count:
+    result.append(code + 0x100)
+    parameter = code in self.parameters and not parameter
+   else:
+    result.append(code)
+  return result
+
+# Chooses the pairs of symbols to use for the DTE codes, and replaces them in the
+# messages. "messages" is a list of messages converted with "symbols" above, which
+# are changed in place into lists of bytes ready to be written. Up to "count" pairs
+# are chosen, and they are given the codes starting at "first". Returns the pairs.
+# Each time, the pair that appears the most is chosen, since every place it's
+# replaced saves a byte. The DTE codes stand for a pair of regular symbols, not
+# other DTE codes, so choosing a pair never creates new pairs; it only removes the
+# ones that overlapped the places it replaced. So rather than counting all the
+# pairs again every time, we keep track of where each pair is, and a heap of the
+# counts so the most common one can be found quickly. Counts in the heap that have
+# gone out of date are simply fixed when they come up.
+def pack(messages, first, count):
+
+ # All the messages are joined into one linked list, so that symbols can be
+ # removed from the middle cheaply. Each message ends with a -1 so that pairs
+ # never span two messages.
+ values = []
+ for message in messages:
+  values.extend(message)
+  values.append(-1)
+ following = list(range(1, len(values) + 1))
+ preceding = list(range(-1, len(values) - 1))
+
+ places = {}
+ for position in range(len(values) - 1):
+  left = values[position]
+  right = values[position + 1]
+  if 0 <= left < 0x100 and 0 <= right < 0x100:
+   places.setdefault((left, right), set()).add(position)
+ heap = [(-len(where), pair) for pair, where in places.items()]
+ heapq.heapify(heap)
+
+ # This forgets about the pair starting at the given position, if there is one.
+ def forget(position):
+  if position < 0 or values[position] == -1:
+   return
+  left = values[position]
+  right = values[following[position]]
+  where = places.get((left, right))
+  if where is not None and position in where:
+   where.discard(position)
+   heapq.heappush(heap, (-len(where), (left, right)))
+
+ pairs = []
+ while len(heap) > 0 and len(pairs) < count:
+  total, pair = heapq.heappop(heap)
+  where = places.get(pair)
+  if where is None or len(where) == 0:
+   continue
+  if len(where) != -total:
+   heapq.heappush(heap, (-len(where), pair))
+   continue
+  code = first + len(pairs)
+  pairs.append(pair)
+  del places[pair]
+
+  # The places are gone through in order so that overlapping pairs (like "aa" in
+  # "aaa") are only replaced once.
+  for position in sorted(where):
+   second = following[position]
+   if values[position] != pair[0] or values[second] != pair[1]:
+    continue
+   forget(preceding[position])
+   forget(second)
+   values[position] = code + 0x100
+   values[second] = None
+   after = following[second]
+   following[position] = after
+   preceding[after] = position
+
+ # Finally, the linked list is split back into the messages.
+ position = 0
+ for message in messages:
+  message.clear()
+  while values[position] != -1:
+   message.append(values[position] % 0x100)
+   position = following[position]
+  position += 1
+ return pairs
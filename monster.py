@@ -1,6 +1,14 @@
 from common import FlagSet, AttributeTable
+from record import Field, Schema
 
 class Monster:
+
+ __slots__ = ("config", "name", "boss", "level", "hp", "gp", "xp", "attack_index",
+  "defense_index", "magic_defense_index", "speed_index", "drop_rate", "drop_table",
+  "behaviour", "lunar", "has_attributes", "has_resistances", "has_weaknesses",
+  "has_magic_power", "has_races", "has_reaction", "attributes", "resistances",
+  "weaknesses", "magic_power", "races", "reaction", "size", "palette", "sprite1",
+  "sprite2", "display_sprite", "special_size", "saved")
  
  def __init__(self, config):
   self.config = config
@@ -36,24 +44,37 @@ class Monster:
   self.sprite2 = 0
   self.display_sprite = 0
   self.special_size = 0
+
+  # The monster's values (see "state" below) and its data as it was when it was last
+  # read or written, so that writing the monsters can tell whether any of them have
+  # changed without encoding them (see write_monsters in combat.py). None if it never
+  # has been.
+  self.saved = None
  
+ # The layout of the first 10 bytes of the monster data, which every monster has
+ # (see record.py). After these come the optional parts that the "has_" flags say
+ # are there.
+ header = Schema([
+  Field("level", 0, bits = (0, 7)),
+  Field("boss", 0, bits = (7, 8), kind = "flag"),
+  Field("hp", 1, width = 2),
+  Field("attack_index", 3),
+  Field("defense_index", 4),
+  Field("magic_defense_index", 5),
+  Field("speed_index", 6),
+  Field("drop_table", 7, bits = (0, 6)),
+  Field("drop_rate", 7, bits = (6, 8)),
+  Field("behaviour", 8),
+  Field("has_reaction", 9, bits = (2, 3), kind = "flag"),
+  Field("has_races", 9, bits = (3, 4), kind = "flag"),
+  Field("has_magic_power", 9, bits = (4, 5), kind = "flag"),
+  Field("has_weaknesses", 9, bits = (5, 6), kind = "flag"),
+  Field("has_resistances", 9, bits = (6, 7), kind = "flag"),
+  Field("has_attributes", 9, bits = (7, 8), kind = "flag")
+ ])
+
  def read(self, rom, address):
-  self.level = rom.data[address] % 0x80
-  self.boss = rom.flag(address, 7)
-  self.hp = rom.data[address + 1] + rom.data[address + 2] * 0x100
-  self.attack_index = rom.data[address + 3]
-  self.defense_index = rom.data[address + 4]
-  self.magic_defense_index = rom.data[address + 5]
-  self.speed_index = rom.data[address + 6]
-  self.drop_table = rom.data[address + 7] % 0x40
-  self.drop_rate = rom.data[address + 7] >> 6
-  self.behaviour = rom.data[address + 8]
-  self.has_attributes = rom.flag(address + 9, 7)
-  self.has_resistances = rom.flag(address + 9, 6)
-  self.has_weaknesses = rom.flag(address + 9, 5)
-  self.has_magic_power = rom.flag(address + 9, 4)
-  self.has_races = rom.flag(address + 9, 3)
-  self.has_reaction = rom.flag(address + 9, 2)
+  self.header.read(self, rom, address)
   offset = 10
   if self.has_attributes:
    self.attributes.read(rom, address + offset)
@@ -72,47 +93,39 @@ class Monster:
    offset += 1
   if self.has_reaction:
    self.reaction = rom.data[address + offset]
+   offset += 1
+  self.saved = (self.state(), bytes(rom.data[address:address + offset]))
 
- def write(self, rom, address):
-  rom.data[address] = self.level % 0x80
-  rom.setbit(address, 7, self.boss)
-  rom.data[address + 1] = self.hp % 0x100
-  rom.data[address + 2] = self.hp >> 8
-  rom.data[address + 3] = self.attack_index
-  rom.data[address + 4] = self.defense_index
-  rom.data[address + 5] = self.magic_defense_index
-  rom.data[address + 6] = self.speed_index
-  rom.data[address + 7] = self.drop_table + (self.drop_rate << 6)
-  rom.data[address + 8] = self.behaviour
-  rom.data[address + 9] = 0
-  rom.setbit(address + 9, 7, self.has_attributes)
-  rom.setbit(address + 9, 6, self.has_resistances)
-  rom.setbit(address + 9, 5, self.has_weaknesses)
-  rom.setbit(address + 9, 4, self.has_magic_power)
-  rom.setbit(address + 9, 3, self.has_races)
-  rom.setbit(address + 9, 2, self.has_reaction)
-  offset = 10
+ # Returns the values that make up the monster's data, for telling whether it has
+ # changed since it was last read or written.
+ def state(self):
+  return (self.header.state(self), self.attributes.mask, self.resistances.mask,
+   self.weaknesses.mask, self.magic_power, self.races.mask, self.reaction)
+
+ # Returns the monster's data as the bytes that would be written to the rom.
+ def encode(self):
+  result = bytearray(self.header.encode(self))
   if self.has_attributes:
-   self.attributes.write(rom, address + offset)
-   offset += 3
+   result.extend(self.attributes.to_bytes())
   if self.has_resistances:
-   self.resistances.write(rom, address + offset)
-   offset += 3
+   result.extend(self.resistances.to_bytes())
   if self.has_weaknesses:
-   self.weaknesses.write(rom, address + offset)
-   offset += 1
+   result.extend(self.weaknesses.to_bytes())
   if self.has_magic_power:
-   rom.data[address + offset] = self.magic_power
-   offset += 1
+   result.append(self.magic_power)
   if self.has_races:
-   self.races.write(rom, address + offset)
-   offset += 1
+   result.extend(self.races.to_bytes())
   if self.has_reaction:
-   rom.data[address + offset] = self.reaction
-   offset += 1
+   result.append(self.reaction)
+  return bytes(result)
+
+ def write(self, rom, address):
+  data = self.encode()
+  rom.inject(address, data)
+  self.saved = (self.state(), data)
   # We need to return the length of the record so the main function can
   # compute the pointer table correctly.
-  return offset
+  return len(data)
  
  def room_needed(self):
   result = 10
@@ -132,12 +145,12 @@ class Monster:
  
  def read_name(self, rom, address, text):
   bytelist = rom.data[address:address + rom.MONSTER_NAME_WIDTH]
-  self.name = text.asciitext(text.from_bytes(bytelist)).rstrip()
+  self.name = text.decode(bytelist).rstrip()
  
  def write_name(self, rom, address, text):
-  newname = text.ff4text(self.name)
-  newname = newname.ljsut(rom.MONSTER_NAME_WIDTH, text.ff4text(" "))
-  rom.inject(address, text.to_bytes(newname))
+  newname = text.encode(self.name)
+  newname = newname.ljust(rom.MONSTER_NAME_WIDTH, text.encode(" "))
+  rom.inject(address, newname)
  
  def read_visuals(self, rom, address):
   self.size = rom.data[address]
@@ -274,7 +287,7 @@ class Monster:
     self.resistances.flags[index] = True
 
    # Make sure we set the "has_resistances" flag.
-   self.has_resistance = True
+   self.has_resistances = True
  
  # This sets the monster's resistances to the given list. All flags included in the
  # list will be set in the monster's resistances, and all flags not included will be
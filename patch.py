@@ -0,0 +1,390 @@
+import re
+import zlib
+
+# This file handles creating patch files by comparing a modified rom against the
+# original it came from. Rather than distributing a whole modified rom (which is
+# several megabytes and also not something you're allowed to hand out), you can
+# distribute a patch, which only contains the bytes that changed and is usually
+# only a few kilobytes.
+#
+# All of these functions work on the raw bytes of the files as they would appear on
+# disk, so a patch made from two headered roms expects a headered rom, and a patch
+# made from two unheadered roms expects an unheadered one.
+
+# This finds all the places where the modified bytes differ from the original bytes
+# and returns them as a list of (start, end) ranges. Ranges that are separated by no
+# more than "gap" identical bytes are merged into one, since for most patch formats
+# it's cheaper to repeat a few unchanged bytes than to start a new record. Any bytes
+# past the end of the original count as different.
+def find_differences(original, modified, gap = 0):
+ length = min(len(original), len(modified))
+
+ # Rather than comparing the buffers byte by byte in python, we XOR them together
+ # as two giant integers. Every byte that is the same in both becomes a 00 byte and
+ # every byte that differs becomes something else, so a regular expression can then
+ # find all the runs of differences in one pass without any python loops.
+ xor = int.from_bytes(original[0:length], "big") ^ int.from_bytes(modified[0:length], "big")
+ xor = xor.to_bytes(length, "big")
+ if gap > 0:
+  pattern = re.compile(b"[^\\x00]+(?:\\x00{1,%d}[^\\x00]+)*" % gap)
+ else:
+  pattern = re.compile(b"[^\\x00]+")
+ result = [(match.start(), match.end()) for match in pattern.finditer(xor)]
+
+ # Anything added to the end of the rom is one big difference. If it's close
+ # enough to the last difference, they're merged like any other.
+ if len(modified) > length:
+  if len(result) > 0 and length - result[-1][1] <= gap:
+   result[-1] = (result[-1][0], len(modified))
+  else:
+   result.append((length, len(modified)))
+ return result
+
+# This creates an IPS patch that turns the original bytes into the modified bytes
+# and returns it as a bytes object. If something goes wrong (for example, if the
+# rom is too big for the IPS format to handle), it returns None.
+def make_ips(original, modified):
+ original = memoryview(original)
+ modified = memoryview(modified)
+ patch = bytearray(b"PATCH")
+
+ # Each ordinary record costs 5 bytes on top of its data (3 for the address and 2
+ # for the length), so any two differences less than 5 bytes apart are cheaper as
+ # one record.
+ for start, end in find_differences(original, modified, 5):
+
+  # IPS addresses are only three bytes, so nothing past 16 MB can be patched.
+  if end > 0x1000000:
+   print("ERROR: The rom is too large to make an IPS patch for.")
+   return None
+
+  # An address of 0x454F46 would be mistaken for the "EOF" marker, so in that
+  # case we start the record one byte earlier instead.
+  if start == 0x454F46:
+   start -= 1
+  for address, data, run in ips_records(modified[start:end], start):
+   patch += address.to_bytes(3, "big")
+   if run > 0:
+    patch += bytes(2) + run.to_bytes(2, "big") + data
+   else:
+    patch += len(data).to_bytes(2, "big") + data
+
+ # If the rom got smaller, we use the "truncate" extension, which is simply the new
+ # size of the rom following the EOF marker.
+ patch += b"EOF"
+ if len(modified) < len(original):
+  patch += len(modified).to_bytes(3, "big")
+ return bytes(patch)
+
+# This splits a range of changed bytes into IPS records, yielding an (address,
+# data, run) tuple for each. For ordinary records, run is 0 and data is the bytes to
+# write. For RLE records, run is the number of times to repeat the single byte in
+# data. A record can hold at most 0xFFFF bytes, and long runs of the same byte are
+# turned into RLE records when that makes the patch smaller.
+def ips_records(data, address):
+
+ # An RLE record costs 8 bytes. When the run is in the middle of other changes, it
+ # also means the changes after it need a new 5 byte record header, so it needs to
+ # be longer to be worth it.
+ runs = [match.span() for match in re.finditer(b"(.)\\1{8,}", data, re.DOTALL)]
+ runs = [(start, end) for start, end in runs if end == len(data) and end - start > 8 or end - start > 13]
+
+ # No record may start at 0x454F46 (see above), so if a run would start or end
+ # there, we make it one byte shorter on that side.
+ eof = 0x454F46 - address
+ runs = [(start + 1 if start == eof else start, end - 1 if end == eof else end) for start, end in runs]
+ position = 0
+ for start, end in runs + [(len(data), len(data))]:
+
+  # First the ordinary bytes before the run, if any.
+  while position < start:
+   length = min(start - position, 0xFFFF)
+   if position + length == eof and length > 1:
+    length -= 1
+   yield address + position, bytes(data[position:position + length]), 0
+   position += length
+
+  # Then the run itself.
+  while position < end:
+   length = min(end - position, 0xFFFF)
+   if position + length == eof and length > 1:
+    length -= 1
+   yield address + position, bytes(data[position:position + 1]), length
+   position += length
+
+# BPS patches store numbers in a variable-length format. Each byte holds seven bits
+# of the number, and the high bit is set on the last byte.
+def encode_number(number):
+ result = bytearray()
+ while True:
+  bits = number & 0x7F
+  number >>= 7
+  if number == 0:
+   result.append(0x80 | bits)
+   return bytes(result)
+  result.append(bits)
+  number -= 1
+
+# BPS actions. Each action is a number whose low two bits are the type of action
+# and whose remaining bits are the length minus 1.
+SOURCE_READ = 0
+TARGET_READ = 1
+SOURCE_COPY = 2
+TARGET_COPY = 3
+
+def encode_action(action, length):
+ return encode_number(((length - 1) << 2) + action)
+
+# This creates a BPS patch that turns the original bytes into the modified bytes
+# and returns it as a bytes object. Unlike IPS, BPS has no size limit and records
+# checksums of both roms so that applying it to the wrong rom can be detected.
+def make_bps(original, modified):
+ original = memoryview(original)
+ modified = memoryview(modified)
+ patch = bytearray(b"BPS1")
+ patch += encode_number(len(original))
+ patch += encode_number(len(modified))
+
+ # We don't include any metadata.
+ patch += encode_number(0)
+
+ # The patch is a list of actions that build the modified rom from start to end.
+ # Unchanged stretches use "source read", which copies the bytes at the same
+ # position in the original; changed stretches either include the new bytes
+ # directly ("target read") or, for long runs of one byte, include that byte once
+ # and then copy it forward from what was just written ("target copy").
+ position = 0
+ copied = 0
+ for start, end in find_differences(original, modified, 2):
+  if start > position:
+   patch += encode_action(SOURCE_READ, start - position)
+  runs = [match.span() for match in re.finditer(b"(.)\\1{8,}", modified[start:end], re.DOTALL)]
+  runs = [(start + runstart, start + runend) for runstart, runend in runs]
+  for runstart, runend in runs + [(end, end)]:
+   if runstart > start:
+    patch += encode_action(TARGET_READ, runstart - start)
+    patch += modified[start:runstart]
+   if runend > runstart:
+    patch += encode_action(TARGET_READ, 1)
+    patch += modified[runstart:runstart + 1]
+    patch += encode_action(TARGET_COPY, runend - runstart - 1)
+
+    # Target copies are relative to where the last target copy left off, so we
+    # have to work out how far that is from the byte we just wrote. The offset is
+    # stored with its sign in the lowest bit.
+    offset = runstart - copied
+    patch += encode_number((abs(offset) << 1) + (1 if offset < 0 else 0))
+    copied = runend - 1
+   start = runend
+  position = end
+ if len(modified) > position:
+  patch += encode_action(SOURCE_READ, len(modified) - position)
+
+ # Finally, the checksums of the original, the modified rom, and the patch itself.
+ patch += zlib.crc32(original).to_bytes(4, "little")
+ patch += zlib.crc32(modified).to_bytes(4, "little")
+ patch += zlib.crc32(patch).to_bytes(4, "little")
+ return bytes(patch)
+
+# This reads one of the variable-length numbers used by BPS and UPS patches from the
+# given position in the patch, and returns the number along with the position just
+# after it.
+def decode_number(data, position):
+ number = 0
+ shift = 1
+ while True:
+  byte = data[position]
+  position += 1
+  number += (byte & 0x7F) * shift
+  if byte & 0x80:
+   return number, position
+  shift <<= 7
+  number += shift
+
+# This checks the three checksums at the end of a BPS or UPS patch against the
+# original bytes and the patch itself. It returns the expected checksum of the
+# patched bytes if everything matches, or None (after printing what went wrong) if
+# not.
+def check_source(data, source):
+ if zlib.crc32(data[0:len(data) - 4]) != int.from_bytes(data[-4:], "little"):
+  print("ERROR: The patch file is corrupted (its checksum doesn't match).")
+  return None
+ if zlib.crc32(source) != int.from_bytes(data[-12:-8], "little"):
+  print("ERROR: This patch was made for a different rom (the checksum doesn't match).")
+  return None
+ return int.from_bytes(data[-8:-4], "little")
+
+# This applies a BPS patch (given as the bytes of the patch file) to the original
+# bytes and returns the patched bytes as a new bytearray, along with a list of the
+# (start, end) ranges in it that the patch changed. If the patch doesn't match the
+# original or is damaged, it prints an error and returns None instead.
+#
+# Every action copies a whole stretch of bytes at once through memoryviews, so the
+# time this takes depends on the number of actions rather than the size of the rom.
+def apply_bps(source, data):
+ data = memoryview(data)
+ source = memoryview(source)
+ if len(data) < 19 or data[0:4] != b"BPS1":
+  print("ERROR: Invalid bps file.")
+  return None
+ expected = check_source(data, source)
+ if expected is None:
+  return None
+ sourcesize, position = decode_number(data, 4)
+ targetsize, position = decode_number(data, position)
+ metadata, position = decode_number(data, position)
+ position += metadata
+ if sourcesize != len(source):
+  print("ERROR: This patch was made for a rom of a different size.")
+  return None
+
+ target = bytearray(targetsize)
+ output = memoryview(target)
+ offset = 0
+ sourcecopy = 0
+ targetcopy = 0
+ touched = []
+ end = len(data) - 12
+ while position < end:
+  action, position = decode_number(data, position)
+  length = (action >> 2) + 1
+  action &= 3
+
+  # Copy from the same position in the original. This is how unchanged bytes are
+  # stored, so it doesn't count as touching anything.
+  if action == SOURCE_READ:
+   output[offset:offset + length] = source[offset:offset + length]
+
+  # Copy bytes stored in the patch itself.
+  elif action == TARGET_READ:
+   output[offset:offset + length] = data[position:position + length]
+   position += length
+
+  # Copy from somewhere else in the original.
+  elif action == SOURCE_COPY:
+   relative, position = decode_number(data, position)
+   sourcecopy += -(relative >> 1) if relative & 1 else relative >> 1
+   output[offset:offset + length] = source[sourcecopy:sourcecopy + length]
+   sourcecopy += length
+
+  # Copy from earlier in the patched bytes. The two stretches can overlap, in which
+  # case the bytes being copied repeat every "distance" bytes. Rather than copying
+  # one byte at a time, we copy the repeating part and then keep doubling the
+  # amount copied until the whole length is filled.
+  else:
+   relative, position = decode_number(data, position)
+   targetcopy += -(relative >> 1) if relative & 1 else relative >> 1
+   start = targetcopy
+   if start < 0 or start >= offset:
+    print("ERROR: The patch file is corrupted (it copies bytes that don't exist yet).")
+    return None
+   copied = 0
+   while copied < length:
+    step = min(length - copied, offset + copied - start)
+    output[offset + copied:offset + copied + step] = output[start:start + step]
+    copied += step
+   targetcopy += length
+  if action != SOURCE_READ:
+   touched.append((offset, offset + length))
+  offset += length
+
+ output.release()
+ if zlib.crc32(target) != expected:
+  print("ERROR: The patched rom's checksum doesn't match the one in the patch.")
+  return None
+ if targetsize > sourcesize:
+  touched.append((sourcesize, targetsize))
+ return target, touched
+
+# This applies a UPS patch (given as the bytes of the patch file) to the original
+# bytes in the same way as apply_bps above. UPS patches store each changed stretch
+# as the XOR of the old and new bytes, which means the same patch can also undo
+# itself; if it's given a rom that has already been patched, it unpatches it.
+def apply_ups(source, data):
+ data = bytes(data)
+ if len(data) < 18 or data[0:4] != b"UPS1":
+  print("ERROR: Invalid ups file.")
+  return None
+ sourcesize, position = decode_number(data, 4)
+ targetsize, position = decode_number(data, position)
+ sourcechecksum = int.from_bytes(data[-12:-8], "little")
+ targetchecksum = int.from_bytes(data[-8:-4], "little")
+ if zlib.crc32(data[0:len(data) - 4]) != int.from_bytes(data[-4:], "little"):
+  print("ERROR: The patch file is corrupted (its checksum doesn't match).")
+  return None
+ checksum = zlib.crc32(source)
+ if len(source) == targetsize and checksum == targetchecksum:
+  sourcesize, targetsize = targetsize, sourcesize
+  sourcechecksum, targetchecksum = targetchecksum, sourcechecksum
+ if len(source) != sourcesize or checksum != sourcechecksum:
+  print("ERROR: This patch was made for a different rom (the checksum doesn't match).")
+  return None
+
+ # The patched bytes start out as a copy of the original, padded with 0s if the
+ # patched rom is bigger. Each hunk then says how many bytes to skip, followed by
+ # the bytes to XOR with until a 0 byte ends the hunk. The XOR is done on each
+ # hunk as a whole by treating it as one big integer. If the patched rom is
+ # smaller, it's cut down at the end; the bytes past the end are still included
+ # in the patch so that it can be undone.
+ size = max(sourcesize, targetsize)
+ target = bytearray(source)
+ target.extend(bytes(size - len(target)))
+ touched = []
+ offset = 0
+ end = len(data) - 12
+ while position < end:
+  skip, position = decode_number(data, position)
+  offset += skip
+  stop = data.find(b"\x00", position, end)
+  if stop < 0:
+   stop = end
+  length = min(stop - position, max(0, size - offset))
+  if length > 0:
+   old = int.from_bytes(target[offset:offset + length], "big")
+   new = old ^ int.from_bytes(data[position:position + length], "big")
+   target[offset:offset + length] = new.to_bytes(length, "big")
+   touched.append((offset, offset + length))
+  offset += stop - position + 1
+  position = stop + 1
+
+ del target[targetsize:]
+ touched = [(start, min(end, targetsize)) for start, end in touched if start < targetsize]
+ if zlib.crc32(target) != targetchecksum:
+  print("ERROR: The patched rom's checksum doesn't match the one in the patch.")
+  return None
+ if targetsize > sourcesize:
+  touched.append((sourcesize, targetsize))
+ return target, touched
+
+# This creates a UPS patch that turns the original bytes into the modified bytes
+# and returns it as a bytes object.
+def make_ups(original, modified):
+ original = memoryview(original)
+ modified = memoryview(modified)
+ originalsize = len(original)
+ modifiedsize = len(modified)
+ patch = bytearray(b"UPS1")
+ patch += encode_number(originalsize)
+ patch += encode_number(modifiedsize)
+
+ # Whichever of the two is shorter is treated as if it were padded with 0s to
+ # the length of the other, so that the patch can be undone even if the rom
+ # changed size. Unchanged bytes can't appear inside a hunk (their XOR is the 0
+ # that ends one), so no merging is done here.
+ size = max(len(original), len(modified))
+ if len(original) < size:
+  original = bytes(original) + bytes(size - len(original))
+ if len(modified) < size:
+  modified = bytes(modified) + bytes(size - len(modified))
+ position = 0
+ for start, end in find_differences(original, modified):
+  patch += encode_number(start - position)
+  xor = int.from_bytes(original[start:end], "big") ^ int.from_bytes(modified[start:end], "big")
+  patch += xor.to_bytes(end - start, "big")
+  patch += b"\x00"
+  position = end + 1
+
+ patch += zlib.crc32(original[0:originalsize]).to_bytes(4, "little")
+ patch += zlib.crc32(modified[0:modifiedsize]).to_bytes(4, "little")
+ patch += zlib.crc32(patch).to_bytes(4, "little")
+ return bytes(patch)
@@ -0,0 +1,184 @@
+import struct
+
+# A lot of the game data is stored as fixed-size records, where each value is a
+# certain byte (or a few bits of a certain byte, or a couple of bytes together) at a
+# certain position in the record. Rather than reading and writing every one of those
+# by hand, a class can describe its records with a Schema, which is a list of these
+# Fields, and let the Schema do the reading and writing. For example:
+#  Field("power", 1)                  The whole of byte 1.
+#  Field("hit", 2, bits = (0, 7))     The lowest 7 bits of byte 2.
+#  Field("hitsboss", 2, bits = (7, 8), kind = "inverted")
+#                                     Bit 7 of byte 2, as a boolean that's True
+#                                     when the bit is NOT set.
+#  Field("max_hp", 9, width = 2)      Bytes 9 and 10 as a 16-bit number.
+#  Field("stats", 15, count = 5)      Bytes 15 to 19, as a list of 5 numbers.
+#  Field("races", 5, kind = "object") Byte 5, converted with the from_byte and to_byte
+#                                     methods of the object in self.races (such as a
+#                                     FlagSet).
+# If "signed" is True, the value is read as a signed number. A value can also be
+# split across more than one place by giving several Fields with the same name and
+# different "shift"s; the "shift" says which bit of the value the Field starts at.
+class Field:
+
+ def __init__(self, name, offset, width = 1, bits = None, signed = False, kind = "number", count = 1, shift = 0, index = None):
+  self.name = name
+  self.offset = offset
+  self.width = width
+  self.bits = bits
+  self.signed = signed
+  self.kind = kind
+  self.count = count
+  self.shift = shift
+  self.index = index
+
+# This reads and writes records described by a list of Fields (see above). When the
+# Schema is created, it works out a struct format that unpacks the whole record in
+# one go, and then writes the Python code that converts between the unpacked numbers
+# and the attributes of an object, with all the masks and shifts worked out ahead of
+# time. So reading or writing a record is just one call to struct and one call to
+# that code, no matter how many fields there are. A class only needs one Schema,
+# which is shared by all its objects.
+# Every byte of the record must be covered by some Field, since the whole record is
+# written at once.
+class Schema:
+
+ def __init__(self, fields):
+
+  # First, the fields with a count are split into one field per entry, and fields
+  # that struct can't unpack in one go (3 bytes, or more than 4) are split into
+  # pieces that it can, such as a 2-byte and a 1-byte piece for 3 bytes.
+  parts = []
+  for field in fields:
+   for index in range(field.count):
+    entry = field.index
+    if field.count > 1:
+     entry = index
+    offset = field.offset + index * field.width
+    position = 0
+    while position < field.width:
+     size = min(field.width - position, 4)
+     if size == 3:
+      size = 2
+     parts.append((field, entry, offset + position, size, field.shift + position * 8))
+     position += size
+
+  # Then each distinct (offset, size) gets a place in the struct format.
+  slots = sorted(set((part[2], part[3]) for part in parts))
+  self.size = 0
+  for offset, size in slots:
+   if offset != self.size:
+    print("ERROR: Record fields overlap or leave a gap at byte {}.".format(self.size))
+   self.size = offset + size
+  codes = {1: "B", 2: "H", 4: "I"}
+  self.format = struct.Struct("<" + "".join(codes[size] for offset, size in slots))
+  number = {slot: index for index, slot in enumerate(slots)}
+
+  # Now we gather up the pieces that make up each value (by its name, and its index
+  # if it's an entry in a list), and the pieces that make up each slot. These are
+  # kept, since they're also what tables.py uses to convert whole tables at once.
+  self.slots = slots
+  self.values = {}
+  self.pieces = {slot: [] for slot in slots}
+  for field, entry, offset, size, shift in parts:
+   low, high = (0, size * 8) if field.bits is None else field.bits
+   slot = number[(offset, size)]
+   self.values.setdefault((field.name, entry), (field, []))[1].append((slot, size, low, high - low, shift))
+   self.pieces[(offset, size)].append((field.name, entry, field, low, high - low, shift))
+
+  # In the code, a value is written as "record.name" or "record.name[index]".
+  def target(name, entry):
+   if entry is None:
+    return "record." + name
+   return "record.{}[{}]".format(name, entry)
+
+  # The decoding code sets each value from the unpacked slots.
+  lines = ["def decode(record, data, address):"]
+  lines.append(" {}, = unpack(data, address)".format(", ".join("v{}".format(index) for index in range(len(slots)))))
+  for (name, entry), (field, places) in self.values.items():
+   target_code = target(name, entry)
+   terms = []
+   for slot, size, low, length, shift in places:
+    term = "v{}".format(slot)
+    if low > 0:
+     term = "({} >> {})".format(term, low)
+    if low + length < size * 8:
+     term = "({} & {})".format(term, (1 << length) - 1)
+    if shift > 0:
+     term = "({} << {})".format(term, shift)
+    terms.append(term)
+   expression = " | ".join(terms)
+   if field.kind == "flag":
+    lines.append(" {} = {} != 0".format(target_code, expression))
+   elif field.kind == "inverted":
+    lines.append(" {} = {} == 0".format(target_code, expression))
+   elif field.kind == "object":
+    lines.append(" {}.from_byte({})".format(target_code, expression))
+   elif field.signed:
+    total = max(shift + length for slot, size, low, length, shift in places)
+    lines.append(" value = {}".format(expression))
+    lines.append(" {} = value - (value >> {} << {})".format(target_code, total - 1, total))
+   else:
+    lines.append(" {} = {}".format(target_code, expression))
+
+  # And the encoding code builds each slot back up from the values.
+  slotcode = []
+  for slot in slots:
+   terms = []
+   for name, entry, field, low, length, shift in self.pieces[slot]:
+    target_code = target(name, entry)
+    if field.kind == "flag":
+     term = "({} if {} else 0)".format(1 << low, target_code)
+    elif field.kind == "inverted":
+     term = "(0 if {} else {})".format(target_code, 1 << low)
+    elif field.kind == "object":
+     term = "{}.to_byte()".format(target_code)
+    else:
+     term = target_code
+     if shift > 0:
+      term = "({} >> {})".format(term, shift)
+     term = "({} & {})".format(term, (1 << length) - 1)
+     if low > 0:
+      term = "({} << {})".format(term, low)
+    terms.append(term)
+   slotcode.append(" | ".join(terms))
+  lines.append("def encode(record):")
+  lines.append(" return pack({})".format(", ".join(slotcode)))
+
+  # The state code just gathers up the values as they are, without packing them, so
+  # that whether a record has changed can be told without encoding it.
+  statecode = []
+  for (name, entry), (field, places) in self.values.items():
+   if field.kind == "object":
+    statecode.append("{}.to_byte()".format(target(name, entry)))
+   else:
+    statecode.append(target(name, entry))
+  lines.append("def state(record):")
+  lines.append(" return ({},)".format(", ".join(statecode)))
+
+  # Finally, the code is compiled into actual functions.
+  namespace = {"unpack": self.format.unpack_from, "pack": self.format.pack}
+  self.source = "\n".join(lines)
+  exec(self.source, namespace)
+  self.decode = namespace["decode"]
+  self.encode = namespace["encode"]
+  self.state = namespace["state"]
+
+ # Reads the record at the given address into the given object. The object keeps its
+ # values and the bytes they were read from in its "saved" attribute (see write
+ # below).
+ def read(self, record, rom, address):
+  view = rom.view(address, self.size)
+  self.decode(record, view, 0)
+  record.saved = (self.state(record), bytes(view))
+  view.release()
+
+ # Writes the given object back to the rom as a record at the given address. If its
+ # values are the same as when it was last read or written, and the rom still has the
+ # same bytes there, there's nothing to do, so it isn't encoded again.
+ def write(self, record, rom, address):
+  state = self.state(record)
+  if record.saved is not None and record.saved[0] == state and rom.data[address:address + self.size] == record.saved[1]:
+   return
+  data = self.encode(record)
+  rom.inject(address, data)
+  record.saved = (state, data)
@@ -0,0 +1,209 @@
+import concurrent.futures
+import tables
+import common
+import constants.all as constants
+import categories.magic as magic
+import categories.gear as gear
+import categories.party as party
+import categories.combat as combat
+import categories.world as world
+import categories.story as story
+
+# Each type of data that can be read from the rom and written back to it is
+# described by one of these, and FF4Rom's "read" and "write" (and the reading of data
+# the first time it's used) all work from the list of them below.
+#  "name"         The name of the type of data, as given to "read" and "write".
+#  "readers"      The attributes of the FF4Rom it's read into, each with the
+#                 function that reads it (given the FF4Rom) and returns its value.
+#                 Most have just the one attribute with the same name, but the
+#                 messages, for example, are read into three.
+#  "writer"       The function that writes it back, given the FF4Rom and a dict of
+#                 options (such as "include_triggers"), or None if it can't be
+#                 written yet. The "force" option says whether the rom may have
+#                 changed since the data was read or last written (see "write" in
+#                 gamingway.py); if it's False, writers that can tell which of their
+#                 objects have changed only write those.
+#  "dependencies" The names of the other types of data it needs to have been read
+#                 first, because its objects refer to theirs.
+#  "groups"       The more general names it's also read and written under, such as
+#                 "magic" for the spells (besides "all", which everything is under).
+#  "constants"    The function that sets its constants (such as CURE1_SPELL) once
+#                 it's been read, if it has any.
+# The parts of the rom each one is read from are given by data_regions in rom.py,
+# under the names of its attributes.
+class Category:
+
+ def __init__(self, name, readers, writer = None, dependencies = [], groups = [], constants = None):
+  self.name = name
+  self.readers = readers
+  self.writer = writer
+  self.dependencies = dependencies
+  self.groups = ["all", name] + groups
+  self.constants = constants
+
+ # Returns the (start, end) address ranges of the rom this type of data is read
+ # from.
+ def regions(self, rom):
+  regions = rom.data_regions()
+  return [region for attribute in self.readers for region in regions[attribute]]
+
+def read_items(ff4):
+ sections = {"weapons": slice(0, ff4.rom.TOTAL_WEAPONS), "armors": slice(ff4.rom.ARMORS_START_INDEX, ff4.rom.ARMORS_START_INDEX + ff4.rom.TOTAL_ARMORS)}
+ return tables.Collection(gear.read_items(ff4.rom, ff4.text), sections = sections)
+
+# A full breakdown of the data category structure is in the readme.
+# Writing certain types of data can cause a slight misalignment in the data, the
+# pointers, or both, even if you change nothing. I'm not completely sure why this
+# happens, but as far as I can tell it doesn't affect actual gameplay. In any case,
+# each type of data known to do this is tagged below with a comment to that effect.
+CATEGORIES = [
+ # The attribute tables are shared by the spells and the items, so they're read
+ # along with either of them.
+ Category("attributes",
+  {"attributes": lambda ff4: common.read_attributes(ff4.rom)},
+  groups = ["magic", "gear", "spells", "items"]),
+ Category("spells",
+  {"spells": lambda ff4: tables.Collection(magic.read_spells(ff4.rom, ff4.text), "spells")},
+  lambda ff4, options: magic.write_spells(ff4.rom, ff4.text, ff4.spells),
+  groups = ["magic"],
+  constants = constants.set_spell_constants),
+ Category("spellbooks",
+  {"spellbooks": lambda ff4: magic.read_spellbooks(ff4.rom, ff4.spells)},
+  lambda ff4, options: magic.write_spellbooks(ff4.rom, ff4.spellbooks),
+  dependencies = ["spells"],
+  groups = ["magic"],
+  constants = constants.set_spellbook_constants),
+ Category("equips",
+  {"equips": lambda ff4: gear.read_equips(ff4.rom)},
+  lambda ff4, options: gear.write_equips(ff4.rom, ff4.equips),
+  groups = ["gear"]),
+ Category("items",
+  {"items": read_items},
+  lambda ff4, options: gear.write_items(ff4.rom, ff4.text, ff4.items),
+  groups = ["gear"],
+  constants = constants.set_item_constants),
+ Category("jobs",
+  {"jobs": lambda ff4: party.read_jobs(ff4.rom, ff4.text)},
+  lambda ff4, options: party.write_jobs(ff4.rom, ff4.text, ff4.jobs),
+  groups = ["party"],
+  constants = constants.set_job_constants),
+ # Something is causing the TNL values to be messed up when these are written.
+ Category("characters",
+  {"characters": lambda ff4: party.read_characters(ff4.rom)},
+  lambda ff4, options: party.write_characters(ff4.rom, ff4.characters),
+  groups = ["party"],
+  constants = constants.set_character_constants),
+ Category("actors",
+  {"actors": lambda ff4: party.read_actors(ff4.rom)},
+  lambda ff4, options: party.write_actors(ff4.rom, ff4.actors),
+  groups = ["party"],
+  constants = constants.set_actor_constants),
+ Category("commands",
+  {"commands": lambda ff4: party.read_commands(ff4.rom, ff4.text)},
+  lambda ff4, options: party.write_commands(ff4.rom, ff4.text, ff4.commands),
+  groups = ["party"],
+  constants = constants.set_command_constants),
+ # Causes a slight data misalignment when written, even with no changes.
+ Category("monsters",
+  {"monsters": lambda ff4: tables.Collection(combat.read_monsters(ff4.rom, ff4.text, ff4.config), "monsters")},
+  lambda ff4, options: combat.write_monsters(ff4.rom, ff4.text, ff4.monsters, options["force"]),
+  groups = ["combat"],
+  constants = constants.set_monster_constants),
+ Category("mapnames",
+  {"map_names": lambda ff4: world.read_map_names(ff4.rom, ff4.text)},
+  lambda ff4, options: world.write_map_names(ff4.rom, ff4.text, ff4.map_names),
+  groups = ["world"]),
+ Category("maps",
+  {"maps": lambda ff4: tables.Collection(world.read_maps(ff4.rom), "maps")},
+  lambda ff4, options: world.write_maps(ff4.rom, ff4.maps, options["include_triggers"], options["force"]),
+  groups = ["world"],
+  constants = constants.set_map_constants),
+ Category("tilemaps",
+  {"tilemaps": lambda ff4: world.read_tilemaps(ff4.rom)},
+  lambda ff4, options: world.write_tilemaps(ff4.rom, ff4.tilemaps, options["force"]),
+  groups = ["world"]),
+ Category("overworld",
+  {"overworld": lambda ff4: world.read_overworld(ff4.rom)},
+  lambda ff4, options: world.write_overworld(ff4.rom, ff4.overworld, options["force"]),
+  groups = ["world"]),
+ # These aren't written yet, since writing them causes a slight data misalignment,
+ # even with no changes.
+ Category("launchers",
+  {"launchers": lambda ff4: world.read_launchers(ff4.rom)},
+  groups = ["world"]),
+ Category("events",
+  {"events": lambda ff4: story.read_events(ff4.rom, ff4.config)},
+  groups = ["story"]),
+ # These aren't written yet either, since where the message banks and the DTE table
+ # are in the rom hasn't been verified (see rom.py).
+ Category("messages",
+  {
+   "bank1_messages": lambda ff4: story.read_messages(ff4.rom, ff4.text, 1),
+   "bank2_messages": lambda ff4: story.read_messages(ff4.rom, ff4.text, 2),
+   "bank3_messages": lambda ff4: story.read_messages(ff4.rom, ff4.text, 3)
+  },
+  groups = ["story"])
+]
+
+# The categories by name, and by the names of the attributes they're read into.
+BY_NAME = {category.name: category for category in CATEGORIES}
+ATTRIBUTES = {attribute: category for category in CATEGORIES for attribute in category.readers}
+
+# Returns the categories that the given name (of a type of data, or of a group such
+# as "magic" or "all") refers to.
+def select(datatype):
+ return [category for category in CATEGORIES if datatype in category.groups]
+
+# Returns the given categories along with everything they depend on, in an order
+# where each one comes after everything it depends on.
+def order(categories):
+ result = []
+ def visit(category):
+  if category not in result:
+   for dependency in category.dependencies:
+    visit(BY_NAME[dependency])
+   result.append(category)
+ for category in categories:
+  visit(category)
+ return result
+
+# Returns the names of the attributes that the given attribute's objects refer to
+# (see "dependencies" above).
+def references(attribute):
+ return [name for dependency in ATTRIBUTES[attribute].dependencies for name in BY_NAME[dependency].readers]
+
+# Returns a finished Future (from concurrent.futures) with the given value.
+def finished(value):
+ future = concurrent.futures.Future()
+ future.set_result(value)
+ return future
+
+# Reads the given attributes of the given FF4Rom, as a list of (category, attribute)
+# pairs in the order given by "order" above, and sets the constants of each category
+# once it's been read. (All the attributes of a category are read in the same
+# batch.) Everything that doesn't depend on something still being read is read at
+# once, as a batch; if an executor (such as a ThreadPoolExecutor from
+# concurrent.futures) is given, the readers in each batch run in it at the same
+# time, and if a pool of worker processes is given (see workers.py), the types of
+# data that don't depend on any others are read in that instead. Either way, the
+# results are only set on the FF4Rom, in order, once the whole batch is done.
+def read(ff4, jobs, executor = None, pool = None):
+ while len(jobs) > 0:
+  waiting = set(category.name for category, attribute in jobs)
+  batch = [job for job in jobs if not any(dependency in waiting for dependency in job[0].dependencies)]
+  jobs = [job for job in jobs if job not in batch]
+  futures = []
+  for category, attribute in batch:
+   reader = lambda reader = category.readers[attribute]: reader(ff4)
+   if pool is not None and len(category.dependencies) == 0:
+    futures.append(pool.submit(attribute))
+   elif executor is not None:
+    futures.append(executor.submit(ff4.read_data, attribute, reader))
+   else:
+    futures.append(finished(ff4.read_data(attribute, reader)))
+  for (category, attribute), future in zip(batch, futures):
+   setattr(ff4, attribute, future.result())
+   ff4.synced[attribute] = ff4.rom.region_hashes([attribute])[attribute]
+  for category in CATEGORIES:
+   if category.constants is not None and any(job[0] is category for job in batch):
+    category.constants(ff4)
@@ -1,8 +1,598 @@
+import copy
+import mmap
+import hashlib
+import bisect
+import struct
+import contextlib
+import itertools
+import patch
+
+# The size of the header some roms have in front of the actual game data. All the
+# addresses in this library are for a headered rom.
+HEADER_SIZE = 0x200
+
+# Where the "generation" of each RomBuffer (see below) comes from. Every buffer
+# takes a new number from here when it's made and every time it changes, so no two
+# buffers (or two states of the same buffer) ever have the same one.
+generations = itertools.count()
+
+# A RomBuffer is what actually holds the raw bytes of the rom. It behaves like a
+# bytearray as far as indexing, slicing, and assignment go, but it adds a few things
+# on top of that:
+#  * The bytes can live in a read-only memory mapped file instead of in memory. The
+#    first time anything is written, the whole buffer is copied into a bytearray
+#    (and the mapping is dropped), so reading never costs a copy but writing still
+#    works exactly as it would otherwise.
+#  * It can pretend to have a header that isn't really there. All the addresses in
+#    this library assume a headered rom, so for an unheadered rom, "header" is set
+#    to the size of the missing header and every address is shifted by that amount
+#    before it reaches the real bytes. Reading from the pretend header gives 0s and
+#    writing to it does nothing, which is the same as if the header were padding.
+#  * It keeps track of which addresses have actually been changed since the rom was
+#    loaded (see "mark" below), so that saving can skip everything else.
+#  * While any snapshots are open, it keeps a journal of the old bytes of every
+#    write so they can be put back (see "snapshot" below).
+class RomBuffer:
+
+ def __init__(self, buffer, header = 0):
+  self.buffer = buffer
+  self.header = header
+
+  # Only bytearrays can be written to directly; anything else (memory maps or
+  # plain bytes) gets copied into a bytearray on the first write. The same goes for
+  # a bytearray that's being shared with clones (see "clone" below).
+  self.writable = isinstance(buffer, bytearray)
+  self.shared = False
+
+  # The changed ("dirty") addresses are kept as a sorted list of ranges that never
+  # overlap or touch. The starts and ends are stored in two separate lists so they
+  # can be searched with bisect.
+  self.dirty_starts = []
+  self.dirty_ends = []
+
+  # The journal is a list of (address, old) entries, one for each write, where
+  # "old" is the bytes that were there before. A change in size is recorded as
+  # (length, None), where "length" is the size it was before.
+  # It's only kept while there are open snapshots, so it costs nothing otherwise.
+  self.journal = None
+  self.snapshots = 0
+  self.redos = []
+
+  # The length the journal had when the latest snapshot was taken (or restored).
+  # Entries from before then are never added on to (see "record" below).
+  self.sealed = 0
+
+  # This changes whenever the bytes do, so anything worked out from them (such as
+  # the text index in search.py) can tell whether it's still up to date without
+  # looking at the bytes again.
+  self.generation = next(generations)
+
+ # The length includes the pretend header, if any.
+ def __len__(self):
+  return len(self.buffer) + self.header
+
+ def __iter__(self):
+  for index in range(self.header):
+   yield 0
+  yield from self.buffer
+
+ # This converts a slice into a (start, stop) pair of addresses in the rom. Steps
+ # other than 1 aren't used anywhere in the library, so they aren't supported.
+ def bounds(self, key):
+  start, stop, step = key.indices(len(self))
+  if step != 1:
+   raise ValueError("RomBuffer slices must have a step of 1")
+  return start, max(start, stop)
+
+ def __getitem__(self, key):
+
+  # Single bytes are by far the most common case, so they're checked first.
+  if type(key) is int:
+   if key < 0:
+    key += len(self)
+   if key >= self.header:
+    return self.buffer[key - self.header]
+   if key < 0:
+    raise IndexError("rom address out of range")
+   return 0
+
+  # For slices, any part that falls within the pretend header is filled with 0s.
+  start, stop = self.bounds(key)
+  if start >= self.header:
+   return self.buffer[start - self.header:stop - self.header]
+  padding = bytes(min(stop, self.header) - start)
+  return padding + self.buffer[0:max(0, stop - self.header)]
+
+ # Writing bytes that are the same as the ones already there does nothing at all,
+ # so it doesn't mark anything as changed (or copy a memory mapped rom).
+ def __setitem__(self, key, value):
+  if type(key) is int:
+   if key < 0:
+    key += len(self)
+   if key >= self.header:
+    if self.buffer[key - self.header] != value:
+     if not self.writable:
+      self.promote()
+     if self.journal is not None:
+      self.record(key, self.buffer[key - self.header])
+     self.buffer[key - self.header] = value
+     self.mark(key, key + 1)
+   elif key < 0:
+    raise IndexError("rom address out of range")
+  else:
+
+   # Any part of the slice that falls within the pretend header is dropped.
+   # Unlike a bytearray, the rom never grows or shrinks from slice assignment, so
+   # the new bytes have to fit exactly where they're going.
+   start, stop = self.bounds(key)
+   if len(value) != stop - start:
+    raise IndexError("rom address out of range")
+   if start < self.header:
+    value = value[self.header - start:]
+    start = self.header
+   if start >= stop or memoryview(self.buffer)[start - self.header:stop - self.header] == value:
+    return
+   if not self.writable:
+    self.promote()
+   if self.journal is not None:
+    self.record(start, bytes(self.buffer[start - self.header:stop - self.header]))
+   self.buffer[start - self.header:stop - self.header] = value
+   self.mark(start, stop)
+
+ # This records that the addresses from start up to (but not including) end have
+ # been changed, merging the range into any it overlaps or touches.
+ def mark(self, start, end):
+  self.generation = next(generations)
+  starts = self.dirty_starts
+  ends = self.dirty_ends
+
+  # The first range that ends at or after the new start. Most of the time the new
+  # range is already inside it or just touches it, and there's nothing else to do
+  # but stretch it.
+  first = bisect.bisect_left(ends, start)
+  if first < len(ends) and starts[first] <= end:
+   if starts[first] <= start and end <= ends[first]:
+    return
+   if first + 1 == len(ends) or end < starts[first + 1]:
+    if start < starts[first]:
+     starts[first] = start
+    if end > ends[first]:
+     ends[first] = end
+    return
+
+  # Otherwise we also need the first range that starts after the new end.
+  # Everything from "first" up to that one gets merged with the new range.
+  last = bisect.bisect_right(starts, end)
+  if first < last:
+   start = min(start, starts[first])
+   end = max(end, ends[last - 1])
+  starts[first:last] = [start]
+  ends[first:last] = [end]
+
+ # This returns the changed address ranges as a list of (start, end) pairs.
+ def dirty_ranges(self):
+  return list(zip(self.dirty_starts, self.dirty_ends))
+
+ # This forgets about all the changes made so far, as if the rom had just been
+ # loaded.
+ def clear_dirty(self):
+  self.dirty_starts = []
+  self.dirty_ends = []
+
+ # This adds an entry to the journal. Any new change means that whatever was
+ # undone before can no longer be redone.
+ # Most data is written one byte after another, so a single byte written right
+ # after the end of the previous entry is simply added on to that entry. This keeps
+ # the journal (and the time it takes to restore it) down to one entry per stretch
+ # of writes rather than one per byte.
+ def record(self, address, old):
+  journal = self.journal
+  if len(self.redos) > 0:
+   self.redos = []
+  if type(old) is int:
+   if len(journal) > self.sealed:
+    last, previous = journal[-1]
+    if type(previous) is bytearray and last + len(previous) == address:
+     previous.append(old)
+     return
+   old = bytearray((old,))
+  journal.append((address, old))
+
+ # This starts a snapshot of the current state of the bytes and returns it. The
+ # snapshot itself is just a position in the journal; nothing is copied. Once
+ # you're done with a snapshot, pass it to "release" so the journal can be thrown
+ # away when nothing needs it anymore.
+ def snapshot(self):
+  if self.journal is None:
+   self.journal = []
+  self.snapshots += 1
+  self.sealed = len(self.journal)
+  return self.sealed
+
+ # This puts back the old bytes of every write made since the given snapshot, in
+ # reverse order, so the cost depends on how much was written rather than on the
+ # size of the rom. The snapshot stays open, so it can be restored again later.
+ # The undone writes are kept so that "redo" can put them back.
+ def restore(self, snapshot):
+  if self.journal is None or snapshot > len(self.journal):
+   print("ERROR: That snapshot is no longer available to restore.")
+   return
+  journal = self.journal
+  undone = []
+
+  # The journal is switched off while undoing so that the undoing itself doesn't
+  # get recorded.
+  self.journal = None
+  while len(journal) > snapshot:
+   address, old = journal.pop()
+   if old is None:
+    undone.append((len(self), None))
+    self.resize(address)
+   else:
+    undone.append((address, self.store(address, old)))
+  self.journal = journal
+  self.sealed = len(journal)
+  self.redos.append(undone)
+
+ # This puts back the writes undone by the most recent "restore", as long as
+ # nothing else has been written since then. It returns whether there was anything
+ # to redo.
+ def redo(self):
+  if len(self.redos) == 0:
+   return False
+  undone = self.redos.pop()
+  redos = self.redos
+  for address, value in reversed(undone):
+   if value is None:
+    self.resize(address)
+   else:
+    self[address:address + len(value)] = value
+
+  # Redoing is itself a change, which would normally clear out anything else
+  # waiting to be redone, so we put them back.
+  self.redos = redos
+  return True
+
+ # This closes a snapshot. When no snapshots are open anymore, the journal is
+ # thrown away and writes stop being recorded.
+ def release(self, snapshot):
+  self.snapshots = max(0, self.snapshots - 1)
+  if self.snapshots == 0:
+   self.journal = None
+   self.redos = []
+
+ # This writes the given bytes at the given address without any of the checks
+ # __setitem__ does, and returns the bytes that were there before. The address has
+ # to be outside the pretend header.
+ def store(self, address, value):
+  if not self.writable:
+   self.promote()
+  start = address - self.header
+  old = bytes(self.buffer[start:start + len(value)])
+  self.buffer[start:start + len(value)] = value
+  self.mark(address, address + len(value))
+  return old
+
+ # This returns the real bytes of the rom (without the pretend header) as
+ # something that can be written to a file or compared directly.
+ def raw(self):
+  return self.buffer
+
+ # This makes a copy of the buffer that shares the same bytes rather than copying
+ # them. Both the copy and the original then only copy what they change (see the
+ # OverlayBuffer class below), so making lots of copies of one rom is cheap.
+ def clone(self):
+  self.writable = False
+  self.shared = True
+  return OverlayBuffer(self)
+
+ # This returns a memoryview of the real bytes at the given address. The view
+ # can't reach into the pretend header since there's nothing there to look at, so
+ # in that case the bytes are copied instead.
+ def view(self, address, length):
+  if address < self.header:
+   return memoryview(self[address:address + length])
+  start = address - self.header
+  return memoryview(self.buffer)[start:start + length]
+
+ # This grows or shrinks the rom to the given length (including the pretend header,
+ # if there is one). New bytes are filled with 0s.
+ # Any new bytes count as changed, and any changes past the new end are forgotten.
+ def resize(self, length):
+  if not self.writable:
+   self.promote()
+  old = len(self)
+  length = max(length, self.header)
+
+  # For the journal, the bytes that are about to be cut off are recorded before
+  # the old size, so that undoing it restores the size first and then the bytes.
+  if self.journal is not None and length != old:
+   if length < old:
+    self.record(length, bytes(self.buffer[length - self.header:]))
+   self.record(old, None)
+  if length < old:
+   self.generation = next(generations)
+   del self.buffer[length - self.header:]
+   first = bisect.bisect_left(self.dirty_starts, length)
+   del self.dirty_starts[first:]
+   del self.dirty_ends[first:]
+   if first > 0 and self.dirty_ends[first - 1] > length:
+    self.dirty_ends[first - 1] = length
+  elif length > old:
+   self.buffer.extend(bytes(length - old))
+   self.mark(old, length)
+
+ # This copies the bytes into a bytearray so they can be modified. If they were in
+ # a memory mapped file, the mapping is closed since it's no longer needed.
+ def promote(self):
+  buffer = self.buffer
+  self.buffer = bytearray(buffer)
+  self.writable = True
+
+  # A buffer shared with clones has to stay open since they're still using it.
+  if self.shared:
+   self.shared = False
+  elif isinstance(buffer, mmap.mmap):
+   try:
+    buffer.close()
+   except BufferError:
+    # Someone is still holding a view of the old mapping; it will be closed
+    # when that view is released.
+    pass
+
+# An OverlayBuffer is a RomBuffer that shares its bytes with another one (see
+# "clone" above) without ever changing them. Instead, the rom is split into pages of
+# PAGE_SIZE bytes, and the first time anything is written to a page, just that page
+# is copied and the write goes to the copy. Reading looks for a copied page first and
+# falls back to the shared bytes. Anything that needs all the bytes in one place
+# (resizing or saving, for example) first "promotes" it, which puts the pages and
+# the shared bytes together into an ordinary bytearray, after which it works exactly
+# like any other RomBuffer.
+PAGE_SIZE = 0x1000
+
+class OverlayBuffer(RomBuffer):
+
+ def __init__(self, base):
+  RomBuffer.__init__(self, base.buffer, base.header)
+  self.writable = False
+  self.shared = True
+
+  # The copied pages, by page number. This is None once the buffer is promoted.
+  # A clone of a clone gets its own copies of the pages copied so far.
+  self.pages = {}
+  if isinstance(base, OverlayBuffer) and base.pages is not None:
+   self.pages = {number: bytearray(page) for number, page in base.pages.items()}
+
+  # Whatever was changed in the original counts as changed in the clone too.
+  self.dirty_starts = list(base.dirty_starts)
+  self.dirty_ends = list(base.dirty_ends)
+
+ def __iter__(self):
+  if self.pages is None:
+   yield from RomBuffer.__iter__(self)
+  else:
+   for index in range(len(self)):
+    yield self[index]
+
+ def __getitem__(self, key):
+  if self.pages is None:
+   return RomBuffer.__getitem__(self, key)
+  if type(key) is int:
+   if key < 0:
+    key += len(self)
+   if key >= self.header:
+    index = key - self.header
+    page = self.pages.get(index // PAGE_SIZE)
+    if page is None:
+     return self.buffer[index]
+    return page[index % PAGE_SIZE]
+   if key < 0:
+    raise IndexError("rom address out of range")
+   return 0
+  start, stop = self.bounds(key)
+  if start >= self.header:
+   return self.read(start - self.header, stop - self.header)
+  padding = bytes(min(stop, self.header) - start)
+  return padding + self.read(0, max(0, stop - self.header))
+
+ def __setitem__(self, key, value):
+  if self.pages is None:
+   RomBuffer.__setitem__(self, key, value)
+  elif type(key) is int:
+   if key < 0:
+    key += len(self)
+   if key >= self.header:
+    old = self[key]
+    if old != value:
+     if self.journal is not None:
+      self.record(key, old)
+     index = key - self.header
+     self.page(index // PAGE_SIZE)[index % PAGE_SIZE] = value
+     self.mark(key, key + 1)
+   elif key < 0:
+    raise IndexError("rom address out of range")
+  else:
+   start, stop = self.bounds(key)
+   if len(value) != stop - start:
+    raise IndexError("rom address out of range")
+   if start < self.header:
+    value = value[self.header - start:]
+    start = self.header
+   if start >= stop:
+    return
+   old = self[start:stop]
+   if old == value:
+    return
+   if self.journal is not None:
+    self.record(start, bytes(old))
+   self.write(start - self.header, value)
+   self.mark(start, stop)
+
+ # This returns the bytes from start to stop (not counting the pretend header),
+ # taking each page from its copy if it has one.
+ def read(self, start, stop):
+  pieces = []
+  while start < stop:
+   number = start // PAGE_SIZE
+   end = min(stop, (number + 1) * PAGE_SIZE)
+   page = self.pages.get(number)
+   if page is None:
+    pieces.append(self.buffer[start:end])
+   else:
+    offset = number * PAGE_SIZE
+    pieces.append(page[start - offset:end - offset])
+   start = end
+  if len(pieces) == 1:
+   return pieces[0]
+  return b"".join(pieces)
+
+ # This writes the given bytes starting at the given position (not counting the
+ # pretend header), copying any pages that haven't been copied yet.
+ def write(self, start, value):
+  value = bytes(value)
+  position = 0
+  while position < len(value):
+   number = (start + position) // PAGE_SIZE
+   offset = start + position - number * PAGE_SIZE
+   length = min(len(value) - position, PAGE_SIZE - offset)
+   self.page(number)[offset:offset + length] = value[position:position + length]
+   position += length
+
+ # This returns the copy of the given page, making it first if needed.
+ def page(self, number):
+  page = self.pages.get(number)
+  if page is None:
+   page = bytearray(self.buffer[number * PAGE_SIZE:(number + 1) * PAGE_SIZE])
+   self.pages[number] = page
+  return page
+
+ def store(self, address, value):
+  if self.pages is None:
+   return RomBuffer.store(self, address, value)
+  old = bytes(self[address:address + len(value)])
+  self.write(address - self.header, value)
+  self.mark(address, address + len(value))
+  return old
+
+ def raw(self):
+  if self.pages is not None:
+   self.promote()
+  return self.buffer
+
+ # A view of bytes that haven't been copied can look straight at the shared bytes,
+ # since they never change. Otherwise, the bytes are copied.
+ def view(self, address, length):
+  if self.pages is None:
+   return RomBuffer.view(self, address, length)
+  start = max(address, self.header) - self.header
+  first = start // PAGE_SIZE
+  last = (start + length - 1) // PAGE_SIZE
+  if address < self.header or any(number in self.pages for number in range(first, last + 1)):
+   return memoryview(self[address:address + length])
+  return memoryview(self.buffer)[start:start + length]
+
+ def resize(self, length):
+  if self.pages is not None:
+   self.promote()
+  RomBuffer.resize(self, length)
+
+ def promote(self):
+  if self.pages is None:
+   RomBuffer.promote(self)
+   return
+  buffer = bytearray(self.buffer)
+  for number, page in self.pages.items():
+   buffer[number * PAGE_SIZE:number * PAGE_SIZE + len(page)] = page
+  self.buffer = buffer
+  self.pages = None
+  self.writable = True
+  self.shared = False
+
+# A DirectBuffer is the RomBuffer used for the usual case: a headered rom that's
+# been loaded into memory. There's no pretend header to shift the addresses by and
+# nothing to copy before writing, so it simply is the bytearray holding the rom, and
+# reading a byte or a slice of it is exactly as fast as reading a bytearray. Only
+# writing goes through the checks above, so that changes are still tracked and
+# journaled. Everything else works the same as for any other RomBuffer.
+class DirectBuffer(bytearray, RomBuffer):
+
+ def __init__(self, buffer):
+  bytearray.__init__(self, buffer)
+  RomBuffer.__init__(self, self)
+
+  # Clones can't share the bytes themselves, since they're changed in place (see
+  # "clone" below). This is the copy they share instead, until the next write.
+  self.frozen = None
+
+ def __setitem__(self, key, value):
+  if type(key) is int:
+   old = self[key]
+   if old != value:
+    self.frozen = None
+    if self.journal is not None:
+     self.record(key % len(self), old)
+    bytearray.__setitem__(self, key, value)
+    self.mark(key % len(self), key % len(self) + 1)
+  else:
+   start, stop = self.bounds(key)
+   if len(value) != stop - start:
+    raise IndexError("rom address out of range")
+   if start >= stop or memoryview(self)[start:stop] == value:
+    return
+   self.frozen = None
+   if self.journal is not None:
+    self.record(start, bytes(self[start:stop]))
+   bytearray.__setitem__(self, slice(start, stop), value)
+   self.mark(start, stop)
+
+ def store(self, address, value):
+  self.frozen = None
+  old = bytes(self[address:address + len(value)])
+  bytearray.__setitem__(self, slice(address, address + len(value)), value)
+  self.mark(address, address + len(value))
+  return old
+
+ # The clones share a read-only copy of the bytes as they are now, which is made
+ # the first time the rom is cloned after it last changed. Making lots of clones in
+ # a row (such as one for each seed of a randomizer) still only copies it once.
+ def clone(self):
+  if self.frozen is None:
+   self.frozen = RomBuffer(bytes(self))
+  result = OverlayBuffer(self.frozen)
+  result.dirty_starts = list(self.dirty_starts)
+  result.dirty_ends = list(self.dirty_ends)
+  return result
+
+ def resize(self, length):
+  self.frozen = None
+  RomBuffer.resize(self, length)
+
+# This takes a list of (start, end) ranges and returns a sorted list of the same
+# ranges where any that overlap or touch have been merged into one.
+def merge_ranges(ranges):
+ merged = []
+ for start, end in sorted(ranges):
+  if len(merged) > 0 and start <= merged[-1][1]:
+   if end > merged[-1][1]:
+    merged[-1] = (merged[-1][0], end)
+  else:
+   merged.append((start, end))
+ return merged
+
 class RomData:
 
- # Testing; remove this comment
- 
  def __init__(self, data):
+
+  # The raw bytes of the rom are kept in a RomBuffer (see above), which stores
+  # them in a bytearray or a memory mapped file rather than a list of ints. A list
+  # stores every byte as a separate python object, which costs several times the
+  # size of the rom itself in memory and makes every slice allocate a new list.
+  # Bytes that are already in memory go in a DirectBuffer, which is the quickest.
+  if not isinstance(data, RomBuffer):
+   if isinstance(data, mmap.mmap):
+    data = RomBuffer(data)
+   else:
+    data = DirectBuffer(data)
   self.data = data
 
   # Constants representing locations of various data in the rom.
@@ -39,6 +629,9 @@ class RomData:
   self.SPELL_PROGRESSIONS_START = 0x7C900
   self.STARTING_SPELLS_START =    0x7CAC0
   self.MONSTER_VISUALS_START =    0x7CC00
+  self.DTE_TABLE_START =          0x7F2A0 # Unverified
+  self.BANK1_POINTERS_START =     0x80200 # Unverified
+  self.BANK1_DATA_END =           0x90200 # Unverified
   self.EVENT_POINTERS_START =     0x90200
   self.LAUNCHER_POINTERS_START =  0x97460
   self.LAUNCHER_DATA_START =      0x97660
@@ -48,6 +641,8 @@ class RomData:
   self.COMMAND_TARGETS_START =    0x9FFC3
   self.COMMAND_DELAYS_START =     0xA0089
   self.JOB_DATA_START =           0x9FFDD
+  self.BANK2_POINTERS_START =     0xA0200 # Unverified
+  self.BANK2_DATA_END =           0xA81A2 # Unverified
   self.JOB_MENU_DATA_START =      0xA81A2
   self.TRIGGER_POINTERS_START =   0xA8200
   self.TRIGGER_DATA_START =       0xA8500
@@ -59,6 +654,8 @@ class RomData:
   self.COMMAND_CHARGINGS_START =  0xB7E60
   self.TILEMAP_POINTERS_START =   0xB8200
   self.TILEMAP_DATA_START =       0xB8500
+  self.BANK3_POINTERS_START =     0xF0200 # Unverified
+  self.BANK3_DATA_END =           0x100200 # Unverified
   
   # Constants representing other values or quantities related to reading and writing
   # data to and from the rom.
@@ -102,14 +699,215 @@ class RomData:
   self.LAUNCHER_ROOM = room
   self.TOTAL_EVENTS = 0x100
   self.EVENT_POINTER_BONUS = 0x90400
+  self.TOTAL_BANK1_MESSAGES = 0x200
+  self.BANK1_POINTER_BONUS = 0x80200
+  self.TOTAL_BANK2_MESSAGES = 0x400
+  self.BANK2_POINTER_BONUS = 0xA0200
+  self.TOTAL_BANK3_MESSAGES = 0x100
+  self.BANK3_POINTER_BONUS = 0xF0200
+  self.DTE_FIRST_CODE = 0xCA # Unverified
+  self.TOTAL_DTE_CODES = 0x35 # Unverified
+  self.MESSAGE_PARAMETER_CODES = [0x02, 0x03, 0x04] # Unverified
+  # Set this once all of the message constants marked as unverified have been
+  # checked against a real rom. Until then, the messages can't be written.
+  self.MESSAGE_LOCATIONS_VERIFIED = False
+
+ # This returns where in the rom each type of game data is read from, as a
+ # dictionary of lists of (start, end) address ranges, named after the attributes
+ # of FF4Rom they're read into. This is what tells the parsed data cache (see
+ # cache.py) which bytes each type of data depends on. Data found through a pointer
+ # table includes the pointer table and the space the data normally takes up. A hack
+ # could move the data somewhere else entirely though, so the pointers are checked
+ # too (see pointer_tables and region_hashes below).
+ def data_regions(self):
+  spells = self.TOTAL_SPELLS
+  monsters = self.TOTAL_MONSTERS
+  dte = (self.DTE_TABLE_START, self.DTE_TABLE_START + self.TOTAL_DTE_CODES * 2)
+  return {
+   "attributes": [(self.ATTRIBUTE_TABLES_START, self.ATTRIBUTE_TABLES_START + self.TOTAL_ATTRIBUTE_TABLES * 3)],
+   "spells": [
+    (self.SPELL_NAMES_START, self.SPELL_NAMES_START + spells * self.SPELL_NAME_WIDTH),
+    (self.SPELL_DATA_START, self.SPELL_DATA_START + spells * 6),
+    (self.SPELL_VISUALS_START, self.SPELL_VISUALS_START + spells * 4),
+    (self.SPELL_SOUNDS_START, self.SPELL_SOUNDS_START + spells)
+   ],
+   "spellbooks": [
+    (self.SPELL_PROGRESSIONS_START, self.STARTING_SPELLS_START),
+    (self.STARTING_SPELLS_START, self.STARTING_SPELLS_START + self.TOTAL_SPELLBOOKS * 25)
+   ],
+   "equips": [(self.EQUIP_TABLES_START, self.EQUIP_TABLES_START + self.TOTAL_EQUIP_TABLES * 2)],
+   "items": [
+    (self.ITEM_NAMES_START, self.ITEM_NAMES_START + self.TOTAL_ITEMS * self.ITEM_NAME_WIDTH),
+    (self.WEAPON_DATA_START, self.WEAPON_DATA_START + self.TOTAL_WEAPONS * 8),
+    (self.ARMOR_DATA_START, self.ARMOR_DATA_START + self.TOTAL_ARMORS * 8),
+    (self.SUPPLY_DATA_START, self.SUPPLY_DATA_START + self.TOTAL_SUPPLIES * 6),
+    (self.WEAPON_VISUALS_START, self.WEAPON_VISUALS_START + self.TOTAL_WEAPONS * 4)
+   ],
+   "jobs": [
+    (self.JOB_NAMES_START, self.JOB_NAMES_START + self.TOTAL_JOBS * self.JOB_NAME_WIDTH),
+    (self.JOB_DATA_START, self.JOB_DATA_START + self.TOTAL_JOBS * 3),
+    (self.JOB_MENU_DATA_START, self.JOB_MENU_DATA_START + self.TOTAL_JOBS * 3)
+   ],
+   "characters": [
+    (self.CHARACTER_DATA_START, self.CHARACTER_DATA_START + self.TOTAL_CHARACTERS * 32),
+    (self.LEVELUP_POINTERS_START, self.LEVELUP_TABLE_END)
+   ],
+   "actors": [
+    (self.ACTOR_LOADS_START, self.ACTOR_LOADS_START + self.TOTAL_ACTORS),
+    (self.ACTOR_STORES_START, self.ACTOR_STORES_START + self.TOTAL_ACTORS),
+    (self.ACTOR_NAME_INDEXES_START, self.ACTOR_NAME_INDEXES_START + self.TOTAL_ACTORS),
+    (self.ACTOR_EQUIPPED_START, self.ACTOR_EQUIPPED_START + self.TOTAL_ACTORS * 7),
+    (self.ACTOR_COMMANDS_START, self.ACTOR_COMMANDS_START + (self.TOTAL_ACTORS + 1) * 5)
+   ],
+   "commands": [
+    (self.COMMAND_NAMES_START, self.COMMAND_NAMES_START + self.TOTAL_COMMANDS * self.COMMAND_NAME_WIDTH),
+    (self.COMMAND_STATUSES_START, self.COMMAND_STATUSES_START + self.TOTAL_COMMANDS * 2),
+    (self.COMMAND_TARGETS_START, self.COMMAND_TARGETS_START + self.TOTAL_COMMANDS),
+    (self.COMMAND_CHARGINGS_START, self.COMMAND_CHARGINGS_START + self.TOTAL_COMMANDS)
+   ],
+   "monsters": [
+    (self.MONSTER_NAMES_START, self.MONSTER_NAMES_START + monsters * self.MONSTER_NAME_WIDTH),
+    (self.MONSTER_GP_START, self.MONSTER_GP_START + monsters * 2),
+    (self.MONSTER_XP_START, self.MONSTER_XP_START + monsters * 2),
+    (self.MONSTER_POINTERS_START, self.MONSTER_POINTERS_START + monsters * 2),
+    (self.MONSTER_DATA_START, self.MONSTER_DATA_END)
+   ],
+   "map_names": [(self.MAP_NAMES_START, self.MAP_NAMES_START + self.MAP_NAMES_ROOM)],
+   "maps": [
+    (self.ENCOUNTER_RATES_START, self.ENCOUNTER_RATES_START + self.TOTAL_MAPS),
+    (self.TRIGGER_POINTERS_START, self.TRIGGER_DATA_END),
+    (self.MAP_DATA_START, self.MAP_DATA_START + self.TOTAL_MAPS * 13)
+   ],
+   "tilemaps": [(self.TILEMAP_POINTERS_START, self.TILEMAP_UNDERMOON_BONUS)],
+   "overworld": [(self.OVERWORLD_POINTERS_START, self.TILEMAP_POINTERS_START)],
+   "launchers": [(self.LAUNCHER_POINTERS_START, self.LAUNCHER_DATA_END)],
+   "events": [(self.EVENT_POINTERS_START, self.LAUNCHER_POINTERS_START)],
+   "bank1_messages": [dte, (self.BANK1_POINTERS_START, self.BANK1_DATA_END)],
+   "bank2_messages": [dte, (self.BANK2_POINTERS_START, self.BANK2_DATA_END)],
+   "bank3_messages": [dte, (self.BANK3_POINTERS_START, self.BANK3_DATA_END)]
+  }
+
+ # This returns the pointer tables that the types of data in data_regions above are
+ # found through, as a dictionary of lists of (address, number of pointers, what the
+ # pointers are relative to, how far before where they point the data can start).
+ # That last one is only needed for the levelups, whose pointers are moved along by
+ # each character's starting level (see read_levelups in character.py).
+ def pointer_tables(self):
+  levelups = (self.LEVELUP_TABLE_START - self.LEVELUP_POINTERS_START) // 2
+  return {
+   "characters": [(self.LEVELUP_POINTERS_START, levelups, self.LEVELUP_TABLE_BONUS, 98 * 5)],
+   "monsters": [(self.MONSTER_POINTERS_START, self.TOTAL_MONSTERS, self.MONSTER_DATA_BONUS, 0)],
+   "maps": [(self.TRIGGER_POINTERS_START, self.TOTAL_MAPS + 1, self.TRIGGER_POINTER_BONUS, 0)],
+   "tilemaps": [(self.TILEMAP_POINTERS_START, self.TOTAL_OVERWORLD_TILEMAPS, self.TILEMAP_OVERWORLD_BONUS, 0)],
+   "launchers": [(self.LAUNCHER_POINTERS_START, self.TOTAL_LAUNCHERS + 1, self.LAUNCHER_DATA_START, 0)],
+   "events": [(self.EVENT_POINTERS_START, self.TOTAL_EVENTS, self.EVENT_POINTER_BONUS, 0)],
+   "bank1_messages": [(self.BANK1_POINTERS_START, self.TOTAL_BANK1_MESSAGES, self.BANK1_POINTER_BONUS, 0)],
+   "bank2_messages": [(self.BANK2_POINTERS_START, self.TOTAL_BANK2_MESSAGES, self.BANK2_POINTER_BONUS, 0)],
+   "bank3_messages": [(self.BANK3_POINTERS_START, self.TOTAL_BANK3_MESSAGES, self.BANK3_POINTER_BONUS, 0)]
+  }
+
+ # Returns a hash of the bytes each of the given types of data is read from (see
+ # data_regions above), or of every type if no names are given. Comparing these from
+ # before and after a change to the raw bytes shows which types of data it affected.
+ # If any of the pointers a type of data is found through point outside of its
+ # regions, there's no telling which bytes it's read from, so the whole rom is hashed
+ # for it instead.
+ def region_hashes(self, names = None):
+  regions = self.data_regions()
+  tables = self.pointer_tables()
+  if names is None:
+   names = list(regions)
+  length = len(self.data)
+  result = {}
+  for name in names:
+   digest = hashlib.blake2b(digest_size = 16)
+   covered = regions[name]
+   for address, count, bonus, slack in tables.get(name, []):
+    for pointer in self.read_u16_array(address, count):
+     if not any(start - slack <= pointer + bonus <= end for start, end in regions[name]):
+      covered = [(0, length)]
+      break
+   for start, end in covered:
+    start = min(start, length)
+    end = min(end, length)
+    digest.update(start.to_bytes(4, "little") + end.to_bytes(4, "little"))
+    view = self.view(start, end - start)
+    digest.update(view)
+    view.release()
+   result[name] = digest.digest()
+  return result
+
+ # This returns a memoryview of the given number of bytes starting at the given
+ # address. Unlike slicing the data directly, this does not copy anything, so it's
+ # the preferred way to look at large chunks of the rom at once. Note that the rom
+ # data can't change size while a view of it exists, so don't hold on to these
+ # longer than needed.
+ def view(self, address, length):
+  return self.data.view(address, length)
+
+ # This returns a list of (start, end) address ranges covering every byte that has
+ # been changed since the rom was loaded, sorted and with no overlaps. Only bytes
+ # whose values actually changed are included, so writing back data that wasn't
+ # modified leaves this empty. This is what incremental saving uses, but it's also
+ # handy for checking exactly what a change to the game data did to the rom.
+ def dirty_ranges(self):
+  return self.data.dirty_ranges()
+
+ # This forgets about all the changes made so far, so that dirty_ranges only
+ # reports changes made from this point on.
+ def clear_dirty(self):
+  self.data.clear_dirty()
+
+ # This makes a copy of the rom data that shares the raw bytes with this one rather
+ # than copying them. Each copy only copies the parts of the rom that it changes.
+ def clone(self):
+  result = copy.copy(self)
+  result.data = self.data.clone()
+  return result
+
+ # These take, restore, and release snapshots of the raw bytes, and redo whatever
+ # the last restore undid. See the RomBuffer class above for the details; the
+ # short version is that a snapshot only remembers what gets written after it was
+ # taken, so taking and restoring one is cheap no matter how big the rom is.
+ def snapshot(self):
+  return self.data.snapshot()
+
+ def restore(self, snapshot):
+  self.data.restore(snapshot)
+
+ def release(self, snapshot):
+  self.data.release(snapshot)
+
+ def redo(self):
+  return self.data.redo()
+
+ # This is meant to be used in a "with" statement. Everything written to the rom
+ # inside the "with" block is undone if the block raises an exception, and kept
+ # otherwise. Transactions can be nested, in which case an exception only undoes
+ # the innermost one (unless it isn't caught there). The snapshot is given to the
+ # block too, so it can also be restored by hand, for example:
+ #  with rom.transaction() as snapshot:
+ #   ...
+ #   if something_went_wrong:
+ #    rom.restore(snapshot)
+ @contextlib.contextmanager
+ def transaction(self):
+  snapshot = self.snapshot()
+  try:
+   yield snapshot
+  except BaseException:
+   self.restore(snapshot)
+   raise
+  finally:
+   self.release(snapshot)
 
  # This directly injects a sequence of bytes into the romdata, starting
  # at the given address. No safety checks or any other kind of checks
  # are made; whatever data used to be at that location is blindly
  # clobbered and replaced by the new bytes.
  def inject(self, address, bytelist):
-  for index, byte in enumerate(bytelist):
-   self.data[address + index] = byte
+  bytelist = bytes(bytelist)
+  self.data[address:address + len(bytelist)] = bytelist
 
  # This returns a boolean value based on whether the given bit of the
  # byte at the given address is set or not.
@@ -128,25 +926,41 @@ class RomData:
  # This reads a 16-bit (or 24-bit etc) value starting at the given
  # address and returns it as an integer.
  def read_wide(self, address, width = 2):
-  result = 0
-  for index in range(width):
-   result += self.data[address + index] * (0x100 ** index)
-  return result
+  return int.from_bytes(self.data[address:address + width], "little")
  
  # This writes the given value at the given address and the following
  # addresses as needed. It will not exceed the given width in bytes.
  # Whatever data is at those following addresses will be completely
  # overwritten and forgotten.
  def write_wide(self, address, number, width = 2):
-  for index in range(width):
-   self.data[address + index] = (number >> (8 * index)) % 0x100
+  number %= 1 << (8 * width)
+  self.data[address:address + width] = number.to_bytes(width, "little")
+
+ # This reads a table of "count" consecutive 16-bit values starting at the given
+ # address and returns them as a list of integers. This is mostly meant for
+ # pointer tables, which can then be read all at once rather than one pointer at a
+ # time.
+ def read_u16_array(self, address, count):
+  table = bytes(self.data[address:address + count * 2])
+  return list(struct.unpack("<{}H".format(count), table))
 
- # This applies an IPS patch to the rom.
+ # This writes a list of 16-bit values to consecutive addresses starting at the
+ # given address. As with write_wide, each value is cut down to 16 bits if needed.
+ def write_u16_array(self, address, values):
+  values = [value % 0x10000 for value in values]
+  self.data[address:address + len(values) * 2] = struct.pack("<{}H".format(len(values)), *values)
+
+ # This applies an IPS, BPS, or UPS patch to the rom. The type of patch is worked
+ # out from the file itself.
  # You have to indicate as a parameter whether or not the patch in question expects
  # a headered rom. Unfortunately, there's no real way to determine for an arbitrary
  # IPS patch whether it needs a headered rom or an unheadered one; you would have
  # to just already know, or see if its creator documented that information, or
- # figure it out by trial and error.
+ # figure it out by trial and error. (BPS and UPS patches are almost always made
+ # for unheadered roms, and since they check the rom's checksum before doing
+ # anything, guessing wrong just gives an error rather than a broken rom.)
+ # The return value is a list of (start, end) address ranges that the patch wrote
+ # to, sorted and with overlapping or adjacent ranges merged together.
  def apply_patch(self, filename, headered_rom_expected = True):
   
   # You can either pass the header parameter a True/False value, in which case True
@@ -161,81 +975,105 @@ class RomData:
    else:
     print("ERROR: Unrecognized value for 'headered_rom_expected' in 'apply_patch' function.")
 
-  # First we read the bytes in the patch file.
+  # The addresses in the rom data always include a header, whether the rom really
+  # has one or not (an unheadered rom just pretends to have one). So if the patch
+  # was made for an unheadered rom, its addresses need to be shifted by the size of
+  # the header to line up. This is the only place the header needs to be thought
+  # about at all.
+  bonus = 0 if headered_rom_expected else HEADER_SIZE
+  touched = []
+
+  # Rather than loading the whole patch at once, we read it one record at a time.
+  # Each record's bytes are read into this reusable chunk (a record can't be longer
+  # than 0xFFFF bytes) and copied into the rom in one go, so no matter how big the
+  # patch is, nothing gets allocated per byte.
+  chunk = memoryview(bytearray(0x10000))
   with open(filename, "rb") as patchfile:
-   patch = patchfile.read()
-  
-  # All IPS files start with "PATCH" in ASCII and end with "EOF". Thus, any patch
-  # file whose length is less than 8 is automatically invalid.
-  if len(patch) >= 8:
-   header = ""
-   for index in range(5):
-    header += chr(patch[index])
-   done = False
-   
-   # We use this "head" variable to track what position in the file we're looking
-   # at. (It acts much like a "read head" of a disk.)
-   head = 5
-   
-   # Loop through the file looking for "chunks" of three bytes which usually
-   # indicate the next address at which to inject data. If those three bytes are
-   # the ASCII encoding of "EOF" though, then that indicates we're done and can
-   # exit the loop.
-   while not done:
-   
-    # Look at the next three bytes and move the head accordingly.
-    offset = patch[head:head + 3]
-    head += 3
-    
-    # Check for the "EOF" signal. If it matches, we exit the loop.
-    if offset[0] == 0x45 and offset[1] == 0x4F and offset[2] == 0x46:
-     done = True
-     
-    # Otherwise, we treat it as the next address at which to change bytes.
+
+   # All IPS files start with "PATCH" in ASCII. BPS and UPS files start with
+   # "BPS1" and "UPS1" instead, and are handled separately (see below).
+   magic = patchfile.read(5)
+   if magic[0:4] in [b"BPS1", b"UPS1"]:
+    patchfile.seek(0)
+    return self.apply_checked_patch(patchfile.read(), bonus)
+   if magic != b"PATCH":
+    print("Invalid ips file: {}".format(filename))
+    return touched
+
+   # Loop through the file looking for records. Each one starts with three bytes
+   # which usually indicate the address at which to inject data. If those three
+   # bytes are the ASCII encoding of "EOF" though, then that indicates we're done.
+   while True:
+    offset = patchfile.read(3)
+    if len(offset) < 3:
+     print("ERROR: Patch file {} ended without an EOF marker.".format(filename))
+     break
+
+    # Some patches have three more bytes after the EOF marker giving the size the
+    # patched rom should be cut down to. This is known as the truncate extension.
+    if offset == b"EOF":
+     size = patchfile.read(3)
+     if len(size) == 3:
+      self.data.resize(int.from_bytes(size, "big") + bonus)
+     break
+    address = int.from_bytes(offset, "big") + bonus
+
+    # The next two bytes indicate the number of bytes in the target rom to change.
+    length = int.from_bytes(patchfile.read(2), "big")
+
+    # There are two ways a record can be defined. It can either be a specified
+    # number of bytes, or it can be RLE encoded. If a particular record is RLE
+    # encoded, the two length bytes will both be 0, followed by two bytes for the
+    # length of the run and one byte for the value to repeat.
+    if length > 0:
+     if patchfile.readinto(chunk[0:length]) < length:
+      print("ERROR: Patch file {} ended in the middle of a record.".format(filename))
+      break
+     values = chunk[0:length]
     else:
-     address = offset[0] * 0x10000 + offset[1] * 0x100 + offset[2]
-     if not headered_rom_expected:
-      # In this situation, the patch expects an UNHEADERED rom but the
-      # roms in this library are *all* HEADERED. Even if an unheadered
-      # rom was loaded, a blank header is added in order to make sure
-      # the addresses line up for other things. So if the patch was
-      # made for an unheadered rom, we need to add the size of the
-      # header to the address in question in order to line it up with
-      # the "headered" rom in memory.
-      address += 0x200
-     
-     # The next two bytes of each chunk indicate the number of bytes in the target
-     # rom to change.
-     length = patch[head:head + 2]
-     head += 2
-     total = length[0] * 0x100 + length[1]
-     
-     # Finally, the rest of the chunk should consist of the aforementioned number of
-     # bytes which define the changed data.
-     patchstring = ""
-     patchbytes = []
-     if total > 0:
-      for byte in patch[head:head + total]:
-       patchstring += "{:02x}, ".format(byte)
-       patchbytes.append(byte)
-      head += total
-      
-     # There are two ways a chunk can be defined. It can either be a specified
-     # number of bytes, or it can be RLE encoded. If a particular chunk is RLE
-     # encoded, the two length bytes will both be 0.
-     else:
-      runlength = patch[head] * 0x100 + patch[head + 1]
-      runbyte = patch[head + 2]
-      head += 3
-      patchstring = "{:02x}, ".format(runbyte) * runlength
-      patchbytes = [runbyte] * runlength
-     
-     # Finally we have pieced together the data that should be injected and where
-     # to inject it, so now we can simply write them accordingly.
-     for index, byte in enumerate(patchbytes):
-      self.data[address + index] = byte
-
-  # The IPS file was less than 8 bytes long so evidently it is invalid.
+     run = patchfile.read(3)
+     if len(run) < 3:
+      print("ERROR: Patch file {} ended in the middle of a record.".format(filename))
+      break
+     length = int.from_bytes(run[0:2], "big")
+     values = run[2:3] * length
+
+    # Patches are allowed to write past the end of the rom (this is how roms get
+    # expanded), in which case the rom is grown to fit.
+    if address + length > len(self.data):
+     self.data.resize(address + length)
+    self.data[address:address + length] = values
+    touched.append((address, address + length))
+
+  return merge_ranges(touched)
+
+ # This applies the contents of a BPS or UPS patch file to the rom. These formats
+ # describe the entire patched rom rather than just the bytes to change, and they
+ # include checksums of the rom before and after patching, so the patched bytes are
+ # built separately (see patch.py) and only copied into the rom if every checksum
+ # matches. Otherwise the rom is left alone. The "bonus" is the same as in
+ # apply_patch above.
+ def apply_checked_patch(self, data, bonus):
+  source = self.data.view(bonus, len(self.data) - bonus)
+  if data[0:4] == b"BPS1":
+   result = patch.apply_bps(source, data)
   else:
-   print("Invalid ips file: {}".format(filename))
+   result = patch.apply_ups(source, data)
+
+  # The view has to be let go of before the rom can change size.
+  source.release()
+  if result is None:
+   return []
+  target, touched = result
 
+  # Everything outside the touched ranges is the same as it was before (the patch
+  # only copied it over from the original), so only the touched ranges are copied
+  # into the rom. That way only the bytes the patch actually changed are marked as
+  # changed (and journaled, if there are open snapshots).
+  self.data.resize(len(target) + bonus)
+  touched = merge_ranges(touched)
+  target = memoryview(target)
+  for start, end in touched:
+   self.data[start + bonus:end + bonus] = target[start:end]
+  target.release()
+  return [(start + bonus, end + bonus) for start, end in touched]
@@ -0,0 +1,138 @@
+import re
+import json
+import hashlib
+import categories.world as world
+import categories.story as story
+
+# The format of the saved index files. This goes up whenever the format (or the
+# way the text is split into words) changes, so that old files get rebuilt instead
+# of giving wrong results.
+INDEX_VERSION = 1
+
+# A full text index of the game text, for quickly finding which items, monsters,
+# maps, messages etc. mention a certain word. Building the index means reading and
+# converting all the text in the rom, which takes a while, so the index can be
+# saved to a file and loaded again next time. The file records which rom it was
+# built from (by its hash), so a saved index is only used for the exact same rom.
+class TextIndex:
+
+ # The types of data (see data_regions in rom.py) that the text comes from.
+ sources = ["items", "spells", "monsters", "jobs", "commands", "map_names", "bank1_messages", "bank2_messages", "bank3_messages"]
+
+ def __init__(self):
+
+  # The hash of the rom this index was built from, once it's been saved or loaded.
+  self.hash = None
+
+  # Hashes of the parts of the rom the text comes from, and the generation of the
+  # rom's bytes (see RomBuffer in rom.py) when they were last checked. These are
+  # what "current" below uses to tell whether the index is still up to date.
+  self.regions = None
+  self.generation = None
+
+  # This maps each word to the places it appears, as a list of [table, index]
+  # pairs. The tables are named after the matching lists in FF4Rom, so a result
+  # can be looked up with something like getattr(ff4, table)[index].
+  self.words = {}
+
+ # Text is split into lowercase words of letters and numbers. Codes in square
+ # brackets (symbols with no ASCII equivalent, control codes in messages, etc.)
+ # separate words but aren't words themselves.
+ codes = re.compile(r"\[[^\]]*\]")
+ letters = re.compile(r"[a-z0-9]+")
+
+ def split(self, text):
+  return self.letters.findall(self.codes.sub(" ", text).lower())
+
+ # Returns the hash that identifies the given rom. This has to go through the whole
+ # rom, so it's only done when the index is saved or loaded.
+ def rom_hash(self, rom):
+  header = rom.data.header
+  view = rom.view(header, len(rom.data) - header)
+  result = hashlib.sha1(view).hexdigest()
+  view.release()
+  return result
+
+ # Returns whether the index still matches the text in the given rom. If the rom
+ # hasn't been written to since the last time this was checked, that's all there is
+ # to it; otherwise only the parts of the rom the text comes from are hashed.
+ def current(self, rom):
+  if self.generation == rom.data.generation:
+   return True
+  if rom.region_hashes(self.sources) != self.regions:
+   return False
+  self.generation = rom.data.generation
+  return True
+
+ # Remembers the text of the given rom as what the index matches (see "current"
+ # above).
+ def remember(self, rom):
+  self.regions = rom.region_hashes(self.sources)
+  self.generation = rom.data.generation
+
+ # Builds the index from scratch from the text in the rom.
+ def build(self, rom, text):
+  self.remember(rom)
+  self.words = {}
+
+  # All the text is read straight from the rom, so that the index matches the rom
+  # it's stored with and not whatever changes have been made to the game objects
+  # without writing them yet.
+  tables = {}
+  tables["items"] = text.read_name_table(rom, rom.ITEM_NAMES_START, rom.ITEM_NAME_WIDTH, rom.TOTAL_ITEMS)
+  tables["spells"] = text.read_name_table(rom, rom.SPELL_NAMES_START, rom.SPELL_NAME_WIDTH, rom.TOTAL_SPELLS)
+  tables["monsters"] = text.read_name_table(rom, rom.MONSTER_NAMES_START, rom.MONSTER_NAME_WIDTH, rom.TOTAL_MONSTERS)
+  tables["jobs"] = text.read_name_table(rom, rom.JOB_NAMES_START, rom.JOB_NAME_WIDTH, rom.TOTAL_JOBS)
+  tables["commands"] = text.read_name_table(rom, rom.COMMAND_NAMES_START, rom.COMMAND_NAME_WIDTH, rom.TOTAL_COMMANDS)
+  tables["map_names"] = world.read_map_names(rom, text)
+  for bank in [1, 2, 3]:
+   tables["bank{}_messages".format(bank)] = story.read_messages(rom, text, bank)
+
+  for table, entries in tables.items():
+   for index, entry in enumerate(entries):
+    for word in set(self.split(entry)):
+     self.words.setdefault(word, []).append([table, index])
+
+ # Saves the index of the given rom to a file.
+ def save(self, filename, rom):
+  self.hash = self.rom_hash(rom)
+  with open(filename, "w") as indexfile:
+   json.dump({"version": INDEX_VERSION, "hash": self.hash, "words": self.words}, indexfile)
+
+ # Loads an index saved with "save". Returns whether it worked, which it won't if
+ # the file doesn't exist, is from an older version, or was built from a different
+ # rom (if a rom is given).
+ def load(self, filename, rom = None):
+  try:
+   with open(filename, "r") as indexfile:
+    saved = json.load(indexfile)
+  except (OSError, ValueError):
+   return False
+  if saved.get("version") != INDEX_VERSION:
+   return False
+  if rom is not None:
+   if saved.get("hash") != self.rom_hash(rom):
+    return False
+   self.remember(rom)
+  self.hash = saved["hash"]
+  self.words = saved["words"]
+  return True
+
+ # Returns the places where all the words in the query appear, as a list of
+ # (table, index) pairs in the order they appear in the rom. Only whole words are
+ # matched, and upper and lower case are treated the same.
+ def search(self, query):
+  words = self.split(query)
+  if len(words) == 0:
+   return []
+
+  # We start with the word that appears in the fewest places, and only keep the
+  # places that the other words appear in as well.
+  places = sorted((self.words.get(word, []) for word in words), key = len)
+  result = [tuple(place) for place in places[0]]
+  for other in places[1:]:
+   if len(result) == 0:
+    break
+   other = set(tuple(place) for place in other)
+   result = [place for place in result if place in other]
+  return result
@@ -1,8 +1,14 @@
+from record import Field, Schema
+
 # This represents a spell that can be cast in battle.
 # The same object will likely be used for "monster abilities" like ColdMist and
 # Reaction and such but for now, only the 6-letter-name player spells are being
 # read.
 class Spell:
+
+ __slots__ = ("name", "delay", "target", "power", "hit", "hitsboss", "effect",
+  "damaging", "attributes", "impact", "mp", "reflectable", "palette", "sprites",
+  "visual1", "visual2", "sound", "saved")
  
  def __init__(self):
   
@@ -86,33 +92,33 @@ class Spell:
   self.visual1 = 0
   self.visual2 = 0
   self.sound = 0
+
+  # The spell's main data as it was last read or written (see record.py), so that
+  # writing the spells can leave it alone if it hasn't changed.
+  self.saved = None
  
+ # The layout of the main spell data in the rom (see record.py).
+ schema = Schema([
+  Field("delay", 0, bits = (0, 5)),
+  Field("target", 0, bits = (5, 8)),
+  Field("power", 1),
+  Field("hit", 2, bits = (0, 7)),
+  Field("hitsboss", 2, bits = (7, 8), kind = "inverted"),
+  Field("effect", 3, bits = (0, 7)),
+  Field("damaging", 3, bits = (7, 8), kind = "inverted"),
+  Field("attributes", 4, bits = (0, 7)),
+  Field("impact", 4, bits = (7, 8), kind = "flag"),
+  Field("mp", 5, bits = (0, 7)),
+  Field("reflectable", 5, bits = (7, 8), kind = "inverted")
+ ])
+
  # Read the main spell data from the rom at the given address.
  def read(self, rom, address):
-  self.delay = rom.data[address] % 0x20
-  self.target = rom.data[address] >> 5
-  self.power = rom.data[address + 1]
-  self.hit = rom.data[address + 2] % 0x80
-  self.hitsboss = not rom.flag(address + 2, 7)
-  self.effect = rom.data[address + 3] % 0x80
-  self.damaging = not rom.flag(address + 3, 7)
-  self.attributes = rom.data[address + 4] % 0x80
-  self.impact = rom.flag(address + 4, 7)
-  self.mp = rom.data[address + 5] % 0x80
-  self.reflectable = not rom.flag(address + 5, 7)
+  self.schema.read(self, rom, address)
  
  # Write the main spell data back to the rom at the given address.
  def write(self, rom, address):
-  rom.data[address] = self.delay + (self.target << 5)
-  rom.data[address + 1] = self.power
-  rom.data[address + 2] = self.hit % 0x80
-  rom.setbit(address + 2, 7, not self.hitsboss)
-  rom.data[address + 3] = self.effect % 0x80
-  rom.setbit(address + 3, 7, not self.damaging)
-  rom.data[address + 4] = self.attributes % 0x80
-  rom.setbit(address + 4, 7, self.impact)
-  rom.data[address + 5] = self.mp % 0x80
-  rom.setbit(address + 5, 7, not self.reflectable)
+  self.schema.write(self, rom, address)
  
  # Read the spell name from the given address.
  # The spell names are stored separately from the rest of the spell data, so we use
@@ -125,17 +131,17 @@ class Spell:
 
   # The name is cropped on the right to facilitate printing and constructing
   # strings, but it will be padded back out when it gets written back to the rom.
-  self.name = text.asciitext(text.from_bytes(bytelist)).rstrip()
+  self.name = text.decode(bytelist).rstrip()
  
  # Write the spell name back to the rom.
  def write_name(self, rom, address, text):
 
   # Pad the name back out to the appropriate width first.
-  newname = text.ff4text(self.name)
-  newname = newname.ljust(rom.SPELL_NAME_WIDTH, text.ff4text(" "))
+  newname = text.encode(self.name)
+  newname = newname.ljust(rom.SPELL_NAME_WIDTH, text.encode(" "))
 
-  # Then convert it and put it back into the rom.
-  rom.inject(address, text.to_bytes(newname))
+  # Then put it back into the rom.
+  rom.inject(address, newname)
 
  # Read the spell visual effect information from the rom.
  # As with the names, these are stored in a separate place in the rom, so we use a
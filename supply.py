@@ -4,6 +4,8 @@ from spell import Spell
 # This is a consumable item that can be used in battle.
 class Supply(Item):
 
+ __slots__ = ("utility",)
+
  def __init__(self, attribute_reference = []):
   super().__init__()
 
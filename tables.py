@@ -0,0 +1,391 @@
+from weapon import Weapon
+from armor import Armor
+from spell import Spell
+from monster import Monster
+from map import Map
+from common import FlagSet
+
+# NumPy is only needed for tables, so the rest of the library still works without it.
+try:
+ import numpy
+except ImportError:
+ numpy = None
+
+# Tables let a whole category of fixed-size records be looked at (and changed) at
+# once as a NumPy structured array, with one column per value, rather than as a list
+# of objects. That makes things like "every weapon with attack over 50" or "the
+# average HP of the bosses" one line each, and much faster than looping over the
+# objects. For example:
+#  weapons = ff4.table("weapons")
+#  print(weapons["name"][weapons["attack"] > 50])
+#  weapons["attack"] //= 2
+#  ff4.write_table("weapons", weapons)
+# The columns are the same as the attributes of the matching class, and are worked
+# out from its record schema (see record.py). Flags are booleans, and values that are
+# objects (such as the races FlagSet of a weapon) are left as the raw byte.
+
+# This returns the layout of the given table, as a dictionary with the schema of its
+# records, where the first one starts, how many there are, and where their names are
+# (if they have any). Monsters also have a pointer table, since their records aren't
+# all the same size; only the 10 bytes that every monster has are in the table.
+def layout(rom, name):
+ if name == "weapons":
+  return {"schema": Weapon.schema, "start": rom.WEAPON_DATA_START, "count": rom.TOTAL_WEAPONS, "names": rom.ITEM_NAMES_START, "width": rom.ITEM_NAME_WIDTH}
+ if name == "armors":
+  names = rom.ITEM_NAMES_START + rom.ARMORS_START_INDEX * rom.ITEM_NAME_WIDTH
+  return {"schema": Armor.schema, "start": rom.ARMOR_DATA_START, "count": rom.TOTAL_ARMORS, "names": names, "width": rom.ITEM_NAME_WIDTH}
+ if name == "spells":
+  return {"schema": Spell.schema, "start": rom.SPELL_DATA_START, "count": rom.TOTAL_SPELLS, "names": rom.SPELL_NAMES_START, "width": rom.SPELL_NAME_WIDTH}
+ if name == "monsters":
+  return {"schema": Monster.header, "start": rom.MONSTER_DATA_START, "count": rom.TOTAL_MONSTERS, "names": rom.MONSTER_NAMES_START, "width": rom.MONSTER_NAME_WIDTH, "pointers": rom.MONSTER_POINTERS_START}
+ if name == "maps":
+  return {"schema": Map.schema, "start": rom.MAP_DATA_START, "count": rom.TOTAL_MAPS, "names": None}
+ print("ERROR: There is no table called \"{}\".".format(name))
+ return None
+
+# The NumPy type that matches the slots of a schema, so that a block of records can
+# be looked at as an array without converting anything.
+def raw_type(schema):
+ formats = {1: "<u1", 2: "<u2", 4: "<u4"}
+ return numpy.dtype({
+  "names": ["v{}".format(index) for index in range(len(schema.slots))],
+  "formats": [formats[size] for offset, size in schema.slots],
+  "offsets": [offset for offset, size in schema.slots],
+  "itemsize": schema.size
+ })
+
+# The NumPy type of each column: booleans for flags, and the smallest integer that
+# fits for everything else. Values with several entries (like a map's NPC palettes)
+# get a column with that many numbers in each row.
+def column_types(schema):
+ columns = {}
+ for (name, entry), (field, places) in schema.values.items():
+  if field.kind in ["flag", "inverted"]:
+   kind = "?"
+  else:
+   bits = max(shift + length for slot, size, low, length, shift in places)
+   size = 1 if bits <= 8 else 2 if bits <= 16 else 4
+   kind = "<{}{}".format("i" if field.signed else "u", size)
+  entries = columns.get(name, (kind, 0))[1]
+  if entry is not None:
+   entries = max(entries, entry + 1)
+  columns[name] = (kind, entries)
+ return [(name, kind) if entries == 0 else (name, kind, (entries,)) for name, (kind, entries) in columns.items()]
+
+# Returns the records of the given table exactly as they are in the rom, with one
+# column per slot of the schema (v0, v1, ...). For records that are stored one after
+# the other, this is a read-only view straight into the rom, so nothing is copied at
+# all; the catch is that it keeps showing whatever is in the rom's buffer, and the
+# rom can't be resized while it's around. Monsters are gathered from wherever their
+# pointers say, so for them it's a copy.
+def read_raw(rom, name):
+ if numpy is None:
+  print("ERROR: NumPy is needed for tables, but it isn't installed.")
+  return None
+ where = layout(rom, name)
+ if where is None:
+  return None
+ schema = where["schema"]
+ if "pointers" in where:
+  positions = monster_positions(rom, where)
+  if positions is None:
+   return None
+  view = rom.view(where["start"], rom.MONSTER_DATA_ROOM)
+  region = numpy.frombuffer(view, numpy.uint8)
+  records = region[positions[:, None] + numpy.arange(schema.size)]
+  del region
+  view.release()
+  return records.view(raw_type(schema)).reshape(where["count"])
+ view = rom.view(where["start"], where["count"] * schema.size)
+ records = numpy.frombuffer(view, raw_type(schema), where["count"])
+ records.flags.writeable = False
+ return records
+
+# Returns where each monster's record starts, relative to the start of the monster
+# data, or None if any of them fall outside it.
+def monster_positions(rom, where):
+ pointers = numpy.array(rom.read_u16_array(where["pointers"], where["count"]), numpy.int64)
+ positions = pointers + rom.MONSTER_DATA_BONUS - where["start"]
+ if len(positions) > 0 and (positions.min() < 0 or positions.max() + where["schema"].size > rom.MONSTER_DATA_ROOM):
+  print("ERROR: Some of the monster pointers point outside the monster data.")
+  return None
+ return positions
+
+# Makes a table from records in the rom's format (like read_raw returns), with the
+# given names (or None, for the tables without them) and any extra columns. The extra
+# columns are left as 0s for the caller to fill in.
+def decode_records(schema, records, names = None, extra = []):
+ count = len(records)
+ columns = []
+ if names is not None:
+  columns.append(("name", "<U{}".format(max([len(entry) for entry in names] + [1]))))
+ columns += column_types(schema) + extra
+ table = numpy.zeros(count, columns)
+ if names is not None:
+  table["name"] = names
+
+ # Each value is built up from its pieces with the same masks and shifts as the
+ # schema's own code, only for the whole column at once.
+ for (column, entry), (field, places) in schema.values.items():
+  value = numpy.zeros(count, numpy.int64)
+  for slot, size, low, length, shift in places:
+   piece = records["v{}".format(slot)].astype(numpy.int64)
+   value |= ((piece >> low) & ((1 << length) - 1)) << shift
+  if field.kind == "flag":
+   value = value != 0
+  elif field.kind == "inverted":
+   value = value == 0
+  elif field.signed:
+   total = max(shift + length for slot, size, low, length, shift in places)
+   value -= (value >> (total - 1)) << total
+  if entry is None:
+   table[column] = value
+  else:
+   table[column][:, entry] = value
+ return table
+
+# The columns monsters have on top of their records.
+monster_columns = [("gp", "<u2"), ("xp", "<u2")]
+
+# Reads the given table from the rom, with a column for each value (and the names,
+# for the tables that have them).
+def read_table(rom, text, name):
+ records = read_raw(rom, name)
+ if records is None:
+  return None
+ where = layout(rom, name)
+ count = where["count"]
+ names = None
+ if where["names"] is not None:
+  names = text.read_name_table(rom, where["names"], where["width"], count)
+ table = decode_records(where["schema"], records, names, monster_columns if name == "monsters" else [])
+ del records
+
+ if name == "monsters":
+  for column, start in [("gp", rom.MONSTER_GP_START), ("xp", rom.MONSTER_XP_START)]:
+   view = rom.view(start, count * 2)
+   table[column] = numpy.frombuffer(view, "<u2", count)
+   view.release()
+ return table
+
+# Encodes all the rows of a table into records in the rom's format, as an array with
+# one column per slot of the schema (like read_raw returns). Each slot is built up
+# from the values that go in it, with the same masks and shifts as the schema's own
+# code, only for the whole column at once.
+def encode_records(schema, table):
+ count = len(table)
+ records = numpy.zeros(count, raw_type(schema))
+ for index, slot in enumerate(schema.slots):
+  value = numpy.zeros(count, numpy.int64)
+  for column, entry, field, low, length, shift in schema.pieces[slot]:
+   piece = table[column] if entry is None else table[column][:, entry]
+   if field.kind == "flag":
+    value |= numpy.where(piece, 1 << low, 0)
+   elif field.kind == "inverted":
+    value |= numpy.where(piece, 0, 1 << low)
+   elif field.kind == "object":
+    value |= piece.astype(numpy.int64) & 0xFF
+   else:
+    value |= ((piece.astype(numpy.int64) >> shift) & ((1 << length) - 1)) << low
+  records["v{}".format(index)] = value
+ return records
+
+# Writes a table (as returned by read_table, with whatever changes) back to the rom.
+# All the records are encoded together and written with a single assignment, rather
+# than one record at a time. Any objects for the same records that were read before
+# this (such as ff4.weapons) won't see the changes unless they're given to
+# update_objects below.
+def write_table(rom, text, name, table):
+ if numpy is None:
+  print("ERROR: NumPy is needed for tables, but it isn't installed.")
+  return
+ where = layout(rom, name)
+ if where is None:
+  return
+ schema = where["schema"]
+ count = where["count"]
+ if len(table) != count:
+  print("ERROR: The {} table should have {} rows, not {}.".format(name, count, len(table)))
+  return
+ records = encode_records(schema, table)
+
+ # Monsters go back wherever their pointers say, so their records are put into a
+ # copy of the monster data, and then that's written in one go.
+ if "pointers" in where:
+  positions = monster_positions(rom, where)
+  if positions is None:
+   return
+  view = rom.view(where["start"], rom.MONSTER_DATA_ROOM)
+  region = numpy.frombuffer(view, numpy.uint8).copy()
+  view.release()
+  region[positions[:, None] + numpy.arange(schema.size)] = records.view(numpy.uint8).reshape(count, schema.size)
+  rom.inject(where["start"], region.tobytes())
+  rom.inject(rom.MONSTER_GP_START, table["gp"].astype("<u2").tobytes())
+  rom.inject(rom.MONSTER_XP_START, table["xp"].astype("<u2").tobytes())
+ else:
+  rom.inject(where["start"], records.tobytes())
+
+ if where["names"] is not None:
+  text.write_name_table(rom, where["names"], where["width"], list(table["name"]))
+
+# The schema of the records in each table, for when there's no rom to ask.
+def schema_of(name):
+ schemas = {"weapons": Weapon.schema, "armors": Armor.schema, "spells": Spell.schema, "monsters": Monster.header, "maps": Map.schema}
+ if name not in schemas:
+  print("ERROR: There is no table called \"{}\".".format(name))
+  return None
+ return schemas[name]
+
+# Copies the values in a table into the matching objects (such as the weapons in
+# ff4.items), so that they agree with it. Only the values that are in the table are
+# changed; anything else about the objects is left alone.
+def update_objects(name, table, objects):
+ schema = schema_of(name)
+ if schema is None:
+  return
+ data = encode_records(schema, table).tobytes()
+ for index, record in enumerate(objects):
+  schema.decode(record, data, index * schema.size)
+ if "name" in table.dtype.names:
+  for record, entry in zip(objects, table["name"]):
+   record.name = str(entry)
+ if name == "monsters":
+  for record, gp, xp in zip(objects, table["gp"], table["xp"]):
+   record.gp = int(gp)
+   record.xp = int(xp)
+
+# The smallest and largest value each number column can hold, so that changes can be
+# kept within them rather than wrapping around when they're written.
+def bounds(name):
+ schema = schema_of(name)
+ if schema is None:
+  return {}
+ result = {}
+ for (column, entry), (field, places) in schema.values.items():
+  if field.kind in ["number", "object"]:
+   bits = max(shift + length for slot, size, low, length, shift in places)
+   if field.signed:
+    result[column] = (-(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+   else:
+    result[column] = (0, (1 << bits) - 1)
+ if name == "monsters":
+  result["gp"] = (0, 0xFFFF)
+  result["xp"] = (0, 0xFFFF)
+ return result
+
+# Changes the given columns of a table, in the rows picked out by "where", and returns
+# which rows those were (as an array of booleans). "where" can be an array of
+# booleans or a list of row numbers, or a function that's given the table and returns
+# one of those; leaving it out means every row. Each change is either a value (or an
+# array of them) or a function that's given the whole column and returns the new one.
+# Numbers are given to those functions as 64-bit integers so that they don't wrap
+# around partway through; the results are cut to whole numbers (the way int() would)
+# and kept within the given bounds (see above).
+def apply_changes(table, where = None, changes = {}, limits = {}):
+ if callable(where):
+  where = where(table)
+ rows = numpy.zeros(len(table), bool)
+ if where is None:
+  rows[:] = True
+ else:
+  rows[where] = True
+ for column, change in changes.items():
+  try:
+   current = table[column]
+  except (KeyError, ValueError):
+   print("ERROR: There is no \"{}\" column.".format(column))
+   continue
+  if callable(change):
+   change = change(current.astype(numpy.int64) if current.dtype.kind in "iu" else current)
+  value = numpy.asarray(change)
+  if column in limits:
+   value = numpy.clip(numpy.trunc(value), *limits[column])
+  value = numpy.broadcast_to(value, current.shape)
+  current[rows] = value[rows]
+ return rows
+
+# The columns of a list of objects, for changing them all at once. Each column is an
+# array of one attribute of every object, and is only made when it's first looked up,
+# so an update that only touches a couple of attributes only converts those.
+class Columns:
+
+ def __init__(self, objects):
+  self.objects = objects
+  self.columns = {}
+
+  # The columns that hold objects (like a FlagSet), which are given as the number
+  # their bytes make up, along with how many bytes that is (an AttributeTable, for
+  # example, is three).
+  self.wrapped = {}
+
+ def __len__(self):
+  return len(self.objects)
+
+ def __getitem__(self, name):
+  if name not in self.columns:
+   if len(self.objects) == 0 or not hasattr(self.objects[0], name):
+    raise KeyError(name)
+   values = [getattr(record, name) for record in self.objects]
+   if isinstance(values[0], FlagSet):
+    self.wrapped[name] = values[0].width
+    values = [int.from_bytes(bytes(value.to_bytes()), "little") for value in values]
+   elif hasattr(values[0], "to_byte"):
+    self.wrapped[name] = 1
+    values = [value.to_byte() for value in values]
+   self.columns[name] = numpy.array(values)
+  return self.columns[name]
+
+ # Copies the given columns back into the objects in the given rows.
+ def update(self, names, rows):
+  for name in names:
+   if name not in self.columns:
+    continue
+   values = self.columns[name].tolist()
+   for index in rows.tolist():
+    if name in self.wrapped:
+     value = getattr(self.objects[index], name)
+     width = self.wrapped[name]
+     number = int(values[index]) & ((1 << (width * 8)) - 1)
+     if isinstance(value, FlagSet):
+      value.from_bytes(number.to_bytes(width, "little"))
+     else:
+      value.from_byte(number)
+    else:
+     setattr(self.objects[index], name, values[index])
+
+# A list of game objects (such as ff4.monsters) that can also be changed all at once,
+# a column at a time, rather than by looping over the objects. For example, to make
+# every boss 50% tougher and five levels higher:
+#  ff4.monsters.update(where = lambda table: table["boss"], hp = lambda hp: hp * 1.5, level = lambda level: level + 5)
+# The columns are NumPy arrays made from the objects as they are now, so changes
+# that haven't been written yet are included, and only the objects in the chosen
+# rows are changed afterwards. Like any other change to the objects, this only goes
+# into the rom when the data is written; to change the rom directly instead, see
+# the "update" method of FF4Rom. Otherwise, this works just like a list.
+class Collection(list):
+
+ # "name" is the name of the table the objects belong to (see "layout" above). A list
+ # with more than one kind of object in it (like the items) gives each table's name
+ # and where its objects are in the list instead, as a dictionary of slices.
+ def __init__(self, objects, name = None, sections = None):
+  list.__init__(self, objects)
+  self.name = name
+  self.sections = sections
+
+ # Changes the objects as described above, and returns how many were changed. For a
+ # list with more than one kind of object, "table" says which kind.
+ def update(self, where = None, table = None, **changes):
+  if numpy is None:
+   print("ERROR: NumPy is needed for tables, but it isn't installed.")
+   return 0
+  name = self.name if table is None else table
+  objects = list(self)
+  if self.sections is not None:
+   if name not in self.sections:
+    print("ERROR: Say which kind to update with table = (one of {}).".format(", ".join(self.sections)))
+    return 0
+   objects = objects[self.sections[name]]
+  columns = Columns(objects)
+  rows = numpy.flatnonzero(apply_changes(columns, where, changes, bounds(name)))
+  columns.update(changes, rows)
+  return len(rows)
@@ -1,3 +1,5 @@
+import re
+
 class TextInterface:
 
  def __init__(self):
@@ -80,52 +82,94 @@ class TextInterface:
   # back into FF4 encoded text.
   self.texttoff4 = {value: key for key, value in self.ff4totext.items()}
 
+  # The arrays above are what define the encoding, but looking things up in them
+  # one symbol at a time is slow, so the actual conversions use tables compiled
+  # from them (see "compile" below). These are built the first time they're needed
+  # and thrown away whenever the arrays change.
+  self.decoding = None
+  self.encoding = None
+
+ # This builds the tables used for converting text from the arrays above:
+ #  * "decoding" is a list of 256 strings, where entry N is the ASCII text for the
+ #    FF4 symbol N. This can be handed straight to str.translate, which converts a
+ #    whole string in one go.
+ #  * "encoding" maps each piece of ASCII text (a single character or a code in
+ #    square brackets) to its FF4 symbol as a number.
+ # The regular expression that splits ASCII text into those pieces is the same for
+ # every encoding, so it's compiled once for the whole class.
+ tokenizer = re.compile(r"\[[^\]]*\]|.", re.DOTALL)
+
+ def compile(self):
+  self.decoding = [self.ff4totext[chr(i)] for i in range(0x100)]
+  self.encoding = {key: ord(value) for key, value in self.texttoff4.items()}
+
+  # Every symbol can also be written as its hex code in square brackets, even the
+  # ones that have ASCII text of their own. This is how things that aren't really
+  # text (such as the parameters of control codes in messages) are written.
+  for i in range(0x100):
+   self.encoding.setdefault("[{}]".format(self.hex(i)), i)
+
  # This takes a string of text in FF4 encoding and converts it to ASCII.
  def asciitext(self, ff4string):
-  result = ""
-  
-  # Since FF4 encoding uses one byte per symbol, we can simply use the array to
-  # construct the string byte by byte.
-  for letter in ff4string:
-   result += self.ff4totext[letter]
-  
-  # And finally return it.
-  return result
+  if self.decoding is None:
+   self.compile()
+  return ff4string.translate(self.decoding)
 
  # This takes a string of ASCII text and converts it to FF4 encoding.
  def ff4text(self, asciistring):
-  result = ""
-  codemode = False
-  code = ""
-
-  # When converting ASCII text, we need to consider things between [] as a single
-  # symbol. Thus, if we read a "[", we change to a special "code-reading mode"
-  # until we read a "]". Then the code is looked up and the proper symbol added to
-  # the resulting string and we return back to "letter-reading mode".
-  for letter in asciistring:
-   if codemode:
-    code += letter
-    if letter == "]":
-     codemode = False
-     result += self.texttoff4[code]
-   elif letter == "[":
-    code = "["
-    codemode = True
-   else:
-    result += self.texttoff4[letter]
-  return result
+  return self.from_bytes(self.encode(asciistring))
+
+ # These do the same as asciitext and ff4text, but convert directly between ASCII
+ # text and the raw bytes from the rom, without going through a string in FF4
+ # encoding first. This is what most of the library uses.
+ def decode(self, bytelist):
+  if self.decoding is None:
+   self.compile()
+  return bytes(bytelist).decode("latin-1").translate(self.decoding)
+
+ # When converting ASCII text, we need to consider things between [] as a single
+ # symbol, so the text is split into pieces with the tokenizer above, and each
+ # piece is looked up and converted. Most text doesn't have any codes in square
+ # brackets though, in which case every character is its own piece and the
+ # tokenizer can be skipped entirely.
+ def encode(self, asciistring):
+  if self.encoding is None:
+   self.compile()
+  if "[" in asciistring:
+   asciistring = self.tokenizer.findall(asciistring)
+  return bytes(map(self.encoding.__getitem__, asciistring))
+
+ # This reads a table of "count" names of "width" bytes each, starting at the given
+ # address in the rom, and returns them as a list of ASCII strings. As with reading
+ # names one at a time, the names are cropped on the right to make them easier to
+ # work with. The whole table is read in one go rather than one name at a time.
+ def read_name_table(self, rom, start, width, count):
+  if self.decoding is None:
+   self.compile()
+  table = rom.view(start, width * count)
+  ff4strings = self.from_bytes(table)
+  table.release()
+  names = []
+  for offset in range(0, width * count, width):
+   names.append(ff4strings[offset:offset + width].translate(self.decoding).rstrip())
+  return names
+
+ # This does the opposite of read_name_table above, writing a list of names back to
+ # the rom as a table. Each name is padded out with spaces (or cut off) to exactly
+ # "width" bytes, and the whole table is written in one go.
+ def write_name_table(self, rom, start, width, names):
+  space = self.encode(" ")
+  table = b"".join(self.encode(name)[0:width].ljust(width, space) for name in names)
+  rom.inject(start, table)
 
+ # These convert between raw bytes and strings in FF4 encoding, where each
+ # character of the string is one byte. (The "latin-1" codec maps each byte to the
+ # character with the same number, which is exactly that.)
  def from_bytes(self, bytelist):
-  result = ""
-  for byte in bytelist:
-   result += chr(byte)
-  return result
+  return bytes(bytelist).decode("latin-1")
 
  def to_bytes(self, ff4string):
-  result = []
-  for letter in ff4string:
-   result.append(ord(letter))
-  return result
+  return list(ff4string.encode("latin-1"))
 
  # Assigns a new ascii symbol to a given hex code.
  # This is useful for displaying text in roms whose text encoding has been altered.
@@ -136,6 +180,8 @@ class TextInterface:
  def assign_symbol(self, code, symbol):
   self.ff4totext.update({chr(code): symbol})
   self.texttoff4.update({symbol: chr(code)})
+  self.decoding = None
+  self.encoding = None
  
  # This returns a string representation of a hex value, including one leading 0 for
  # single-digit values.
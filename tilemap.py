@@ -8,7 +8,28 @@ class TileMap:
 
   # The "tiles" variable represents a 2D array of tile indexes.
   self.tiles = []
+
+  # A copy of the tiles as they were when they were last read from the rom or
+  # written to it, and the RLE encoded bytes they were read from or written as.
+  # These let writing skip encoding the TileMap again if the tiles haven't changed
+  # since (see "changed" below). For the overworld, these are lists with one entry
+  # for each row instead (see read_overworld in categories/world.py).
+  self.saved = None
+  self.encoding = None
  
+ # When a TileMap is pickled (by the cache in cache.py, or to be sent back from a
+ # worker process; see workers.py), each row is stored as a string of bytes rather
+ # than a list of separate numbers, which is much smaller and quicker. If any of
+ # the tiles aren't bytes, it's pickled as usual instead.
+ def __reduce__(self):
+  try:
+   saved = self.saved
+   if saved is not None:
+    saved = [bytes(row) for row in saved]
+   return (unpack_tilemap, ([bytes(row) for row in self.tiles], saved, self.encoding))
+  except (ValueError, TypeError):
+   return (TileMap, (), self.__dict__)
+
  # This reads the RLE encoded tile data for a single TileMap from the rom, starting
  # at the specified address, and continuing until 0x400 tiles have been read.
  # During the tile reading process, the tiles are read into a 1D array which is
@@ -40,13 +61,28 @@ class TileMap:
 
   # Finally, once we've read a full map worth of tiles, we convert it to a 2D array.
   self.tiles = [[tiles[y * 32 + x] for x in range(32)] for y in range(32)]
+  self.saved = self.snapshot()
+  self.encoding = bytes(rom.data[address:address + offset])
+
+ # Returns a copy of the tiles, to keep in "saved" above.
+ def snapshot(self):
+  return [list(row) for row in self.tiles]
+
+ # Returns whether the tiles have changed since they were last read or written.
+ def changed(self):
+  return self.saved is None or self.tiles != self.saved
 
  # This writes the 2D tile array back to the rom as an RLE encoded sequence.
  # Most of the work though is done by the "encode" method.
+ # If the tiles haven't changed since they were last read or written, the bytes they
+ # were read from or written as are used again rather than encoding them again.
  def write(self, rom, address):
  
   # The encode method does the heavy lifting.
-  encoding = self.encode()
+  if self.changed():
+   self.encoding = bytes(self.encode())
+   self.saved = self.snapshot()
+  encoding = self.encoding
   
   # We simply inject it directly into the appropriate place in the rom.
   rom.inject(address, encoding)
@@ -127,3 +163,10 @@ class TileMap:
   # And finally, return the constructed RLE encoded array of bytes.
   return result
 
+def unpack_tilemap(rows, saved = None, encoding = None):
+ tilemap = TileMap()
+ tilemap.tiles = [list(row) for row in rows]
+ if saved is not None:
+  tilemap.saved = [list(row) for row in saved]
+ tilemap.encoding = encoding
+ return tilemap
@@ -10,6 +10,8 @@
 # child objects.
 class Trigger:
 
+ __slots__ = ("x", "y", "type")
+
  def __init__(self):
 
   # The x coordinate of the tile where this trigger is located.
@@ -25,6 +27,11 @@ class Trigger:
   # more trouble than it saves, I might cut it entirely, but we'll see what happens.
   self.type = ""
 
+ # Returns the trigger's values, so that writing the maps can tell whether it has
+ # changed since it was read or last written (see "triggers_changed" in map.py).
+ def state(self):
+  return (type(self), self.x, self.y, self.type)
+
  # Read the coordinates from the rom.
  def read(self, rom, address):
   self.x = rom.data[address]
@@ -50,6 +57,8 @@ class Trigger:
 # entire stack) can cause the next warp to glitch out the game.
 class TeleportTrigger(Trigger):
 
+ __slots__ = ("map", "new_x", "new_y", "facing")
+
  def __init__(self):
 
   # Inherit the tile coordinates and type string from the parent object.
@@ -66,6 +75,9 @@ class TeleportTrigger(Trigger):
 
   # This is the way you will be facing after teleporting.
   self.facing = 0
+
+ def state(self):
+  return super().state() + (self.map, self.new_x, self.new_y, self.facing)
  
  # Read the teleport data from the rom.
  def read(self, rom, address):
@@ -131,6 +143,8 @@ class TeleportTrigger(Trigger):
 # after you picked up the item).
 class TreasureTrigger(Trigger):
 
+ __slots__ = ("trapped", "formation", "has_money", "contents")
+
  def __init__(self):
 
   # Inherit the tile coordinates and type string from the parent object.
@@ -152,6 +166,9 @@ class TreasureTrigger(Trigger):
   # 10; if it is unset, the GP amount is the rest of the byte times 1000.
   self.contents = 0
 
+ def state(self):
+  return super().state() + (self.trapped, self.formation, self.has_money, self.contents)
+
  # Read the treasure data from the rom.
  def read(self, rom, address):
 
@@ -193,6 +210,8 @@ class TreasureTrigger(Trigger):
 # specifies which launcher to look at.
 class LauncherTrigger(Trigger):
 
+ __slots__ = ("launcher",)
+
  def __init__(self):
 
   # Inherit the tile coordinates and type string from the parent object.
@@ -201,6 +220,9 @@ class LauncherTrigger(Trigger):
   # The index of the event launcher associated with this trigger.
   self.launcher = 0
 
+ def state(self):
+  return super().state() + (self.launcher,)
+
  # Read the launcher trigger data from the rom.
  def read(self, rom, address):
 
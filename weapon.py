@@ -1,9 +1,15 @@
 from equipment import Equipment
+from record import Field, Schema
 
 # This represents an item that can be equipped onto a character to boost their
 # attack stats. 
 class Weapon(Equipment):
 
+ __slots__ = ("throwable", "ranged", "litarrow", "unused_property", "hammer_flag",
+  "axe_flag", "nerf_crits", "attack", "hit", "mystery_flag", "casts_spell",
+  "mystery_flag2", "consumable", "bow_flag", "throwable2", "sprite", "palette",
+  "swing", "slash", "casts_visual", "casts_power", "saved")
+
  def __init__(self):
 
   # It has all the stats an Equipment has.
@@ -60,6 +66,9 @@ class Weapon(Equipment):
   # otherwise normal weapon if you wanted to do that.
   self.consumable = False
 
+  # Bows have this flag set.
+  self.bow_flag = False
+
   # Throwable weapons also have this flag set. I don't think it does anything and
   # all the "work" is done by the first throwable flag above.
   self.throwable2 = False
@@ -92,50 +101,39 @@ class Weapon(Equipment):
   # the rom yet.
   self.casts_power = 0
 
+  # The weapon data as it was when it was last read or written (see record.py).
+  self.saved = None
+
+ # The layout of the main weapon data in the rom (see record.py).
+ schema = Schema([
+  Field("nerf_crits", 0, bits = (0, 1), kind = "flag"),
+  Field("axe_flag", 0, bits = (1, 2), kind = "flag"),
+  Field("hammer_flag", 0, bits = (2, 3), kind = "flag"),
+  Field("unused_property", 0, bits = (3, 4), kind = "flag"),
+  Field("litarrow", 0, bits = (4, 5), kind = "flag"),
+  Field("ranged", 0, bits = (5, 6), kind = "flag"),
+  Field("throwable", 0, bits = (6, 7), kind = "flag"),
+  Field("magnetic", 0, bits = (7, 8), kind = "flag"),
+  Field("attack", 1),
+  Field("hit", 2, bits = (0, 7)),
+  Field("mystery_flag", 2, bits = (7, 8), kind = "flag"),
+  Field("casts_spell", 3),
+  Field("attributes", 4),
+  Field("races", 5, kind = "object"),
+  Field("equips", 6, bits = (0, 5)),
+  Field("mystery_flag2", 6, bits = (5, 6), kind = "flag"),
+  Field("consumable", 6, bits = (6, 7), kind = "flag"),
+  Field("bow_flag", 6, bits = (7, 8), kind = "flag"),
+  Field("statbuff", 7, kind = "object")
+ ])
+
  # Read the main item information from the rom.
  def read(self, rom, address):
-  self.magnetic = rom.flag(address, 7)
-  self.throwable = rom.flag(address, 6)
-  self.ranged = rom.flag(address, 5)
-  self.litarrow = rom.flag(address, 4)
-  self.unused_property = rom.flag(address, 3)
-  self.hammer_flag = rom.flag(address, 2)
-  self.axe_flag = rom.flag(address, 1)
-  self.nerf_crits = rom.flag(address, 0)
-  self.attack = rom.data[address + 1]
-  self.hit = rom.data[address + 2] % 0x80
-  self.mystery_flag = rom.flag(address + 2, 7)
-  self.casts_spell = rom.data[address + 3]
-  self.attributes = rom.data[address + 4]
-  self.races.read(rom, address + 5)
-  self.equips = rom.data[address + 6] % 0x20
-  self.mystery_flag2 = rom.flag(address + 6, 5)
-  self.consumable = rom.flag(address + 6, 6)
-  self.bow_flag = rom.flag(address + 6, 7)
-  self.statbuff.read(rom, address + 7)
+  self.schema.read(self, rom, address)
  
  # Write the main item information back to the rom.
  def write(self, rom, address):
-  rom.data[address] = 0
-  rom.setbit(address, 7, self.magnetic)
-  rom.setbit(address, 6, self.throwable)
-  rom.setbit(address, 5, self.ranged)
-  rom.setbit(address, 4, self.litarrow)
-  rom.setbit(address, 3, self.unused_property)
-  rom.setbit(address, 2, self.hammer_flag)
-  rom.setbit(address, 1, self.axe_flag)
-  rom.setbit(address, 0, self.nerf_crits)
-  rom.data[address + 1] = self.attack
-  rom.data[address + 2] = self.hit % 0x80
-  rom.setbit(address + 2, 7, self.mystery_flag)
-  rom.data[address + 3] = self.casts_spell
-  rom.data[address + 4] = self.attributes
-  self.races.write(rom, address + 5)
-  rom.data[address + 6] = self.equips % 0x20
-  rom.setbit(address + 6, 5, self.mystery_flag2)
-  rom.setbit(address + 6, 6, self.consumable)
-  rom.setbit(address + 6, 7, self.bow_flag)
-  self.statbuff.write(rom, address + 7)
+  self.schema.write(self, rom, address)
  
  # Read the item's animation information from the rom.
  def read_visuals(self, rom, address):
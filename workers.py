@@ -0,0 +1,99 @@
+import io
+import concurrent.futures
+from multiprocessing import shared_memory
+import rom
+import cache
+import registry
+import gamingway
+
+# Reading the bigger types of data (the overworld, the tilemaps, the monsters, the
+# maps and their triggers, the events) is all pure Python, so reading them at the
+# same time in threads doesn't help; only one thread can run Python at a time. This
+# reads them in separate processes instead. The raw bytes are copied once into a
+# block of shared memory that every worker process looks at directly, so the rom
+# isn't sent to each of them, and each type of data read is sent back as a pickle
+# (the same way it's stored in the cache; see cache.py), which is compact and keeps
+# the objects referring to the FF4Rom's own configuration and text interface.
+# Types of data that depend on others (such as the spellbooks on the spells) are
+# still read in the main process once those are done (see "read" in registry.py).
+# Starting the workers takes a moment, so this only pays off for roms with a lot of
+# data to read, such as expanded hacks.
+
+# In each worker process, this is the FF4Rom that reads from the shared memory.
+worker = None
+
+# Sets up a worker process, given the name of the shared memory, the length of the
+# rom and its pretend header (see RomBuffer in rom.py), the rom's constants (which
+# may have been changed for a hack), and the FF4Rom's text interface and
+# configuration.
+def start_worker(name, length, header, constants, text, config):
+ global worker
+ memory = shared_memory.SharedMemory(name)
+ data = rom.RomBuffer(memory.buf[0:length], header)
+ worker = gamingway.FF4Rom.__new__(gamingway.FF4Rom)
+ worker.rom = rom.RomData(data)
+ worker.rom.__dict__.update(constants)
+ worker.text = text
+ worker.config = config
+ worker.original = None
+ worker.stale = set()
+ worker.cache = None
+ worker.memory = memory
+
+# Reads the given attribute in a worker process, and returns it pickled.
+def read_attribute(attribute):
+ value = registry.ATTRIBUTES[attribute].readers[attribute](worker)
+ result = io.BytesIO()
+ cache.dump(worker, attribute, value, result)
+ return result.getvalue()
+
+# A pool of worker processes reading from one FF4Rom. Use it in a "with" statement,
+# so that the processes are stopped and the shared memory is let go of afterwards.
+class WorkerPool:
+
+ def __init__(self, ff4, workers = None):
+  self.ff4 = ff4
+  data = ff4.rom.data
+  header = getattr(data, "header", 0)
+  length = len(data) - header
+  self.memory = shared_memory.SharedMemory(create = True, size = max(length, 1))
+  view = data.view(header, length)
+  self.memory.buf[0:length] = view
+  view.release()
+  constants = {key: value for key, value in vars(ff4.rom).items() if key.isupper()}
+  arguments = (self.memory.name, length, header, constants, ff4.text, ff4.config)
+  self.executor = concurrent.futures.ProcessPoolExecutor(workers, initializer = start_worker, initargs = arguments)
+
+ def __enter__(self):
+  return self
+
+ def __exit__(self, kind, value, traceback):
+  self.executor.shutdown()
+  self.memory.close()
+  self.memory.unlink()
+
+ # Starts reading the given attribute in a worker process, and returns something
+ # whose "result" method waits for it and returns its value. If it's in the
+ # FF4Rom's cache (see cache.py), it's loaded from there instead.
+ def submit(self, attribute):
+  if self.ff4.cache is not None:
+   value = self.ff4.cache.load(self.ff4, attribute)
+   if value is not None:
+    return registry.finished(value)
+  return Pending(self, attribute, self.executor.submit(read_attribute, attribute))
+
+# A read that's been started in a worker process. Its "result" waits for it to finish
+# and turns the pickle that comes back into the objects.
+class Pending:
+
+ def __init__(self, pool, attribute, future):
+  self.pool = pool
+  self.attribute = attribute
+  self.future = future
+
+ def result(self):
+  ff4 = self.pool.ff4
+  value = cache.load(ff4, self.attribute, io.BytesIO(self.future.result()))
+  if ff4.cache is not None:
+   ff4.cache.save(ff4, self.attribute, value)
+  return value